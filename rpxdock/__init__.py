@@ -2,42 +2,63 @@ __author__ = """Will Sheffler"""
 __email__ = "willsheffler@gmail.com"
 __version__ = "0.1"
 
-import os
+import os, importlib
 
 os.environ["CC"] = "gcc-7"  # no idea if this works
 os.environ["CXX"] = "g++-7"  # no idea if this works
 
-from rpxdock.util import Bunch, Timer, load, dump
-from rpxdock import app
-from rpxdock import body
-from rpxdock import bvh
-from rpxdock import cluster
-from rpxdock import data
-from rpxdock import geom
-from rpxdock import io
-from rpxdock import motif
-from rpxdock import phmap
-from rpxdock import rosetta  # dosn't import actual pyrosetta
-from rpxdock import rotamer
-from rpxdock import sampling
-from rpxdock import search
-from rpxdock import util
-from rpxdock import viz
-from rpxdock import xbin
+# extension modules (.cpp) are built into and loaded from a shared cache, see extcache
+from rpxdock import extcache
+extcache.install()
 
-from rpxdock.search import dockspec
-from rpxdock.app import options
-from rpxdock.body import Body
-from rpxdock.bvh import BVH
-from rpxdock.data import datadir
-from rpxdock.motif import ResPairData, ResPairScore, Xmap
-from rpxdock.score import RpxHier
-from rpxdock.search import Result, hier_search, grid_search, concat_results
-from rpxdock.filter import filter_redundancy
-from rpxdock.io import dump_pdb_from_bodies
-from rpxdock.geom import symframes
-from rpxdock.sampling import ProductHier, ZeroDHier, CompoundHier
-from rpxdock.util.cache import GLOBALCACHE, CachedProxy
-from rpxdock.xbin import Xbin
+# subpackages and the names below are imported on first use (see __getattr__), so
+# 'import rpxdock' is cheap and workers only load the native modules they need
+_lazy_attrs = dict(
+   Bunch='rpxdock.util',
+   Timer='rpxdock.util',
+   Profiler='rpxdock.util',
+   load='rpxdock.util',
+   dump='rpxdock.util',
+   Body='rpxdock.body',
+   BVH='rpxdock.bvh',
+   datadir='rpxdock.data',
+   ResPairData='rpxdock.motif',
+   ResPairScore='rpxdock.motif',
+   Xmap='rpxdock.motif',
+   RpxHier='rpxdock.score',
+   Result='rpxdock.search',
+   hier_search='rpxdock.search',
+   grid_search='rpxdock.search',
+   concat_results='rpxdock.search',
+   filter_redundancy='rpxdock.filter',
+   dump_pdb_from_bodies='rpxdock.io',
+   symframes='rpxdock.geom',
+   ProductHier='rpxdock.sampling',
+   ZeroDHier='rpxdock.sampling',
+   CompoundHier='rpxdock.sampling',
+   GLOBALCACHE='rpxdock.util.cache',
+   CachedProxy='rpxdock.util.cache',
+   Xbin='rpxdock.xbin',
+)
+_lazy_modules = dict(dockspec='rpxdock.search.dockspec', options='rpxdock.app.options')
+
+def __getattr__(name):
+   if name in _lazy_attrs:
+      val = getattr(importlib.import_module(_lazy_attrs[name]), name)
+   elif name in _lazy_modules:
+      val = importlib.import_module(_lazy_modules[name])
+   elif name.startswith('__'):
+      raise AttributeError(name)
+   else:
+      try:
+         val = importlib.import_module(f'{__name__}.{name}')
+      except ModuleNotFoundError as e:
+         if e.name != f'{__name__}.{name}': raise
+         raise AttributeError(f"module '{__name__}' has no attribute '{name}'") from None
+   globals()[name] = val
+   return val
+
+def __dir__():
+   return sorted(set(globals()) | set(_lazy_attrs) | set(_lazy_modules))
 
 rootdir = os.path.dirname(__file__)
@@ -1,6 +1,6 @@
 #! /home/sheffler/.conda/envs/rpxdock/bin/python
 
-import logging, itertools, concurrent, tqdm, rpxdock as rp
+import os, logging, itertools, concurrent, tqdm, rpxdock as rp
 import numpy as np
 
 def get_rpxdock_args():
@@ -30,31 +30,73 @@ def get_spec(arch):
       spec = rp.search.DockSpec2CompCage(arch)
    return spec
 
+def checkpoint_file(ijob, bodies, checkpoint_dir=None, output_prefix='rpxdock', **kw):
+   '''per job hier_search checkpoint, so a restarted run resumes each job where it stopped'''
+   if not checkpoint_dir: return None
+   labels = '_'.join(b.label for b in bodies)
+   prefix = os.path.basename(output_prefix)
+   return os.path.join(checkpoint_dir, f'{prefix}_job{ijob}_{labels}.npz')
+
+def stream_bodies_and_jobs(pool, body_args, jobs, submit_job, ncpu=1, **kw):
+   '''build Bodies in pool, submitting each docking job as soon as all its bodies are built
+
+   body_args[i] are extra args to rp.body.get_body_cached for body i, jobs[ijob] the indices
+   of the bodies job ijob needs. submit_job(ijob, bodies) submits the job and returns its
+   future. at most ncpu bodies are built at once, so jobs for finished bodies start while the
+   rest still load. returns the job results in job order'''
+   # build bodies in the order jobs need them
+   order = list(dict.fromkeys(i for job in jobs for i in job))
+   jobs_of_body = {i: list() for i in order}
+   for ijob, job in enumerate(jobs):
+      for i in set(job):
+         jobs_of_body[i].append(ijob)
+   nmissing = [len(set(job)) for job in jobs]
+   bodies, result = [None] * len(body_args), [None] * len(jobs)
+   running, nbuilding = dict(), 0
+   with tqdm.tqdm(total=len(jobs)) as progress:
+      while order or running:
+         while order and nbuilding < max(1, ncpu):
+            i = order.pop(0)
+            f = pool.submit(rp.body.get_body_cached, **kw, **body_args[i])
+            running[f], nbuilding = ('body', i), nbuilding + 1
+         done, _ = concurrent.futures.wait(running,
+                                           return_when=concurrent.futures.FIRST_COMPLETED)
+         for f in done:
+            kind, i = running.pop(f)
+            if kind == 'job':
+               result[i] = f.result()
+               progress.update()
+               continue
+            bodies[i], nbuilding = f.result(), nbuilding - 1
+            for ijob in jobs_of_body[i]:
+               nmissing[ijob] -= 1
+               if nmissing[ijob] == 0:
+                  running[submit_job(ijob, [bodies[j] for j in jobs[ijob]])] = 'job', ijob
+   return result
+
 ## All dock_cyclic, dock_onecomp, and dock_multicomp do similar things
 def dock_cyclic(hscore, inputs, architecture, **kw):
    kw = rp.Bunch(kw)
-   bodies = [
-      rp.Body(inp, allowed_res=allowedres, **kw)
+   body_args = [
+      dict(source=inp, allowed_res=allowedres)
       for inp, allowedres in zip(kw.inputs1, kw.allowed_residues1)
    ]
+   jobs = [[i] for i in range(len(body_args))]
+
+   def submit_job(ijob, bodies):
+      # where the magic happens
+      return pool.submit(
+         rp.search.make_cyclic,
+         bodies[0],
+         architecture.upper(),
+         hscore,
+         checkpoint=checkpoint_file(ijob, bodies, **kw),
+         **kw,
+      )
+
    exe = concurrent.futures.ProcessPoolExecutor
-   # exe = rp.util.InProcessExecutor
    with exe(kw.ncpu) as pool:
-      futures = list()
-      # where the magic happens
-      for ijob, bod in enumerate(bodies):
-         futures.append(
-            pool.submit(
-               rp.search.make_cyclic,
-               bod,
-               architecture.upper(),
-               hscore,
-               **kw,
-            ))
-         futures[-1].ijob = ijob
-      result = [None] * len(futures)
-      for f in tqdm.tqdm(concurrent.futures.as_completed(futures), total=len(futures)):
-         result[f.ijob] = f.result()
+      result = stream_bodies_and_jobs(pool, body_args, jobs, submit_job, **kw)
    result = rp.concat_results(result)
 
    # result = rp.search.make_cyclic(body, architecture.upper(), hscore, **kw)
@@ -71,7 +113,9 @@ def dock_onecomp(hscore, **kw):
       flip=list(spec.flip_axis[:3])
       if not kw.flip_components[0]:
          flip = None
-      sampler = rp.sampling.grid_sym_axis(
+      # with grid_topk, the grid is made and scored in chunks, see stream_grid_search
+      grid = rp.sampling.GridSymAxis if kw.grid_topk else rp.sampling.grid_sym_axis
+      sampler = grid(
          cart=np.arange(crtbnd[0], crtbnd[1], kw.grid_resolution_cart_angstroms),
          ang=np.arange(0, 360 / spec.nfold, kw.grid_resolution_ori_degrees),
          axis=spec.axis,
@@ -87,31 +131,28 @@ def dock_onecomp(hscore, **kw):
       search = rp.hier_search
 
    # pose info and axes that intersect
-   bodies = [
-      rp.Body(inp, allowed_res=allowedres, **kw)
+   body_args = [
+      dict(source=inp, allowed_res=allowedres)
       for inp, allowedres in zip(kw.inputs1, kw.allowed_residues1)
    ]
+   jobs = [[i] for i in range(len(body_args))]
+
+   def submit_job(ijob, bodies):
+      return pool.submit(
+         rp.search.make_onecomp,
+         bodies[0],
+         spec,
+         hscore,
+         search,
+         sampler,
+         checkpoint=checkpoint_file(ijob, bodies, **kw),
+         **kw,
+      )
 
    exe = concurrent.futures.ProcessPoolExecutor
-   # exe = rp.util.InProcessExecutor
    with exe(kw.ncpu) as pool:
-      futures = list()
-      for ijob, bod in enumerate(bodies):
-         futures.append(
-            pool.submit(
-               rp.search.make_onecomp,
-               bod,
-               spec,
-               hscore,
-               search,
-               sampler,
-               **kw,
-            ))
-         futures[-1].ijob = ijob
-      result = [None] * len(futures)
-      for f in tqdm.tqdm(concurrent.futures.as_completed(futures), total=len(futures)):
-         result[f.ijob] = f.result()
-   
+      result = stream_bodies_and_jobs(pool, body_args, jobs, submit_job, **kw)
+
    result = rp.concat_results(result)
    return result
    # result = rp.search.make_onecomp(bodyC3, spec, hscore, rp.hier_search, sampler, **kw)
@@ -122,30 +163,30 @@ def dock_multicomp(hscore, **kw):
    sampler = rp.sampling.hier_multi_axis_sampler(spec, **kw)
    logging.info(f'num base samples {sampler.size(0):,}')
 
-   bodies = [[rp.Body(fn, allowed_res=ar2, **kw)
-              for fn, ar2 in zip(inp, ar)]
-             for inp, ar in zip(kw.inputs, kw.allowed_residues)]
-   assert len(bodies) == spec.num_components
+   body_args, ibody = list(), list()
+   for inp, ar in zip(kw.inputs, kw.allowed_residues):
+      ibody.append(range(len(body_args), len(body_args) + len(inp)))
+      body_args.extend(dict(source=fn, allowed_res=ar2) for fn, ar2 in zip(inp, ar))
+   assert len(ibody) == spec.num_components
+   jobs = list(itertools.product(*ibody))
+
+   def submit_job(ijob, bodies):
+      return pool.submit(
+         rp.search.make_multicomp,
+         bodies,
+         spec,
+         hscore,
+         rp.hier_search,
+         sampler,
+         checkpoint=checkpoint_file(ijob, bodies, **kw),
+         base_samples=base_samples,
+         **kw,
+      )
 
+   # every job starts from the same iresl 0 samples, generate them once for all workers
    exe = concurrent.futures.ProcessPoolExecutor
-   # exe = rp.util.InProcessExecutor
-   with exe(kw.ncpu) as pool:
-      futures = list()
-      for ijob, bod in enumerate(itertools.product(*bodies)):
-         futures.append(
-            pool.submit(
-               rp.search.make_multicomp,
-               bod,
-               spec,
-               hscore,
-               rp.hier_search,
-               sampler,
-               **kw,
-            ))
-         futures[-1].ijob = ijob
-      result = [None] * len(futures)
-      for f in tqdm.tqdm(concurrent.futures.as_completed(futures), total=len(futures)):
-         result[f.ijob] = f.result()
+   with rp.sampling.SharedBaseSamples(sampler) as base_samples, exe(kw.ncpu) as pool:
+      result = stream_bodies_and_jobs(pool, body_args, jobs, submit_job, **kw)
    result = rp.concat_results(result)
    return result
 
@@ -163,7 +204,8 @@ def dock_plug(hscore, **kw):
       crt_smap = np.arange(crtbnd[0], crtbnd[1] + 0.001, kw.grid_resolution_cart_angstroms)
       ori_samp = np.arange(-180 / kw.nfold, 180 / kw.nfold - 0.001,
                            kw.grid_resolution_ori_degrees)
-      sampler = rp.sampling.grid_sym_axis(crt_smap, ori_samp, axis=[0, 0, 1], flip=[0, 1, 0])
+      grid = rp.sampling.GridSymAxis if kw.grid_topk else rp.sampling.grid_sym_axis
+      sampler = grid(crt_smap, ori_samp, axis=[0, 0, 1], flip=[0, 1, 0])
       logging.info(f'docking samples per splice {len(sampler)}')
    elif kw.docking_method.lower() == 'hier':
       search = rp.hier_search
@@ -173,38 +215,35 @@ def dock_plug(hscore, **kw):
    else:
       raise ValueError(f'unknown search dock_method {kw.dock_method}')
 
-   plug_bodies = [
-      rp.Body(inp, which_ss="H", allowed_res=allowedres, **kw)
+   plug_args = [
+      dict(source=inp, which_ss="H", allowed_res=allowedres)
       for inp, allowedres in zip(kw.inputs1, kw.allowed_residues1)
    ]
-   hole_bodies = [
-      rp.Body(inp, which_ss="H", allowed_res=allowedres, **kw)
+   hole_args = [
+      dict(source=inp, which_ss="H", allowed_res=allowedres)
       for inp, allowedres in zip(kw.inputs2, kw.allowed_residues2)
    ]
+   body_args = plug_args + hole_args
+   jobs = [[i, len(plug_args) + i] for i in range(len(hole_args))]
 
    #assert len(bodies) == spec.num_components
 
+   def submit_job(ijob, bodies):
+      plug, hole = bodies
+      return pool.submit(
+         rp.search.make_plugs,
+         plug,
+         hole,
+         hscore,
+         search,
+         sampler,
+         checkpoint=checkpoint_file(ijob, [plug, hole], **kw),
+         **kw,
+      )
+
    exe = concurrent.futures.ProcessPoolExecutor
-   # exe = rp.util.InProcessExecutor
    with exe(kw.ncpu) as pool:
-      futures = list()
-      for ijob, bod in enumerate(itertools.product(hole_bodies)):
-         hole = hole_bodies[ijob]
-         plug = plug_bodies[ijob]
-         futures.append(
-            pool.submit(
-               rp.search.make_plugs,
-               plug,
-               hole,
-               hscore,
-               search,
-               sampler,
-               **kw,
-            ))
-         futures[-1].ijob = ijob
-      result = [None] * len(futures)
-      for f in tqdm.tqdm(concurrent.futures.as_completed(futures), total=len(futures)):
-         result[f.ijob] = f.result()
+      result = stream_bodies_and_jobs(pool, body_args, jobs, submit_job, **kw)
    result = rp.concat_results(result)
    return result
 
@@ -215,7 +254,18 @@ def main():
 
    logging.info(f'weights: {kw.wts}')
 
-   hscore = rp.CachedProxy(rp.RpxHier(kw.hscore_files, **kw))
+   hscore = rp.RpxHier(kw.hscore_files, **kw)
+   # load the search stage tables up front so worker processes share them, the base and any
+   # finer stages are only loaded if something uses them
+   hscore.preload(kw.nresl)
+   report = hscore.memory_report()
+   logging.info(f'hscore tables loaded: {len(report.loaded)}, not loaded: ' +
+                f'{len(report.not_loaded)} ({report.bytes_not_loaded / 2**20:.1f}MB on disk)')
+   if kw.shared_hscore:
+      # jobs get file names, workers mmap one shared copy of the tables
+      hscore.share()
+   else:
+      hscore = rp.CachedProxy(hscore)
    arch = kw.architecture
 
    # TODO commit to master AK
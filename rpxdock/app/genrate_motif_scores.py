@@ -25,6 +25,8 @@ def get_opts():
    addkw("--smear_params", default=["2,1", "1,1", "1,1", "1,0", "1,0"], type=str, nargs="*")
    # addarg("--smear_params", default=[(2, 0)])
    addkw("--smear_kernel", default="flat", type=str)
+   H = "threads per smear, 0 for one per core. result is identical to a single thread"
+   addkw("--smear_nthread", default=1, type=int, help=H)
    addkw("--only_do_hier", default=-1, type=int)
    addkw("--use_ss_key", default=False, action='store_true')
    kw = parser.parse_args()
@@ -131,6 +131,50 @@ def default_cli_parser(parent=None, **kw):
    addarg(
       "--hscore_data_dir", default='/home/sheffler/data/rpx/hscore',
       help='default path to search for hcores_files. defaults to /home/sheffler/data/rpx/hscore')
+   addarg(
+      "--bvh_dtype", default='f8', choices=['f4', 'f8'],
+      help='precision of body BVHs. f4 keeps docking xforms in float32 end to end, halving memory traffic for xforms and BVH nodes, at ~1e-4 A coordinate error. defaults to f8'
+   )
+   addarg(
+      "--body_cache", default='',
+      help='directory to cache input Bodies in. Bodies are stored as .npz files keyed on the content of the input file and the options that change the Body, and reloading one skips pyrosetta entirely. defaults to no cache'
+   )
+   addarg(
+      "--shared_hscore", action="store_true", default=False,
+      help='move hscore tables into read-only files in /dev/shm that all worker processes mmap, instead of pickling them to each job. Works with any multiprocessing start method. Tables already loaded from .frozen files (see rpxdock/app/util/freeze_hscore.py) are mapped in place. defaults to False'
+   )
+   addarg(
+      "--skip_hscore_base", action="store_true", default=False,
+      help='never load the base ResPairScore of --hscore_files. Docking only needs the hier tables, which are read from disk as each search stage first uses them; the base is only used for some non-docking scoring. defaults to False'
+   )
+   addarg(
+      "--fused_scorepos", action="store_true", default=False,
+      help='in scoring, collect bvh contacts, look them up in the score tables and reduce them to per residue scores in one native pass over all docks (threaded over --nthread), instead of building the full contact and score arrays in python. Same scores. defaults to False'
+   )
+   addarg(
+      "--reuse_contacts", action="store_true", default=False,
+      help='in scoring, let runs of neighboring docks (children of one parent in hierarchical search) share one BVH traversal at a widened contact distance, which each dock then filters down to its own contacts. Same contacts, and scores equivalent up to float rounding, faster at fine search stages where siblings are close together. Scoring then uses the unfused path, so this turns off --fused_scorepos. defaults to False'
+   )
+   addarg(
+      "--grid_topk", type=int, default=0,
+      help='for grid docking, generate and score the grid in chunks, keeping only the best grid_topk samples (plus any scoring above --grid_min_score), so memory does not grow with grid size. defaults to 0, score the whole grid at once'
+   )
+   addarg(
+      "--grid_min_score", type=float, default=None,
+      help='with --grid_topk, also keep every grid sample scoring at least this much. defaults to None'
+   )
+   addarg(
+      "--profile", action="store_true", default=False,
+      help='record wall time, calls and number of samples in each docking stage (sampler expansion, flatness and clash checks, contact collection, score lookup, score summary) per evaluator. The totals are stored in the result attrs as "profile". defaults to False'
+   )
+   addarg(
+      "--profile_trace", default='',
+      help='with --profile, also write each docking run\'s stages as a chrome trace json file named with this prefix, viewable in chrome://tracing or ui.perfetto.dev. defaults to no trace'
+   )
+   addarg(
+      "--checkpoint_dir", default='',
+      help='directory for per job hierarchical search checkpoints, saved after each search stage. A rerun with the same inputs and options resumes each job after its last completed stage, so runs on preemptible queues do not redo finished stages. defaults to no checkpoints'
+   )
    addarg(
       "--max_trim", type=int, default=0,
       help='maximum allowed trimming of residues from docking components. specifying 0 will completely disable trimming, and may allow significantly shorter runtimes. defaults to 0.'
@@ -173,10 +217,22 @@ def default_cli_parser(parent=None, **kw):
       "--beam_size", type=int, default=100000,
       help='Maximum number of samples for each stage of a hierarchical search protocol (except the first, coarsest stage, which must sample all available positions. This is the most important parameter for determining rumtime (aside from number of allowed residues list). defaults to 100,000'
    )
+   addarg(
+      "--hier_prune_topk", type=int, default=0,
+      help='branch and bound for hierarchical search. After the first stage, the best samples are followed to the last stage to get this many completed scores, and at later stages parents scoring below the worst of those are not expanded. This is a heuristic: parent scores from the smeared coarse tables are only approximate upper bounds on their children, so a pruned subtree can occasionally hold a top result (see --hier_prune_slack). defaults to 0, no pruning'
+   )
+   addarg(
+      "--hier_prune_slack", type=float, default=0.9,
+      help='with --hier_prune_topk, parents are pruned if they score below hier_prune_slack times the worst completed score. Coarse scores are not strict upper bounds, so 1.0 can drop good subtrees; lower values prune less but are less likely to. defaults to 0.9, which keeps the top scores of the test search unchanged'
+   )
    addarg(
       "--max_bb_redundancy", type=float, default=3.0,
       help='mimimum distance between outputs from a single docking run. is more-or-less a non-aligned backbone RMSD. defaults to 3.0'
    )
+   addarg(
+      "--redundancy_method", default='coords', choices=['coords', 'xform'],
+      help='how max_bb_redundancy is measured. coords clusters on transformed body centroids, xform clusters on the rigid body xforms directly, with a lever arm from each body\'s radius of gyration. xform is approximate but avoids building coordinates for every result. defaults to coords'
+   )
    addarg(
       "--max_cluster", type=int, default=0,
       help='maximum numer of results to cluster (filter redundancy via max_bb_redundancy) for each dock. defaults to no limit'
@@ -0,0 +1,62 @@
+"""
+write frozen (read-only, mmap'able) copies of hscore hier tables next to the pickles
+
+   python -m rpxdock.app.util.freeze_hscore --hscore_data_dir DIR ALIAS_OR_FILES...
+
+RpxHier then loads foo_hierN.frozen in place of foo_hierN.pickle. The base
+ResPairScore is not an Xmap and stays pickled. With --quantize u1 (or u2) the
+scores are stored as one (two) byte codes, and the deviation from the original
+scores is reported.
+"""
+
+import os, glob, argparse, numpy as np, rpxdock as rp
+
+def freeze_hscore_file(fname, overwrite=False, nsample=1_000_000, quantize=None):
+   out = fname[:-7] + '.frozen'
+   if os.path.exists(out) and not overwrite:
+      print('skip', out)
+      return out
+   t = rp.Timer().start()
+   xmap = rp.util.load(fname)
+   t.checkpoint('load_pickle')
+   if not isinstance(xmap, rp.Xmap):
+      print('skip, not an Xmap:', fname)
+      return None
+   if quantize:
+      orig, xmap = xmap, xmap.quantize(quantize)
+      err = rp.phmap.quantization_error(orig.phmap, xmap.phmap, nsample)
+      lb, ub = err['range']
+      print(f'{out} {quantize} range {lb:.3f} {ub:.3f} step {err["step"]:.5f} abs error',
+            f'max {err["max"]:.5f} mean {err["mean"]:.5f} rms {err["rms"]:.5f}')
+   xmap.dump_frozen(out)
+   t.checkpoint('dump_frozen')
+   frozen = rp.Xmap.load_frozen(out)
+   t.checkpoint('load_frozen')
+   keys = xmap.keys()
+   if len(keys) > nsample: keys = keys[np.random.choice(len(keys), nsample, replace=False)]
+   assert len(frozen) == len(xmap)
+   assert np.all(frozen[keys] == xmap[keys])
+   assert np.all(frozen[keys + 1] == xmap[keys + 1])
+   print(f'{out} n={len(xmap):,} load pickle {t.sum.load_pickle:7.3f}s',
+         f'load frozen {t.sum.load_frozen:7.3f}s')
+   return out
+
+def main():
+   parser = argparse.ArgumentParser()
+   parser.add_argument('files', nargs='+', help='hscore *_hierN.pickle files or aliases')
+   parser.add_argument('--hscore_data_dir', default=None)
+   parser.add_argument('--overwrite', action='store_true', default=False)
+   parser.add_argument('--quantize', choices=['u1', 'u2'], default=None,
+                       help='store scores as 1 or 2 byte codes')
+   args = parser.parse_args()
+   for f in args.files:
+      if f.endswith('.pickle'):
+         fnames = [f]
+      else:
+         fnames = sorted(glob.glob(os.path.join(args.hscore_data_dir, f, '*.pickle')))
+      for fn in fnames:
+         if '_base' in fn: continue
+         freeze_hscore_file(fn, overwrite=args.overwrite, quantize=args.quantize)
+
+if __name__ == '__main__':
+   main()
@@ -1,7 +1,5 @@
-import os, copy, numpy as np, rpxdock, logging, rpxdock as rp
-from pandas.core.internals.concat import trim_join_unit
+import os, copy, functools, hashlib, io, marshal, types, _pickle, numpy as np, rpxdock, logging, rpxdock as rp
 from rpxdock.filter.sscount import secondary_structure_map
-from pyrosetta import rosetta as ros
 
 log = logging.getLogger(__name__)
 _CLASHRAD = 1.75
@@ -99,9 +97,12 @@ class Body:
 
       self.nres = len(self.coord)
       self.stub = rp.motif.bb_stubs(self.coord)
+      # f4 bvhs take the f4 xforms from the samplers without upcasting them
+      self.bvh_dtype = kw.bvh_dtype or getattr(self, 'bvh_dtype', None) or 'f8'
+      BVH = rp.bvh.bvh_type(self.bvh_dtype)
       ids = np.repeat(np.arange(self.nres, dtype=np.int32), self.coord.shape[1])
-      self.bvh_bb = rp.BVH(self.coord[..., :3].reshape(-1, 3), [], ids)
-      self.bvh_bb_atomno = rp.BVH(self.coord[..., :3].reshape(-1, 3), [])
+      self.bvh_bb = BVH(self.coord[..., :3].reshape(-1, 3), [], ids)
+      self.bvh_bb_atomno = BVH(self.coord[..., :3].reshape(-1, 3), [])
       self.allcen = self.stub[:, :, 3]
       which_cen = np.repeat(False, len(self.ss))
       for ss in "EHL":
@@ -119,7 +120,7 @@ class Body:
          allowed_res = np.tile(self.allowed_residues, len(self.ss) // nallow)
       self.which_cen = which_cen & allowed_res
 
-      self.bvh_cen = rp.BVH(self.allcen[:, :3], self.which_cen)
+      self.bvh_cen = BVH(self.allcen[:, :3], self.which_cen)
       self.cen = self.allcen[self.which_cen]
       self.pos = np.eye(4, dtype="f4")
       self.pcavals, self.pcavecs = rp.util.numeric.pca_eig(self.cen)
@@ -221,7 +222,7 @@ class Body:
       ctrim = max_trim if 'C' in self.trim_direction else -1
       # print('intersect_range', mindis, nasym1, self.bvh_bb.max_id(), max_trim, ntrim, ctrim)
       trim = rp.bvh.isect_range(self.bvh_bb, other.bvh_bb, xself, xother, mindis, max_trim, ntrim,
-                                ctrim, nasym1=nasym1)
+                                ctrim, nasym1=nasym1, nthread=kw.get('nthread') or 1)
 
       if debug:
          ok = np.logical_and(trim[0] >= 0, trim[1] >= 0)
@@ -239,7 +240,8 @@ class Body:
    def intersect(self, other, xself=None, xother=None, mindis=2 * _CLASHRAD, **kw):
       xself = self.pos if xself is None else xself
       xother = other.pos if xother is None else xother
-      return rp.bvh.bvh_isect_vec(self.bvh_bb, other.bvh_bb, xself, xother, mindis)
+      return rp.bvh.bvh_isect_vec(self.bvh_bb, other.bvh_bb, xself, xother, mindis,
+                                  nthread=kw.get('nthread') or 1)
 
    def clash_ok(self, *args, **kw):
       return np.logical_not(self.intersect(*args, **kw))
@@ -342,6 +344,7 @@ def get_trimming_subbodies(body, pose, debug=False, **kw):
    kw = rp.Bunch(kw)
    if kw.helix_trim_max == 0 or kw.helix_trim_max is None:
       return [], []
+   from pyrosetta import rosetta as ros
    print('body.ss', ''.join(body.ss))
    ssmap = secondary_structure_map()
    ssmap.map_body_ss(body)
@@ -402,21 +405,21 @@ def get_trimming_subbodies(body, pose, debug=False, **kw):
    trimC_subbodies = list()
    p = ros.core.pose.Pose()
    ros.core.pose.append_subpose_to_pose(p, pose, 1, ub_nc[-hmt - 1])
-   trimC_subbodies.append(Body(p, is_subbody=True))
+   trimC_subbodies.append(Body(p, is_subbody=True, bvh_dtype=kw.bvh_dtype))
    for i, (start, end) in enumerate(zip(lb_nc[-hmt:], ub_nc[-hmt:])):
       p = ros.core.pose.Pose()
       ros.core.pose.append_subpose_to_pose(p, pose, start + 1, end - htnie)
       # print('nc_%i.pdb' % i)
-      trimC_subbodies.append(Body(p, is_subbody=True))
+      trimC_subbodies.append(Body(p, is_subbody=True, bvh_dtype=kw.bvh_dtype))
    trimN_subbodies = list()
    p = ros.core.pose.Pose()
    ros.core.pose.append_subpose_to_pose(p, pose, lb_cn[hmt] + htnie, pose.size())
-   trimN_subbodies.append(Body(p, is_subbody=True))
+   trimN_subbodies.append(Body(p, is_subbody=True, bvh_dtype=kw.bvh_dtype))
    for i, (start, end) in enumerate(zip(lb_cn[:hmt], ub_cn[:hmt])):
       p = ros.core.pose.Pose()
       ros.core.pose.append_subpose_to_pose(p, pose, start + 1 + htnie, end)
       # print('cn_%i.pdb' % i)
-      trimN_subbodies.append(Body(p, is_subbody=True))
+      trimN_subbodies.append(Body(p, is_subbody=True, bvh_dtype=kw.bvh_dtype))
 
    if debug:
       for i, b in enumerate(trimC_subbodies):
@@ -427,4 +430,175 @@ def get_trimming_subbodies(body, pose, debug=False, **kw):
          print('dump body %i' % i)
          b.dump_pdb('trimN_%i.pdb' % i)
 
-   return trimN_subbodies, trimC_subbodies
\ No newline at end of file
+   return trimN_subbodies, trimC_subbodies
+
+
+# bump when the Body layout changes, so stale cache entries are not loaded
+_BODY_CACHE_VERSION = 3
+# keyword args that change the Body built from a file
+_BODY_CACHE_KW = ('score_only_ss', 'bvh_dtype', 'helix_trim_max', 'helix_trim_nres_ignore_end',
+                  'trim_direction', 'components', 'label', 'ignored_aas')
+
+def get_body_cached(source, sym="C1", symaxis=[0, 0, 1], allowed_res=None, body_cache=None,
+                    **kw):
+   """Body(source, ...), stored in and reloaded from directory body_cache
+
+   entries are keyed on the content of the source file and the arguments that change the Body,
+   so renamed or moved inputs still hit, and get pdbfile and default label from their new
+   name. reloading needs no pyrosetta. without body_cache, if source is a pose, or if the args
+   have no stable key (e.g. an allowed_res callable with unpicklable state), this is just
+   Body(...)"""
+   key = None
+   if body_cache and isinstance(source, str):
+      key = body_cache_key(source, sym, symaxis, allowed_res, **kw)
+   if key is None:
+      return Body(source, sym, symaxis, allowed_res=allowed_res, **kw)
+   fname = os.path.join(body_cache, key)
+   if os.path.exists(fname):
+      log.debug(f'get_body_cached loading {fname}')
+      body = load_body(fname)
+      # file content matched, but keep the name this input was given as
+      label = kw.get('label') or os.path.basename(source.replace('.gz', '').replace('.pdb', ''))
+      _rename_bodies(body, body.pdbfile, body.label, source, label, set())
+      return body
+   body = Body(source, sym, symaxis, allowed_res=allowed_res, **kw)
+   os.makedirs(body_cache, exist_ok=True)
+   dump_body(body, fname)
+   return body
+
+def body_cache_key(source, sym="C1", symaxis=[0, 0, 1], allowed_res=None, **kw):
+   """cache file name for get_body_cached, None if the args have no stable key"""
+   try:
+      args = [_BODY_CACHE_VERSION, str(sym), list(np.asarray(symaxis, dtype='f8'))]
+      args.append(_cache_repr(allowed_res))
+      args.extend((k, _cache_repr(kw.get(k))) for k in _BODY_CACHE_KW)
+   except (_NoCacheKey, RecursionError) as e:
+      log.debug(f'body_cache_key: no stable key for {e}, not caching')
+      return None
+   with open(source, 'rb') as inp:
+      h = hashlib.sha1(inp.read())
+   h.update(repr(args).encode())
+   return f'{h.hexdigest()[:20]}.body.npz'
+
+def _rename_bodies(body, pdbfile, label, newpdbfile, newlabel, seen):
+   # body and the asym / trimming bodies built with it carry the name of the cached input
+   if id(body) in seen: return
+   seen.add(id(body))
+   if body.pdbfile == pdbfile: body.pdbfile = newpdbfile
+   if body.label == label: body.label = newlabel
+   for v in vars(body).values():
+      for x in v if isinstance(v, list) else [v]:
+         if isinstance(x, Body):
+            _rename_bodies(x, pdbfile, label, newpdbfile, newlabel, seen)
+
+class _NoCacheKey(Exception):
+   pass
+
+def _cache_repr(val):
+   # residue selectors etc have no stable repr, use their contents. callables are keyed on
+   # their code and captured state, anything else that only reprs as an address has no key
+   if isinstance(val, functools.partial):
+      return 'partial', _cache_repr(val.func), _cache_repr(val.args), _cache_repr(val.keywords)
+   if isinstance(val, types.MethodType):
+      return 'method', _cache_repr(val.__func__), _cache_repr(val.__self__)
+   if isinstance(val, types.FunctionType):
+      return 'function', val.__module__, val.__qualname__, _function_hash(val)
+   if isinstance(val, (list, tuple)):
+      return type(val).__name__, [_cache_repr(v) for v in val]
+   if isinstance(val, dict):
+      return 'dict', sorted((repr(k), _cache_repr(v)) for k, v in val.items())
+   if isinstance(val, (set, frozenset)):
+      return sorted(val)
+   if hasattr(val, '__dict__') and not isinstance(val, type):
+      return type(val).__name__, sorted((k, _cache_repr(v)) for k, v in vars(val).items())
+   r = repr(val)
+   if ' at 0x' in r: raise _NoCacheKey(r)
+   return r
+
+def _function_hash(func):
+   try:
+      h = hashlib.sha1(marshal.dumps(func.__code__))
+   except ValueError:
+      raise _NoCacheKey(repr(func))
+   state = [func.__defaults__, func.__kwdefaults__]
+   for cell in func.__closure__ or ():
+      try:
+         state.append(cell.cell_contents)
+      except ValueError:  # empty cell
+         raise _NoCacheKey(repr(func))
+   h.update(repr(_cache_repr(state)).encode())
+   return h.hexdigest()
+
+def dump_body(body, fname):
+   """write body, its asym_body and trimming subbodies to a flat .npz file
+
+   arrays and BVH states are stored as arrays, everything else is pickled in '__meta__'"""
+   arrays, meta = dict(), dict()
+   _body_to_arrays(body, '', arrays, meta)
+   buf = io.BytesIO()
+   np.savez(buf, __meta__=np.frombuffer(_pickle.dumps(meta), dtype='u1'), **arrays)
+   tmp = fname + f'.tmp{os.getpid()}'
+   with open(tmp, 'wb') as out:
+      out.write(buf.getbuffer())
+   os.replace(tmp, fname)
+
+def load_body(fname):
+   """load a Body written by dump_body"""
+   with np.load(fname) as npz:
+      arrays = dict(npz.items())
+   meta = _pickle.loads(arrays.pop('__meta__').tobytes())
+   return _body_from_arrays('', arrays, meta)
+
+def _is_bvh(val):
+   return isinstance(val, (rp.bvh.BVH, rp.bvh.BVH_f4))
+
+def _body_to_arrays(body, prefix, arrays, meta):
+   fields = dict()
+   for k, v in vars(body).items():
+      key = prefix + k
+      if isinstance(v, np.ndarray) and v.dtype != object:
+         fields[k] = 'array',
+         arrays[key] = v
+      elif _is_bvh(v):
+         state = v.__getstate__()
+         fields[k] = 'bvh', type(v).__name__, len(state)
+         for i, x in enumerate(state):
+            arrays[f'{key}.{i}'] = x
+      elif v is body:
+         fields[k] = 'self',
+      elif isinstance(v, Body):
+         fields[k] = 'body',
+         _body_to_arrays(v, key + '/', arrays, meta)
+      elif isinstance(v, list) and v and all(isinstance(x, Body) for x in v):
+         fields[k] = 'bodies', len(v)
+         for i, x in enumerate(v):
+            _body_to_arrays(x, f'{key}/{i}/', arrays, meta)
+      elif isinstance(v, list) and v and all(isinstance(x, np.ndarray) for x in v):
+         fields[k] = 'arraylist', [len(x) for x in v]
+         arrays[key] = np.concatenate(v)
+      else:
+         fields[k] = 'value', v
+   meta[prefix] = fields
+
+def _body_from_arrays(prefix, arrays, meta):
+   body = Body.__new__(Body)
+   for k, (kind, *val) in meta[prefix].items():
+      key = prefix + k
+      if kind == 'array':
+         v = arrays[key]
+      elif kind == 'bvh':
+         bvhtype = getattr(rp.bvh, val[0])
+         v = bvhtype.__new__(bvhtype)
+         v.__setstate__(tuple(arrays[f'{key}.{i}'] for i in range(val[1])))
+      elif kind == 'self':
+         v = body
+      elif kind == 'body':
+         v = _body_from_arrays(key + '/', arrays, meta)
+      elif kind == 'bodies':
+         v = [_body_from_arrays(f'{key}/{i}/', arrays, meta) for i in range(val[0])]
+      elif kind == 'arraylist':
+         v = np.split(arrays[key], np.cumsum(val[0])[:-1])
+      else:
+         v = val[0]
+      setattr(body, k, v)
+   return body
@@ -1,3 +1,10 @@
-from cppimport import import_hook
+import numpy as np
 from rpxdock.bvh.bvh import *
 BVH = SphereBVH_double
+BVH_f8 = SphereBVH_double
+BVH_f4 = SphereBVH_float
+
+def bvh_type(dtype=None):
+   '''SphereBVH_float for 'f4', SphereBVH_double for 'f8' or None'''
+   if dtype is None: return BVH
+   return dict(f4=BVH_f4, f8=BVH_f8)[np.dtype(dtype).str[1:]]
@@ -3,8 +3,8 @@
 cfg['include_dirs'] = ['../..','../extern']
 cfg['compiler_args'] = ['-std=c++17', '-w', '-Ofast']
 cfg['dependencies'] = ['../geom/primitive.hpp','../util/assertions.hpp',
-'../util/global_rng.hpp', 'bvh.hpp', 'bvh_algo.hpp', '../util/numeric.hpp',
-'../util/pybind_types.hpp']
+'../util/global_rng.hpp', 'bvh.hpp', 'bvh_algo.hpp', 'bvh_ptidx.hpp', '../util/numeric.hpp',
+'../util/pybind_types.hpp', '../util/parallel.hpp']
 
 cfg['parallel'] = False
 
@@ -14,6 +14,7 @@ setup_pybind11(cfg)
 /** \file */
 
 #include "rpxdock/bvh/bvh.hpp"
+#include "rpxdock/bvh/bvh_ptidx.hpp"
 
 #include <pybind11/eigen.h>
 #include <pybind11/numpy.h>
@@ -24,6 +25,7 @@ setup_pybind11(cfg)
 #include "rpxdock/util/assertions.hpp"
 #include "rpxdock/util/global_rng.hpp"
 #include "rpxdock/util/numeric.hpp"
+#include "rpxdock/util/parallel.hpp"
 #include "rpxdock/util/pybind_types.hpp"
 #include "rpxdock/util/types.hpp"
 
@@ -35,32 +37,6 @@ using namespace geom;
 
 namespace py = pybind11;
 
-namespace Eigen {
-
-template <class F>
-struct PtIdx {
-  PtIdx() : pos(0), idx(0) {}
-  PtIdx(V3<F> v, int i = 0) : pos(v), idx(i) {}
-  V3<F> pos;
-  int idx;
-};
-template <typename F>
-auto bounding_vol(V3<F> v) {
-  return Sphere<F>(v);
-}
-template <typename F>
-auto bounding_vol(PtIdx<F> v) {
-  auto s = Sphere<F>(v.pos);
-  s.lb = s.ub = v.idx;
-  return s;
-}
-}  // namespace Eigen
-
-template <typename F>
-using BVH = rpxdock::bvh::SphereBVH<F, PtIdx<F>>;
-using BVHf = BVH<float>;
-using BVHd = BVH<double>;
-
 namespace rpxdock {
 namespace bvh {
 
@@ -314,7 +290,7 @@ bool bvh_isect(BVH<F> &bvh1, BVH<F> &bvh2, M4<F> pos1, M4<F> pos2, F mindist) {
 }
 template <typename F>
 Vx<bool> bvh_isect_vec(BVH<F> &bvh1, BVH<F> &bvh2, py::array_t<F> pos1,
-                       py::array_t<F> pos2, F mindist) {
+                       py::array_t<F> pos2, F mindist, int nthread) {
   auto x1 = xform_py_to_eigen(pos1);
   auto x2 = xform_py_to_eigen(pos2);
   if (x1.size() != x2.size() && x1.size() != 1 && x2.size() != 1)
@@ -322,15 +298,17 @@ Vx<bool> bvh_isect_vec(BVH<F> &bvh1, BVH<F> &bvh2, py::array_t<F> pos1,
   py::gil_scoped_release release;
   size_t n = std::max(x1.size(), x2.size());
   Vx<bool> out(n);
-  for (size_t i = 0; i < n; ++i) {
-    size_t i1 = x1.size() == 1 ? 0 : i;
-    size_t i2 = x2.size() == 1 ? 0 : i;
-    X3<F> xi1 = x1[i1];
-    X3<F> x11inv = xi1.inverse();
-    BVHIsectQuery<F> query(mindist, x11inv * x2[i2]);
-    rpxdock::bvh::BVIntersect(bvh1, bvh2, query);
-    out[i] = query.result;
-  }
+  parallel_chunks(n, nthread, [&](int, size_t b, size_t e) {
+    for (size_t i = b; i < e; ++i) {
+      size_t i1 = x1.size() == 1 ? 0 : i;
+      size_t i2 = x2.size() == 1 ? 0 : i;
+      X3<F> xi1 = x1[i1];
+      X3<F> x11inv = xi1.inverse();
+      BVHIsectQuery<F> query(mindist, x11inv * x2[i2]);
+      rpxdock::bvh::BVIntersect(bvh1, bvh2, query);
+      out[i] = query.result;
+    }
+  });
   return out;
 }
 template <typename F>
@@ -411,7 +389,7 @@ template <typename F>
 py::tuple bvh_isect_fixed_range_vec(BVH<F> &bvh1, BVH<F> &bvh2,
                                     py::array_t<F> pos1, py::array_t<F> pos2,
                                     F mindist, Vx<int> lb1, Vx<int> ub1,
-                                    Vx<int> lb2, Vx<int> ub2) {
+                                    Vx<int> lb2, Vx<int> ub2, int nthread) {
   auto x1 = xform_py_to_eigen(pos1);
   auto x2 = xform_py_to_eigen(pos2);
   if (x1.size() != x2.size() && x1.size() != 1 && x2.size() != 1)
@@ -434,20 +412,22 @@ py::tuple bvh_isect_fixed_range_vec(BVH<F> &bvh1, BVH<F> &bvh2,
     // std::cout << lb1[0] << " " << ub1[0] << " " << lb2[0] << " " << ub2[0]
     // << std::endl;
 
-    for (size_t i = 0; i < n; ++i) {
-      size_t i1 = x1.size() == 1 ? 0 : i;
-      size_t i2 = x2.size() == 1 ? 0 : i;
-      int ilb1 = lb1.size() == 1 ? lb1[0] : lb1[i];
-      int iub1 = ub1.size() == 1 ? ub1[0] : ub1[i];
-      int ilb2 = lb2.size() == 1 ? lb2[0] : lb2[i];
-      int iub2 = ub2.size() == 1 ? ub2[0] : ub2[i];
-      BVHIsectFixedRangeQuery<F> query(mindist, x1[i1].inverse() * x2[i2], ilb1,
-                                       iub1, ilb2, iub2);
-      rpxdock::bvh::BVIntersect(bvh1, bvh2, query);
-      out[i] = query.result;
-      clashid(i, 0) = query.clashidA;
-      clashid(i, 1) = query.clashidB;
-    }
+    parallel_chunks(n, nthread, [&](int, size_t b, size_t e) {
+      for (size_t i = b; i < e; ++i) {
+        size_t i1 = x1.size() == 1 ? 0 : i;
+        size_t i2 = x2.size() == 1 ? 0 : i;
+        int ilb1 = lb1.size() == 1 ? lb1[0] : lb1[i];
+        int iub1 = ub1.size() == 1 ? ub1[0] : ub1[i];
+        int ilb2 = lb2.size() == 1 ? lb2[0] : lb2[i];
+        int iub2 = ub2.size() == 1 ? ub2[0] : ub2[i];
+        BVHIsectFixedRangeQuery<F> query(mindist, x1[i1].inverse() * x2[i2],
+                                         ilb1, iub1, ilb2, iub2);
+        rpxdock::bvh::BVIntersect(bvh1, bvh2, query);
+        out[i] = query.result;
+        clashid(i, 0) = query.clashidA;
+        clashid(i, 1) = query.clashidB;
+      }
+    });
   }
   return py::make_tuple(out, clashid);
 }
@@ -566,8 +546,8 @@ query obj takes clash dist, and calls BVIntersect and returns lb and ub arrays o
 */
 py::tuple isect_range(BVH<F> &bvh1, BVH<F> &bvh2, py::array_t<F> pos1,
                       py::array_t<F> pos2, F mindist, int maxtrim = -1,
-                      int maxtrim_lb = -1, int maxtrim_ub = -1,
-                      int nasym1 = -1) {
+                      int maxtrim_lb = -1, int maxtrim_ub = -1, int nasym1 = -1,
+                      int nthread = 1) {
   auto x1 = xform_py_to_eigen(pos1);
   auto x2 = xform_py_to_eigen(pos2);
   if (x1.size() != x2.size() && x1.size() != 1 && x2.size() != 1)
@@ -580,19 +560,20 @@ py::tuple isect_range(BVH<F> &bvh1, BVH<F> &bvh2, py::array_t<F> pos1,
     size_t n = std::max(x1.size(), x2.size());
     lb->resize(n);
     ub->resize(n);
-    BVHIsectRange<F> query(mindist, X3<F>::Identity(), bvh_max_id(bvh1), -1,
-                           maxtrim, maxtrim_lb, maxtrim_ub, nasym1);
-
-    for (size_t i = 0; i < n; ++i) {
-      size_t i1 = x1.size() == 1 ? 0 : i;
-      size_t i2 = x2.size() == 1 ? 0 : i;
-      query.bXa = x1[i1].inverse() * x2[i2];
-      query.lb = 0;
-      query.ub = nasym1 < 0 ? bvh_max_id(bvh1) : nasym1 - 1;
-      rpxdock::bvh::BVIntersect(bvh1, bvh2, query);
-      (*lb)[i] = query.lb;
-      (*ub)[i] = query.ub;
-    }
+    parallel_chunks(n, nthread, [&](int, size_t b, size_t e) {
+      BVHIsectRange<F> query(mindist, X3<F>::Identity(), bvh_max_id(bvh1), -1,
+                             maxtrim, maxtrim_lb, maxtrim_ub, nasym1);
+      for (size_t i = b; i < e; ++i) {
+        size_t i1 = x1.size() == 1 ? 0 : i;
+        size_t i2 = x2.size() == 1 ? 0 : i;
+        query.bXa = x1[i1].inverse() * x2[i2];
+        query.lb = 0;
+        query.ub = nasym1 < 0 ? bvh_max_id(bvh1) : nasym1 - 1;
+        rpxdock::bvh::BVIntersect(bvh1, bvh2, query);
+        (*lb)[i] = query.lb;
+        (*ub)[i] = query.ub;
+      }
+    });
   }
   return py::make_tuple(*lb, *ub);
 }
@@ -694,20 +675,22 @@ F bvh_slide(BVH<F> &bvh1, BVH<F> &bvh2, M4<F> pos1, M4<F> pos2, F rad,
 }
 template <typename F>
 Vx<F> bvh_slide_vec(BVH<F> &bvh1, BVH<F> &bvh2, py::array_t<F> pos1,
-                    py::array_t<F> pos2, F rad, V3<F> dirn) {
+                    py::array_t<F> pos2, F rad, V3<F> dirn, int nthread) {
   auto x1 = xform_py_to_eigen(pos1);
   auto x2 = xform_py_to_eigen(pos2);
   if (x1.size() != x2.size())
     throw std::runtime_error("pos1 and pos2 must have same len");
   py::gil_scoped_release release;
   Vx<F> slides(x1.size());
-  for (size_t i = 0; i < x1.size(); ++i) {
-    X3<F> x1inv = x1[i].inverse();
-    X3<F> pos = x1inv * x2[i];
-    V3<F> local_dir = x1inv.rotation() * dirn;
-    BVMinAxis<F> query(local_dir, pos, rad);
-    slides[i] = rpxdock::bvh::BVMinimize(bvh1, bvh2, query);
-  }
+  parallel_chunks(x1.size(), nthread, [&](int, size_t b, size_t e) {
+    for (size_t i = b; i < e; ++i) {
+      X3<F> x1inv = x1[i].inverse();
+      X3<F> pos = x1inv * x2[i];
+      V3<F> local_dir = x1inv.rotation() * dirn;
+      BVMinAxis<F> query(local_dir, pos, rad);
+      slides[i] = rpxdock::bvh::BVMinimize(bvh1, bvh2, query);
+    }
+  });
   return slides;
 }
 
@@ -747,7 +730,7 @@ int bvh_count_pairs(BVH<F> &bvh1, BVH<F> &bvh2, M4<F> pos1, M4<F> pos2,
 }
 template <typename F>
 Vx<int> bvh_count_pairs_vec(BVH<F> &bvh1, BVH<F> &bvh2, py::array_t<F> pos1,
-                            py::array_t<F> pos2, F maxdist) {
+                            py::array_t<F> pos2, F maxdist, int nthread) {
   auto x1 = xform_py_to_eigen(pos1);
   auto x2 = xform_py_to_eigen(pos2);
   if (x1.size() != x2.size() && x1.size() != 1 && x2.size() != 1)
@@ -755,14 +738,16 @@ Vx<int> bvh_count_pairs_vec(BVH<F> &bvh1, BVH<F> &bvh2, py::array_t<F> pos1,
   py::gil_scoped_release release;
   size_t n = std::max(x1.size(), x2.size());
   Vx<int> npair(n);
-  for (size_t i = 0; i < x1.size(); ++i) {
-    size_t i1 = x1.size() == 1 ? 0 : i;
-    size_t i2 = x2.size() == 1 ? 0 : i;
-    X3<F> pos = x1[i1].inverse() * x2[i2];
-    BVHCountPairs<F> query(maxdist, pos);
-    rpxdock::bvh::BVIntersect(bvh1, bvh2, query);
-    npair[i] = query.nout;
-  }
+  parallel_chunks(n, nthread, [&](int, size_t b, size_t e) {
+    for (size_t i = b; i < e; ++i) {
+      size_t i1 = x1.size() == 1 ? 0 : i;
+      size_t i2 = x2.size() == 1 ? 0 : i;
+      X3<F> pos = x1[i1].inverse() * x2[i2];
+      BVHCountPairs<F> query(maxdist, pos);
+      rpxdock::bvh::BVIntersect(bvh1, bvh2, query);
+      npair[i] = query.nout;
+    }
+  });
   return npair;
 }
 template <typename F>
@@ -901,10 +886,40 @@ struct BVHCollectPairsVec {
   }
 };
 
+/// pairs found by one thread for a contiguous run of positions
+struct PairsChunk {
+  std::vector<int32_t> pairs;
+  std::vector<int32_t> npair;
+};
+/// concatenate chunks in thread order, so pairs and lbub are in position order
+void merge_pairs_chunks(std::vector<PairsChunk> const &chunks, size_t n,
+                        Mx<int32_t> &out,
+                        Matrix<int, Dynamic, 2, RowMajor> &lbub) {
+  size_t ntot = 0;
+  for (auto &c : chunks) ntot += c.pairs.size() / 2;
+  out.resize(ntot, 2);
+  lbub.resize(n, 2);
+  int32_t np = 0;
+  size_t i = 0;
+  for (auto &c : chunks) {
+    for (size_t j = 0; j < c.pairs.size() / 2; ++j) {
+      out(np + j, 0) = c.pairs[2 * j + 0];
+      out(np + j, 1) = c.pairs[2 * j + 1];
+    }
+    for (int32_t npair : c.npair) {
+      lbub(i, 0) = np;
+      np += npair;
+      lbub(i, 1) = np;
+      ++i;
+    }
+  }
+  if (i != n) throw std::runtime_error("merge_pairs_chunks error");
+}
+
 template <typename F, typename XF>
 py::tuple bvh_collect_pairs_vec(BVH<F> &bvh1, BVH<F> &bvh2,
                                 py::array_t<XF> pos1, py::array_t<XF> pos2,
-                                F maxdist) {
+                                F maxdist, int nthread) {
   auto x1 = xform_py_to_eigen(pos1);
   auto x2 = xform_py_to_eigen(pos2);
   if (x1.size() != x2.size() && x1.size() != 1 && x2.size() != 1)
@@ -915,23 +930,21 @@ py::tuple bvh_collect_pairs_vec(BVH<F> &bvh1, BVH<F> &bvh2,
   {
     py::gil_scoped_release release;
     size_t n = std::max(x1.size(), x2.size());
-    lbub->resize(n, 2);
-    std::vector<int32_t> pairs;
-    pairs.reserve(10 * n);
-    for (size_t i = 0; i < n; ++i) {
-      size_t i1 = x1.size() == 1 ? 0 : i;
-      size_t i2 = x2.size() == 1 ? 0 : i;
-      X3<F> pos = (x1[i1].inverse() * x2[i2]).template cast<F>();
-      BVHCollectPairsVec<F> query(maxdist, pos, pairs);
-      (*lbub)(i, 0) = pairs.size() / 2;
-      rpxdock::bvh::BVIntersect(bvh1, bvh2, query);
-      (*lbub)(i, 1) = pairs.size() / 2;
-    }
-    out->resize(pairs.size() / 2, 2);
-    for (size_t i = 0; i < pairs.size() / 2; ++i) {
-      (*out)(i, 0) = pairs[2 * i + 0];
-      (*out)(i, 1) = pairs[2 * i + 1];
-    }
+    std::vector<PairsChunk> chunks(resolve_nthread(nthread, n));
+    parallel_chunks(n, chunks.size(), [&](int ithread, size_t b, size_t e) {
+      auto &pairs = chunks[ithread].pairs;
+      pairs.reserve(10 * (e - b));
+      for (size_t i = b; i < e; ++i) {
+        size_t i1 = x1.size() == 1 ? 0 : i;
+        size_t i2 = x2.size() == 1 ? 0 : i;
+        X3<F> pos = (x1[i1].inverse() * x2[i2]).template cast<F>();
+        BVHCollectPairsVec<F> query(maxdist, pos, pairs);
+        size_t lb = pairs.size();
+        rpxdock::bvh::BVIntersect(bvh1, bvh2, query);
+        chunks[ithread].npair.push_back((pairs.size() - lb) / 2);
+      }
+    });
+    merge_pairs_chunks(chunks, n, *out, *lbub);
   }
   return py::make_tuple(*out, *lbub);
 }
@@ -993,7 +1006,8 @@ py::tuple bvh_collect_pairs_range_vec(BVH<F> &bvh1, BVH<F> &bvh2,
                                       py::array_t<XF> pos1,
                                       py::array_t<XF> pos2, F maxdist,
                                       Vx<int> lb1, Vx<int> ub1, int nasym1,
-                                      Vx<int> lb2, Vx<int> ub2, int nasym2) {
+                                      Vx<int> lb2, Vx<int> ub2, int nasym2,
+                                      int nthread) {
   auto x1 = xform_py_to_eigen(pos1);
   auto x2 = xform_py_to_eigen(pos2);
   if (x1.size() != x2.size() && x1.size() != 1 && x2.size() != 1)
@@ -1026,33 +1040,157 @@ py::tuple bvh_collect_pairs_range_vec(BVH<F> &bvh1, BVH<F> &bvh2,
     // std::cout << bvh2.size() << " " << nasym2 << " "
     // << (float)bvh2.size() / nasym2 << std::endl;
     n = n0 ? n : 0;
-    lbub->resize(n, 2);
-    std::vector<int32_t> pairs;
-    pairs.reserve(10 * n);
+    std::vector<PairsChunk> chunks(resolve_nthread(nthread, n));
+    parallel_chunks(n, chunks.size(), [&](int ithread, size_t b, size_t e) {
+      auto &pairs = chunks[ithread].pairs;
+      pairs.reserve(10 * (e - b));
+      for (size_t i = b; i < e; ++i) {
+        size_t ix1 = x1.size() == 1 ? 0 : i;
+        size_t ix2 = x2.size() == 1 ? 0 : i;
+        int l1 = lb1.size() == 1 ? lb1[0] : lb1[i];
+        int l2 = lb2.size() == 1 ? lb2[0] : lb2[i];
+        int u1 = ub1.size() == 1 ? ub1[0] : ub1[i];
+        int u2 = ub2.size() == 1 ? ub2[0] : ub2[i];
+
+        // std::cout << "cpp " << i << " " << l1 << "-" << u1 << " " << nasym1
+        // << " " << l2 << "-" << u2 << " " << nasym2 << std::endl;
+
+        X3<F> pos = (x1[ix1].inverse() * x2[ix2]).template cast<F>();
+        BVHCollectPairsRangeVec<F> query(maxdist, pos, l1, u1, l2, u2, nasym1,
+                                         nasym2, pairs);
+        size_t lb = pairs.size();
+        rpxdock::bvh::BVIntersect(bvh1, bvh2, query);
+        chunks[ithread].npair.push_back((pairs.size() - lb) / 2);
+      }
+    });
+    merge_pairs_chunks(chunks, n, *out, *lbub);
+  }
+  return py::make_tuple(*out, *lbub);
+}
+
+/// candidate pair for bvh_collect_pairs_grouped_vec, with both positions
+template <typename F>
+struct PairPos {
+  int32_t idx1, idx2;
+  V3<F> pos1, pos2;
+};
+
+template <typename F>
+struct BVHCollectPairPosVec {
+  using Scalar = F;
+  using Xform = X3<F>;
+  F maxdis = 0.0, maxdis2 = 0.0;
+  Xform bXa = Xform::Identity();
+  std::vector<PairPos<F>> &out;
+  BVHCollectPairPosVec(F r, Xform x, std::vector<PairPos<F>> &o)
+      : maxdis(r), bXa(x), out(o), maxdis2(r * r) {}
+  bool intersectVolumeVolume(Sphere<F> vol1, Sphere<F> vol2) {
+    return vol1.signdis(bXa * vol2) < maxdis;
+  }
+  bool intersectVolumeObject(Sphere<F> vol1, PtIdx<F> obj2) {
+    return vol1.signdis(bXa * obj2.pos) < maxdis;
+  }
+  bool intersectObjectVolume(PtIdx<F> obj1, Sphere<F> vol2) {
+    return (bXa * vol2).signdis(obj1.pos) < maxdis;
+  }
+  bool intersectObjectObject(PtIdx<F> obj1, PtIdx<F> obj2) {
+    if ((obj1.pos - bXa * obj2.pos).squaredNorm() < maxdis2)
+      out.push_back(PairPos<F>{obj1.idx, obj2.idx, obj1.pos, obj2.pos});
+    return false;
+  }
+};
+
+/**
+ * @brief bvh_collect_pairs_range_vec, sharing traversals between nearby docks
+ *
+ * consecutive positions are grouped while none moves a bvh2 object more than
+ * maxwide from where the group's first position puts it. hier_search expands
+ * each parent's children consecutively, so at fine levels groups are
+ * siblings. each group is traversed once at its first position with maxdist
+ * widened by the farthest any member moves, giving a pair list that holds
+ * every member's pairs, and members filter that list by their own distance
+ * and bounds. output is the same set of pairs as bvh_collect_pairs_range_vec,
+ * though order within a position may differ
+ */
+template <typename F, typename XF>
+py::tuple bvh_collect_pairs_grouped_vec(BVH<F> &bvh1, BVH<F> &bvh2,
+                                        py::array_t<XF> pos1,
+                                        py::array_t<XF> pos2, F maxdist,
+                                        F maxwide, Vx<int> lb1, Vx<int> ub1,
+                                        int nasym1, Vx<int> lb2, Vx<int> ub2,
+                                        int nasym2, int nthread) {
+  auto x1 = xform_py_to_eigen(pos1);
+  auto x2 = xform_py_to_eigen(pos2);
+  size_t n = std::max(x1.size(), x2.size());
+  if (x1.size() != x2.size() && x1.size() != 1 && x2.size() != 1)
+    throw std::runtime_error("pos1/pos2 must be broadcastable");
+  for (auto nb : {lb1.size(), ub1.size(), lb2.size(), ub2.size()})
+    if (nb != 1 && nb != n)
+      throw std::runtime_error("bounds must be len 1 or len pos");
+
+  auto lbub = std::make_unique<Matrix<int, Dynamic, 2, RowMajor>>();
+  auto out = std::make_unique<Mx<int32_t>>();
+  {
+    py::gil_scoped_release release;
+    if (nasym1 < 0) nasym1 = bvh_max_id(bvh1) + 1;
+    if (nasym2 < 0) nasym2 = bvh_max_id(bvh2) + 1;
+    F rad2 = 0;
+    for (auto o : bvh2.objs) rad2 = std::max(rad2, o.pos.norm());
+    std::vector<X3<F>> rel(n);
     for (size_t i = 0; i < n; ++i) {
-      size_t ix1 = x1.size() == 1 ? 0 : i;
-      size_t ix2 = x2.size() == 1 ? 0 : i;
-      int l1 = lb1.size() == 1 ? lb1[0] : lb1[i];
-      int l2 = lb2.size() == 1 ? lb2[0] : lb2[i];
-      int u1 = ub1.size() == 1 ? ub1[0] : ub1[i];
-      int u2 = ub2.size() == 1 ? ub2[0] : ub2[i];
-
-      // std::cout << "cpp " << i << " " << l1 << "-" << u1 << " " << nasym1 <<
-      // " "
-      // << l2 << "-" << u2 << " " << nasym2 << std::endl;
-
-      X3<F> pos = (x1[ix1].inverse() * x2[ix2]).template cast<F>();
-      BVHCollectPairsRangeVec<F> query(maxdist, pos, l1, u1, l2, u2, nasym1,
-                                       nasym2, pairs);
-      (*lbub)(i, 0) = pairs.size() / 2;
-      rpxdock::bvh::BVIntersect(bvh1, bvh2, query);
-      (*lbub)(i, 1) = pairs.size() / 2;
+      size_t i1 = x1.size() == 1 ? 0 : i, i2 = x2.size() == 1 ? 0 : i;
+      rel[i] = (x1[i1].inverse() * x2[i2]).template cast<F>();
     }
-    out->resize(pairs.size() / 2, 2);
-    for (size_t i = 0; i < pairs.size() / 2; ++i) {
-      (*out)(i, 0) = pairs[2 * i + 0];
-      (*out)(i, 1) = pairs[2 * i + 1];
+    // |x*p - c*p| <= |dt| + |R-Rc|_2 |p|, and |R-Rc|_2 = sqrt(3 - tr(Rc'R))
+    auto move = [&](X3<F> const &x, X3<F> const &c) {
+      F tr = (c.linear().transpose() * x.linear()).trace();
+      return (x.translation() - c.translation()).norm() +
+             std::sqrt(std::max(F(0), 3 - tr)) * rad2;
+    };
+    std::vector<size_t> gbeg{0};
+    std::vector<F> wide{0};
+    for (size_t i = 1; i < n; ++i) {
+      F m = move(rel[i], rel[gbeg.back()]);
+      if (m > maxwide) {
+        gbeg.push_back(i);
+        wide.push_back(0);
+      } else {
+        wide.back() = std::max(wide.back(), m);
+      }
     }
+    size_t ngroup = n ? gbeg.size() : 0;
+    gbeg.push_back(n);
+
+    F d2 = maxdist * maxdist;
+    std::vector<PairsChunk> chunks(resolve_nthread(nthread, ngroup));
+    parallel_chunks(ngroup, chunks.size(), [&](int ith, size_t b, size_t e) {
+      auto &pairs = chunks[ith].pairs;
+      std::vector<PairPos<F>> cand;
+      for (size_t g = b; g < e; ++g) {
+        cand.clear();
+        F rad = wide[g] > 0 ? maxdist + wide[g] + F(1e-3) : maxdist;
+        BVHCollectPairPosVec<F> query(rad, rel[gbeg[g]], cand);
+        rpxdock::bvh::BVIntersect(bvh1, bvh2, query);
+        for (size_t i = gbeg[g]; i < gbeg[g + 1]; ++i) {
+          int l1 = lb1.size() == 1 ? lb1[0] : lb1[i];
+          int l2 = lb2.size() == 1 ? lb2[0] : lb2[i];
+          int u1 = ub1.size() == 1 ? ub1[0] : ub1[i];
+          int u2 = ub2.size() == 1 ? ub2[0] : ub2[i];
+          size_t lb = pairs.size();
+          for (auto const &c : cand) {
+            if (c.idx1 % nasym1 < l1 || c.idx1 % nasym1 > u1 ||
+                c.idx2 % nasym2 < l2 || c.idx2 % nasym2 > u2)
+              continue;
+            if ((c.pos1 - rel[i] * c.pos2).squaredNorm() < d2) {
+              pairs.push_back(c.idx1);
+              pairs.push_back(c.idx2);
+            }
+          }
+          chunks[ith].npair.push_back((pairs.size() - lb) / 2);
+        }
+      }
+    });
+    merge_pairs_chunks(chunks, n, *out, *lbub);
   }
   return py::make_tuple(*out, *lbub);
 }
@@ -1166,77 +1304,89 @@ void bind_bvh(auto m, std::string name) {
       /**/;
 }
 
-PYBIND11_MODULE(bvh, m) {
-  // bind_bvh<float>(m, "SphereBVH_float");
-  bind_bvh<double>(m, "SphereBVH_double");
-
-  m.def("bvh_min_dist", &bvh_min_dist<double>, "min pair distance", "bvh1"_a,
+/// bindings for BVH<F>, overloads on the BVH type select the precision
+template <typename F>
+void bind_bvh_funcs(py::module m) {
+  m.def("bvh_min_dist", &bvh_min_dist<F>, "min pair distance", "bvh1"_a,
+        "bvh2"_a, "pos1"_a, "pos2"_a);
+  m.def("bvh_min_dist_vec", &bvh_min_dist_vec<F>, "min pair distance", "bvh1"_a,
         "bvh2"_a, "pos1"_a, "pos2"_a);
-  m.def("bvh_min_dist_vec", &bvh_min_dist_vec<double>, "min pair distance",
-        "bvh1"_a, "bvh2"_a, "pos1"_a, "pos2"_a);
-  // m.def("bvh_min_dist_32bit", &bvh_min_dist<float>, "intersction test",
-  // "bvh1"_a, "bvh2"_a, "pos1"_a, "pos2"_a);
-  m.def("bvh_min_dist_fixed", &bvh_min_dist_fixed<double>);
-  m.def("naive_min_dist", &naive_min_dist<double>);
-  m.def("naive_min_dist_fixed", &naive_min_dist_fixed<double>);
-
-  m.def("bvh_isect", &bvh_isect<double>, "intersction test", "bvh1"_a, "bvh2"_a,
+  m.def("bvh_min_dist_fixed", &bvh_min_dist_fixed<F>);
+  m.def("naive_min_dist", &naive_min_dist<F>);
+  m.def("naive_min_dist_fixed", &naive_min_dist_fixed<F>);
+
+  m.def("bvh_isect", &bvh_isect<F>, "intersction test", "bvh1"_a, "bvh2"_a,
         "pos1"_a, "pos2"_a, "mindist"_a);
-  m.def("bvh_isect_vec", &bvh_isect_vec<double>, "intersction test", "bvh1"_a,
-        "bvh2"_a, "pos1"_a, "pos2"_a, "mindist"_a);
-  // m.def("bvh_isect_32bit", &bvh_isect<float>, "intersction test", "bvh1"_a,
-  // "bvh2"_a, "pos1"_a, "pos2"_a, "mindist"_a);
-  m.def("bvh_isect_fixed", &bvh_isect_fixed<double>);
-  m.def("naive_isect", &naive_isect<double>);
-  m.def("naive_isect_fixed", &naive_isect_fixed<double>);
+  m.def("bvh_isect_vec", &bvh_isect_vec<F>, "intersction test", "bvh1"_a,
+        "bvh2"_a, "pos1"_a, "pos2"_a, "mindist"_a, "nthread"_a = 1);
+  m.def("bvh_isect_fixed", &bvh_isect_fixed<F>);
+  m.def("naive_isect", &naive_isect<F>);
+  m.def("naive_isect_fixed", &naive_isect_fixed<F>);
 
   Vx<int> default_ub(1), default_lb(1);
   default_lb[0] = 0;
   default_ub[0] = 99999999;
-  m.def("bvh_isect_fixed_range_vec", &bvh_isect_fixed_range_vec<double>,
+  m.def("bvh_isect_fixed_range_vec", &bvh_isect_fixed_range_vec<F>,
         "intersction test with input range", "bvh1"_a, "bvh2"_a, "pos1"_a,
         "pos2"_a, "mindist"_a, "lb1"_a = default_lb, "ub1"_a = default_ub,
-        "lb2"_a = default_lb, "ub2"_a = default_ub);
+        "lb2"_a = default_lb, "ub2"_a = default_ub, "nthread"_a = 1);
 
-  m.def("isect_range_single", &isect_range_single<double>, "intersction test",
+  m.def("isect_range_single", &isect_range_single<F>, "intersction test",
         "bvh1"_a, "bvh2"_a, "pos1"_a, "pos2"_a, "mindist"_a, "maxtrim"_a = -1,
         "maxtrim_lb"_a = -1, "maxtrim_ub"_a = -1, "nasym1"_a = -1);
-  m.def("isect_range", &isect_range<double>, "intersction test", "bvh1"_a,
-        "bvh2"_a, "pos1"_a, "pos2"_a, "mindist"_a, "maxtrim"_a = -1,
-        "maxtrim_lb"_a = -1, "maxtrim_ub"_a = -1, "nasym1"_a = -1);
-  m.def("naive_isect_range", &naive_isect_range<double>, "intersction test",
+  m.def("isect_range", &isect_range<F>, "intersction test", "bvh1"_a, "bvh2"_a,
+        "pos1"_a, "pos2"_a, "mindist"_a, "maxtrim"_a = -1, "maxtrim_lb"_a = -1,
+        "maxtrim_ub"_a = -1, "nasym1"_a = -1, "nthread"_a = 1);
+  m.def("naive_isect_range", &naive_isect_range<F>, "intersction test",
         "bvh1"_a, "bvh2"_a, "pos1"_a, "pos2"_a, "mindist"_a);
 
-  m.def("bvh_slide", &bvh_slide<double>, "slide into contact", "bvh1"_a,
-        "bvh2"_a, "pos1"_a, "pos2"_a, "rad"_a, "dirn"_a);
-  m.def("bvh_slide_vec", &bvh_slide_vec<double>, "slide into contact", "bvh1"_a,
-        "bvh2"_a, "pos1"_a, "pos2"_a, "rad"_a, "dirn"_a);
-
-  // m.def("bvh_slide_32bit", &bvh_slide<float>, "slide into contact",
-  // "bvh1"_a, "bvh2"_a, "pos1"_a, "pos2"_a, "rad"_a, "dirn"_a);
+  m.def("bvh_slide", &bvh_slide<F>, "slide into contact", "bvh1"_a, "bvh2"_a,
+        "pos1"_a, "pos2"_a, "rad"_a, "dirn"_a);
+  m.def("bvh_slide_vec", &bvh_slide_vec<F>, "slide into contact", "bvh1"_a,
+        "bvh2"_a, "pos1"_a, "pos2"_a, "rad"_a, "dirn"_a, "nthread"_a = 1);
 
-  m.def("bvh_collect_pairs", &bvh_collect_pairs<double>);
-  m.def("bvh_collect_pairs_vec", &bvh_collect_pairs_vec<double, float>);
-  m.def("bvh_collect_pairs_vec", &bvh_collect_pairs_vec<double, double>);
-  m.def("naive_collect_pairs", &naive_collect_pairs<double>);
-  m.def("bvh_count_pairs", &bvh_count_pairs<double>);
-  m.def("bvh_count_pairs_vec", &bvh_count_pairs_vec<double>);
+  m.def("bvh_collect_pairs", &bvh_collect_pairs<F>);
+  m.def("bvh_collect_pairs_vec", &bvh_collect_pairs_vec<F, float>, "bvh1"_a,
+        "bvh2"_a, "pos1"_a, "pos2"_a, "maxdist"_a, "nthread"_a = 1);
+  m.def("bvh_collect_pairs_vec", &bvh_collect_pairs_vec<F, double>, "bvh1"_a,
+        "bvh2"_a, "pos1"_a, "pos2"_a, "maxdist"_a, "nthread"_a = 1);
+  m.def("naive_collect_pairs", &naive_collect_pairs<F>);
+  m.def("bvh_count_pairs", &bvh_count_pairs<F>);
+  m.def("bvh_count_pairs_vec", &bvh_count_pairs_vec<F>, "bvh1"_a, "bvh2"_a,
+        "pos1"_a, "pos2"_a, "maxdist"_a, "nthread"_a = 1);
 
-  m.def("bvh_print", &bvh_print<double>);
+  m.def("bvh_print", &bvh_print<F>);
 
-  m.def("bvh_min_dist_one", &bvh_min_dist_one<double>);
+  m.def("bvh_min_dist_one", &bvh_min_dist_one<F>);
 
   Vx<int> lb0(1), ub0(1);
   lb0[0] = NL<int>::min();
   ub0[0] = NL<int>::max();
-  m.def("bvh_collect_pairs_range_vec",
-        &bvh_collect_pairs_range_vec<double, float>, "bvh1"_a, "bvh2"_a,
-        "pos1"_a, "pos2"_a, "maxdist"_a, "lb1"_a = lb0, "ub1"_a = ub0,
-        "nasym1"_a = -1, "lb2"_a = lb0, "ub2"_a = ub0, "nasym2"_a = -1);
-  m.def("bvh_collect_pairs_range_vec",
-        &bvh_collect_pairs_range_vec<double, double>, "bvh1"_a, "bvh2"_a,
-        "pos1"_a, "pos2"_a, "maxdist"_a, "lb1"_a = lb0, "ub1"_a = ub0,
-        "nasym1"_a = -1, "lb2"_a = lb0, "ub2"_a = ub0, "nasym2"_a = -1);
+  m.def("bvh_collect_pairs_range_vec", &bvh_collect_pairs_range_vec<F, float>,
+        "bvh1"_a, "bvh2"_a, "pos1"_a, "pos2"_a, "maxdist"_a, "lb1"_a = lb0,
+        "ub1"_a = ub0, "nasym1"_a = -1, "lb2"_a = lb0, "ub2"_a = ub0,
+        "nasym2"_a = -1, "nthread"_a = 1);
+  m.def("bvh_collect_pairs_range_vec", &bvh_collect_pairs_range_vec<F, double>,
+        "bvh1"_a, "bvh2"_a, "pos1"_a, "pos2"_a, "maxdist"_a, "lb1"_a = lb0,
+        "ub1"_a = ub0, "nasym1"_a = -1, "lb2"_a = lb0, "ub2"_a = ub0,
+        "nasym2"_a = -1, "nthread"_a = 1);
+  m.def("bvh_collect_pairs_grouped_vec",
+        &bvh_collect_pairs_grouped_vec<F, float>, "bvh1"_a, "bvh2"_a, "pos1"_a,
+        "pos2"_a, "maxdist"_a, "maxwide"_a, "lb1"_a = lb0, "ub1"_a = ub0,
+        "nasym1"_a = -1, "lb2"_a = lb0, "ub2"_a = ub0, "nasym2"_a = -1,
+        "nthread"_a = 1);
+  m.def("bvh_collect_pairs_grouped_vec",
+        &bvh_collect_pairs_grouped_vec<F, double>, "bvh1"_a, "bvh2"_a, "pos1"_a,
+        "pos2"_a, "maxdist"_a, "maxwide"_a, "lb1"_a = lb0, "ub1"_a = ub0,
+        "nasym1"_a = -1, "lb2"_a = lb0, "ub2"_a = ub0, "nasym2"_a = -1,
+        "nthread"_a = 1);
+}
+
+PYBIND11_MODULE(bvh, m) {
+  bind_bvh<double>(m, "SphereBVH_double");
+  bind_bvh<float>(m, "SphereBVH_float");
+  bind_bvh_funcs<double>(m);
+  bind_bvh_funcs<float>(m);
 }
 
 }  // namespace bvh
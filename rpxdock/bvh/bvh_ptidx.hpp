@@ -0,0 +1,35 @@
+#pragma once
+/** \file */
+
+#include "rpxdock/bvh/bvh.hpp"
+#include "rpxdock/geom/primitive.hpp"
+#include "rpxdock/util/types.hpp"
+
+// point + residue index objects stored in the BVHs bound in bvh.cpp, shared so
+// other extension modules can traverse the same BVH objects
+
+namespace Eigen {
+
+template <class F>
+struct PtIdx {
+  PtIdx() : pos(0), idx(0) {}
+  PtIdx(rpxdock::util::V3<F> v, int i = 0) : pos(v), idx(i) {}
+  rpxdock::util::V3<F> pos;
+  int idx;
+};
+template <typename F>
+auto bounding_vol(rpxdock::util::V3<F> v) {
+  return rpxdock::geom::Sphere<F>(v);
+}
+template <typename F>
+auto bounding_vol(PtIdx<F> v) {
+  auto s = rpxdock::geom::Sphere<F>(v.pos);
+  s.lb = s.ub = v.idx;
+  return s;
+}
+}  // namespace Eigen
+
+template <typename F>
+using BVH = rpxdock::bvh::SphereBVH<F, Eigen::PtIdx<F>>;
+using BVHf = BVH<float>;
+using BVHd = BVH<double>;
@@ -1,3 +1,2 @@
-from cppimport import import_hook
 from .cookie_cutter import *
 from .prune import *
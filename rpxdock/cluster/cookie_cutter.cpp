@@ -4,7 +4,7 @@
 
 cfg['include_dirs'] = ['../..','../extern']
 cfg['compiler_args'] = ['-std=c++17', '-w', '-Ofast']
-cfg['dependencies'] = ['../util/types.hpp']
+cfg['dependencies'] = ['../util/types.hpp', '../util/pybind_types.hpp']
 
 cfg['parallel'] = False
 
@@ -19,7 +19,12 @@ setup_pybind11(cfg)
 #include <pybind11/pybind11.h>
 
 #include <Eigen/Dense>
+#include <array>
 #include <iostream>
+#include <unordered_map>
+#include <vector>
+
+#include "rpxdock/util/pybind_types.hpp"
 
 namespace py = pybind11;
 
@@ -66,9 +71,178 @@ Vx<int> cookie_cutter(Ref<RowMatrixX<F>> pts, F thresh) {
   return out;
 }
 
+/// top (up to) k principal axes of pts, from at most nsamp evenly spaced rows
+template <typename F>
+RowMatrixX<double> principal_axes(Ref<RowMatrixX<F>> pts, int k,
+                                  int nsamp = 20000) {
+  int n = pts.rows(), d = pts.cols();
+  int stride = std::max(1, n / nsamp), m = 0;
+  Matrix<double, 1, Dynamic> mean = Matrix<double, 1, Dynamic>::Zero(d);
+  for (int i = 0; i < n; i += stride, ++m)
+    mean += pts.row(i).template cast<double>();
+  mean /= std::max(1, m);
+  MatrixXd cov = MatrixXd::Zero(d, d);
+  for (int i = 0; i < n; i += stride) {
+    Matrix<double, 1, Dynamic> x = pts.row(i).template cast<double>() - mean;
+    cov.noalias() += x.transpose() * x;
+  }
+  SelfAdjointEigenSolver<MatrixXd> eig(cov);
+  RowMatrixX<double> axes(k, d);  // eigenvalues ascending
+  for (int j = 0; j < k; ++j) axes.row(j) = eig.eigenvectors().col(d - 1 - j);
+  return axes;
+}
+
+/**
+ * @brief cookie_cutter with a grid over the top 3 principal axes of pts
+ *
+ * projection onto orthonormal axes never increases distance, so every kept
+ * point within thresh of pts[i] lies in one of the 27 grid cells (edge
+ * thresh) around the projection of pts[i]. only those kept points are
+ * checked. whether pts[i] is kept depends only on whether any is within
+ * thresh, so the result is identical to cookie_cutter, but near linear when
+ * the keepers spread out over the grid.
+ */
+template <typename F>
+Vx<int> cookie_cutter_grid(Ref<RowMatrixX<F>> pts, F thresh) {
+  py::gil_scoped_release release;
+  int n = pts.rows(), d = pts.cols();
+  if (n == 0) return Vx<int>(0);
+  constexpr int K = 3;
+  int k = std::min(K, d);
+  RowMatrixX<double> axes = principal_axes(pts, k);
+  // a bit wider than thresh, so rounding can't push a neighbor two cells away
+  double cell = thresh > 0 ? thresh * (1.0 + 1e-4) : 1.0;
+
+  using Key = std::array<int64_t, K>;
+  struct KeyHash {
+    size_t operator()(Key const &k) const noexcept {
+      uint64_t h = 0;
+      for (auto i : k) h = (h ^ uint64_t(i)) * 0x9E3779B97F4A7C15ULL;
+      return h ^ (h >> 29);
+    }
+  };
+  std::unordered_map<Key, std::vector<int>, KeyHash> grid;
+  std::vector<int> keep;
+  F thresh2 = thresh * thresh;
+  for (int i = 0; i < n; ++i) {
+    Key key{0, 0, 0};
+    for (int j = 0; j < k; ++j)
+      key[j] = int64_t(std::floor(
+          axes.row(j).dot(pts.row(i).template cast<double>()) / cell));
+    bool seenit = false;
+    int nnbr = 1;
+    for (int j = 0; j < k; ++j) nnbr *= 3;
+    for (int inbr = 0; inbr < nnbr && !seenit; ++inbr) {
+      Key nbr = key;
+      for (int j = 0, r = inbr; j < k; ++j, r /= 3) nbr[j] += r % 3 - 1;
+      auto it = grid.find(nbr);
+      if (it == grid.end()) continue;
+      for (int ikeep : it->second) {
+        if ((pts.row(i) - pts.row(ikeep)).squaredNorm() <= thresh2) {
+          seenit = true;
+          break;
+        }
+      }
+    }
+    if (!seenit) {
+      keep.push_back(i);
+      grid[key].push_back(i);
+    }
+  }
+  // same order as cookie_cutter: kept points in input order
+  Vx<int> out(keep.size());
+  for (int i = 0; i < keep.size(); ++i) out[i] = keep[i];
+  return out;
+}
+
+/**
+ * @brief cookie_cutter on rigid xforms instead of coordinates
+ *
+ * xforms is (N*ncomp,4,4), ncomp = len(lever) consecutive xforms per sample.
+ * squared distance between samples is sum over components of
+ * weight * (d2cart + lever^2 * d2ori), with d2cart and d2ori as in
+ * geom.xform_dist2_split. samples are only compared within the same
+ * category. a hash grid on the first component's translations (cell
+ * thresh/sqrt(weight[0]), which bounds that term alone) limits the search to
+ * 27 cells, result is the same as an all pairs greedy pass.
+ */
+template <typename F>
+Vx<int> cookie_cutter_xform(py::array_t<F> xforms,
+                            Ref<Matrix<int64_t, Dynamic, 1>> categories,
+                            Ref<Matrix<F, Dynamic, 1>> lever,
+                            Ref<Matrix<F, Dynamic, 1>> weight, F thresh) {
+  auto x = util::xform_py_to_eigen(xforms);
+  int ncomp = lever.size();
+  if (weight.size() != ncomp)
+    throw std::runtime_error("lever and weight must be same size");
+  if (ncomp == 0 || x.size() % ncomp != 0)
+    throw std::runtime_error("xforms must be shape (N*len(lever),4,4)");
+  int n = x.size() / ncomp;
+  if (categories.size() != n)
+    throw std::runtime_error("categories must be size N");
+  py::gil_scoped_release release;
+  if (n == 0) return Vx<int>(0);
+  double cell = thresh > 0 ? thresh / std::sqrt(weight[0]) * (1.0 + 1e-4) : 1.0;
+  F thresh2 = thresh * thresh;
+
+  auto dist2 = [&](int i, int j) {
+    F d2 = 0;
+    for (int c = 0; c < ncomp; ++c) {
+      auto const &a = x[i * ncomp + c];
+      auto const &b = x[j * ncomp + c];
+      F d2cart = (a.translation() - b.translation()).squaredNorm();
+      Quaternion<F> q(a.linear().transpose() * b.linear());
+      F d2quat = (1 - q.w()) * (1 - q.w()) + q.vec().squaredNorm();
+      d2 += weight[c] * (d2cart + d2quat * 4 * lever[c] * lever[c]);
+      if (d2 > thresh2) break;
+    }
+    return d2;
+  };
+
+  using Key = std::array<int64_t, 4>;
+  struct KeyHash {
+    size_t operator()(Key const &k) const noexcept {
+      uint64_t h = 0;
+      for (auto i : k) h = (h ^ uint64_t(i)) * 0x9E3779B97F4A7C15ULL;
+      return h ^ (h >> 29);
+    }
+  };
+  std::unordered_map<Key, std::vector<int>, KeyHash> grid;
+  std::vector<int> keep;
+  for (int i = 0; i < n; ++i) {
+    auto t = x[i * ncomp].translation();
+    Key key{int64_t(std::floor(t[0] / cell)), int64_t(std::floor(t[1] / cell)),
+            int64_t(std::floor(t[2] / cell)), categories[i]};
+    bool seenit = false;
+    for (int inbr = 0; inbr < 27 && !seenit; ++inbr) {
+      Key nbr = key;
+      for (int j = 0, r = inbr; j < 3; ++j, r /= 3) nbr[j] += r % 3 - 1;
+      auto it = grid.find(nbr);
+      if (it == grid.end()) continue;
+      for (int ikeep : it->second) {
+        if (dist2(i, ikeep) <= thresh2) {
+          seenit = true;
+          break;
+        }
+      }
+    }
+    if (!seenit) {
+      keep.push_back(i);
+      grid[key].push_back(i);
+    }
+  }
+  Vx<int> out(keep.size());
+  for (int i = 0; i < keep.size(); ++i) out[i] = keep[i];
+  return out;
+}
+
 PYBIND11_MODULE(cookie_cutter, m) {
   m.def("cookie_cutter", &cookie_cutter<double>);
   m.def("cookie_cutter", &cookie_cutter<float>);
+  m.def("cookie_cutter_grid", &cookie_cutter_grid<double>);
+  m.def("cookie_cutter_grid", &cookie_cutter_grid<float>);
+  m.def("cookie_cutter_xform", &cookie_cutter_xform<double>);
+  m.def("cookie_cutter_xform", &cookie_cutter_xform<float>);
 }
 
 }  // namespace cookie_cutter
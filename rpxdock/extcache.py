@@ -0,0 +1,182 @@
+"""
+content addressed cache of the compiled cppimport extension modules
+
+Each extension is compiled once into a cache directory, in a file keyed by a hash of the
+.cpp, every header it #includes by quoted path, the cppimport cfg block (so compiler args)
+and the compiler/python abi. At import time extensions are only ever loaded from the cache;
+a missing entry is compiled by exactly one process while any others importing it wait on
+the entry's lock file, so many jobs starting at once on a fresh node don't race to build.
+
+The cache is $RPXDOCK_EXT_CACHE if set (point it at shared storage for clusters), else
+~/.cache/rpxdock/ext. Fill it ahead of time with
+
+   python -m rpxdock.util.parallel_build_modules [--cachedir DIR] [--ncpu N] [module ...]
+"""
+
+import os, sys, re, hashlib, tempfile, importlib.machinery, importlib.util
+
+rootdir = os.path.dirname(os.path.abspath(__file__))
+include_dirs = [os.path.dirname(rootdir), os.path.join(rootdir, 'extern')]
+_include_pattern = re.compile(rb'^\s*#\s*include\s*"([^"]+)"', re.MULTILINE)
+_key_environ = ('CC', 'CXX', 'CFLAGS', 'CXXFLAGS', 'CPPFLAGS', 'LDFLAGS')
+_suffix = importlib.machinery.EXTENSION_SUFFIXES[0]
+
+def default_cachedir():
+   cachedir = os.environ.get('RPXDOCK_EXT_CACHE')
+   if cachedir: return cachedir
+   base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+   return os.path.join(base, 'rpxdock', 'ext')
+
+def is_extension_source(fname):
+   'cppimport convention: a .cpp opts in with "cppimport" on its first line'
+   if not fname.endswith('.cpp') or not os.path.isfile(fname): return False
+   with open(fname, 'rb') as inp:
+      return b'cppimport' in inp.readline()
+
+def source_files(src):
+   'src followed by every header reachable through quoted #includes, in include order'
+   seen, stack = list(), [os.path.abspath(src)]
+   while stack:
+      fname = stack.pop()
+      if fname in seen: continue
+      seen.append(fname)
+      with open(fname, 'rb') as inp:
+         includes = _include_pattern.findall(inp.read())
+      for inc in reversed(includes):
+         for d in [os.path.dirname(fname)] + include_dirs:
+            path = os.path.normpath(os.path.join(d, inc.decode()))
+            if os.path.isfile(path):
+               stack.append(path)
+               break
+   return seen
+
+def extension_key(fullname, src):
+   'hash of everything that goes into the compiled extension, but not where it lives'
+   h = hashlib.sha256()
+   for fname in source_files(src):
+      with open(fname, 'rb') as inp:
+         h.update(inp.read())
+   try:
+      import pybind11
+      pybind11_version = pybind11.__version__
+   except ImportError:
+      pybind11_version = None
+   env = [os.environ.get(k) for k in _key_environ]
+   abi = [fullname, _suffix, os.uname().machine]
+   h.update(repr((env, abi, pybind11_version)).encode())
+   return h.hexdigest()[:32]
+
+def cache_path(fullname, src, cachedir=None):
+   cachedir = cachedir or default_cachedir()
+   return os.path.join(cachedir, f'{fullname}.{extension_key(fullname, src)}{_suffix}')
+
+def build(fullname, src, cachedir=None):
+   """compile src into the cache unless already there, returns (path, whether we built it)
+
+   the lock is per cache entry, so unrelated extensions still build in parallel"""
+   path = cache_path(fullname, src, cachedir)
+   if os.path.exists(path): return path, False
+   import fcntl, shutil
+   os.makedirs(os.path.dirname(path), exist_ok=True)
+   with open(path + '.lock', 'w') as lock:
+      fcntl.flock(lock, fcntl.LOCK_EX)
+      if os.path.exists(path): return path, False  # someone else built it while we waited
+      builddir = tempfile.mkdtemp(prefix='rpxdock_ext_')
+      try:
+         ext = _build_in(builddir, fullname, src)
+         # publish atomically, readers never see a partial file
+         tmp = f'{path}.{os.getpid()}.tmp'
+         shutil.move(ext, tmp)
+         os.replace(tmp, path)
+      finally:
+         shutil.rmtree(builddir, ignore_errors=True)
+   return path, True
+
+def _build_in(builddir, fullname, src):
+   """render and compile a copy of src and its headers under builddir, returns the .so
+
+   nothing is written next to the sources, so the package may be read-only, and builds of
+   the same module for different cache entries don't share any files. the copies keep their
+   layout relative to the package, so the relative include_dirs in the cfg block still work"""
+   import shutil
+   from cppimport.importer import setup_module_data
+   from cppimport.templating import run_templating
+   from cppimport.build_module import build_module
+   src, extern = os.path.abspath(src), os.path.join(rootdir, 'extern')
+   files = [f for f in source_files(src) if not f.startswith(extern + os.sep)]
+   base = os.path.commonpath(files + [os.path.dirname(rootdir)])
+   for f in files:
+      copy = os.path.join(builddir, os.path.relpath(f, base))
+      os.makedirs(os.path.dirname(copy), exist_ok=True)
+      shutil.copyfile(f, copy)
+   if os.path.isdir(extern):
+      os.makedirs(os.path.join(builddir, os.path.relpath(rootdir, base)), exist_ok=True)
+      os.symlink(extern, os.path.join(builddir, os.path.relpath(extern, base)))
+   module_data = setup_module_data(fullname, os.path.join(builddir, os.path.relpath(src, base)))
+   run_templating(module_data)
+   build_module(module_data)
+   return module_data['ext_path']
+
+def extension_spec(fullname, src, cachedir=None):
+   path, _ = build(fullname, src, cachedir)
+   loader = importlib.machinery.ExtensionFileLoader(fullname, path)
+   return importlib.util.spec_from_file_location(fullname, path, loader=loader)
+
+def load(fullname, src, cachedir=None):
+   'import the extension built from src, compiling it into the cache first if needed'
+   if fullname in sys.modules: return sys.modules[fullname]
+   spec = extension_spec(fullname, src, cachedir)
+   module = importlib.util.module_from_spec(spec)
+   sys.modules[fullname] = module
+   spec.loader.exec_module(module)
+   return module
+
+class ExtensionFinder:
+   'meta path finder serving rpxdock.* extension modules out of the cache'
+   def find_spec(self, fullname, path, target=None):
+      if not path or not fullname.startswith('rpxdock.'): return None
+      name = fullname.rpartition('.')[2]
+      for d in path:
+         src = os.path.join(d, name + '.cpp')
+         if is_extension_source(src):
+            return extension_spec(fullname, src)
+      return None
+
+def install():
+   if not any(isinstance(f, ExtensionFinder) for f in sys.meta_path):
+      sys.meta_path.insert(0, ExtensionFinder())
+
+def extension_sources(root=rootdir):
+   'yields (fullname, source file) for every extension module in the package'
+   for d, dirs, files in os.walk(root):
+      dirs[:] = sorted(x for x in dirs if x not in ('extern', 'tests') and x[0] not in '._')
+      for f in sorted(files):
+         src = os.path.join(d, f)
+         if not f.startswith('.') and is_extension_source(src):
+            rel = os.path.relpath(src[:-4], os.path.dirname(root))
+            yield rel.replace(os.sep, '.'), src
+
+def build_all(which=None, cachedir=None, ncpu=None, verbose=True):
+   """build extensions (all, or those named in which by module name or source file) in
+   parallel, returns {fullname: cache path}; failures are reported after everything else
+   has been built"""
+   from concurrent.futures import ProcessPoolExecutor, as_completed
+   jobs = list(extension_sources())
+   if which:
+      which = {os.path.abspath(w) if w.endswith('.cpp') else w for w in which}
+      jobs = [(n, s) for n, s in jobs if {n, n.split('.', 1)[1], s} & which]
+   cachedir = cachedir or default_cachedir()
+   paths, errors = dict(), dict()
+   with ProcessPoolExecutor(ncpu or os.cpu_count()) as pool:
+      futures = {pool.submit(build, n, s, cachedir): n for n, s in jobs}
+      for future in as_completed(futures):
+         name = futures[future]
+         try:
+            paths[name], built = future.result()
+            if verbose: print(f'{"built" if built else "cached":6} {name}', flush=True)
+         except Exception as e:
+            errors[name] = e
+            if verbose: print(f'FAILED {name}: {e}', flush=True)
+   if errors:
+      raise RuntimeError(f'failed to build {", ".join(sorted(errors))}')
+   return paths
@@ -17,6 +17,14 @@ def filter_redundancy(xforms, body, scores=None, categories=None, every_nth=10,
 
    nclust = kw.max_cluster if kw.max_cluster else int(kw.beam_size) // every_nth
 
+   if kw.redundancy_method == 'xform':
+      bodies = [body] if xforms.ndim == 3 else body
+      keep = xform_redundancy(xforms[ibest[:nclust]], bodies, kw.max_bb_redundancy,
+                              categories[ibest[:nclust]], every_nth)
+      log.info(f'filter_redundancy xform {kw.max_bb_redundancy}A Nmax {nclust} ' +
+               f'Ntotal {len(ibest)} Nkeep {len(keep)}')
+      return ibest[keep]
+
    if xforms.ndim == 3:
       crd = xforms[ibest[:nclust], None] @ body.cen[::every_nth, :, None]
    else:
@@ -30,10 +38,42 @@ def filter_redundancy(xforms, body, scores=None, categories=None, every_nth=10,
    # sneaky way to do categories
    crd += (categories[ibest[:nclust]] * 1_000_000)[:, None]
 
-   keep = rp.cluster.cookie_cutter(crd, kw.max_bb_redundancy * np.sqrt(ncen))
+   keep = rp.cluster.cookie_cutter_grid(crd, kw.max_bb_redundancy * np.sqrt(ncen))
    assert len(np.unique(keep)) == len(keep)
 
    log.info(f'filter_redundancy {kw.max_bb_redundancy}A Nmax {nclust} ' +
             f'Ntotal {len(ibest)} Nkeep {len(keep)}')
 
    return ibest[keep]
+
+def xform_redundancy(xforms, bodies, max_bb_redundancy, categories=None, every_nth=10):
+   """indices of non-redundant xforms, (N,4,4) or (N,len(bodies),4,4), in priority order
+
+   approximates the coordinate based filter_redundancy without building the
+   (N, ncen, 4) coords: for each body, the xform is moved to the centroid of
+   body.cen[::every_nth], so the mean squared displacement of those points is
+   d2cart + d2ori * lever**2 (geom.xform_dist2_split) with lever sqrt(2/3) * rg,
+   exact for isotropic bodies and small rotations. components are weighted by
+   their number of points, as in the concatenated coordinates."""
+   xforms = np.asarray(xforms)
+   if xforms.ndim == 3: xforms = xforms[:, None]
+   assert xforms.shape[1] == len(bodies)
+   if categories is None: categories = np.zeros(len(xforms), dtype='i8')
+   dt = xforms.dtype if xforms.dtype in (np.float32, np.float64) else np.float64
+   lever, weight, cenx = list(), list(), list()
+   for b in bodies:
+      cen = b.cen[::every_nth, :3]
+      com = cen.mean(axis=0)
+      rg = np.sqrt(np.sum((cen - com)**2) / len(cen))
+      lever.append(np.sqrt(2 / 3) * rg)
+      weight.append(len(cen))
+      cenx.append(rp.homog.htrans(com))
+   weight = np.array(weight) / np.sum(weight)
+   x = (xforms @ np.stack(cenx)).astype(dt)
+   return rp.cluster.cookie_cutter_xform(
+      np.ascontiguousarray(x.reshape(-1, 4, 4)),
+      np.ascontiguousarray(categories, dtype='i8'),
+      np.array(lever, dtype=dt),
+      weight.astype(dt),
+      dt.type(max_bb_redundancy),
+   )
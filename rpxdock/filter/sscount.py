@@ -20,30 +20,145 @@ class secondary_structure_map:
         self.ss = ss
 
     def map_body_ss(self, body, min_helix_length=4, min_sheet_length=3, min_loop_length=1):
-        ss_params = {"H": min_helix_length, "E": min_sheet_length, "L": min_loop_length}
-
         self.set_ss(body.ss)
+        start, end, ss_type = ss_elements(body.ss, min_helix_length, min_sheet_length,
+                                          min_loop_length)
+        for n, (lb, ub, t) in enumerate(zip(start, end, ss_type)):
+            self.assign_ss(n, t, lb, ub)
+
+def ss_elements(ss, min_helix_length=4, min_sheet_length=3, min_loop_length=1):
+    """start, end (inclusive) and type of the runs of ss long enough to count as elements
+
+    the final run is never an element"""
+    ss_params = {"H": min_helix_length, "E": min_sheet_length, "L": min_loop_length}
+    ss = np.asarray(ss)
+    lb = np.concatenate([[0], np.nonzero(ss[1:] != ss[:-1])[0] + 1])
+    ub = lb[1:] - 1
+    lb, ss_type = lb[:-1], ss[lb[:-1]]
+    minlen = np.array([ss_params[t] for t in ss_type], dtype=int)
+    ok = ub - lb >= minlen - 1
+    return lb[ok], ub[ok], ss_type[ok]
+
+def _ss_element_index(body, min_helix_length, min_sheet_length, min_loop_length):
+    """element index of each residue number, -1 if none, and element types
+
+    residue r is in element [start, end] if start + 1 <= r <= end + 1"""
+    start, end, ss_type = ss_elements(body.ss, min_helix_length, min_sheet_length,
+                                      min_loop_length)
+    elem = np.full(len(body.ss) + 2, -1)
+    for i, (lb, ub) in enumerate(zip(start, end)):
+        elem[lb + 1:ub + 2] = i
+    return elem, ss_type
+
+def _count_elements(dock, res, elem_of, ss_type, ndock, sstype, min_element_resis):
+    """count elements with at least min_element_resis of (dock, res) entries, per dock and type
+
+    returns counts (ndock, 3) in EHL order, and a mask of the entries in counted elements"""
+    elem = elem_of[np.clip(res, 0, len(elem_of) - 1).astype(int)]
+    inelem = elem >= 0
+    nelem = max(len(ss_type), 1)
+    key = dock[inelem] * nelem + elem[inelem]
+    ukey, inv, cnt = np.unique(key, return_inverse=True, return_counts=True)
+    utype = ss_type[ukey % nelem] if len(ss_type) else np.array([], dtype=ss_type.dtype)
+    uok = (cnt >= min_element_resis) & np.isin(utype, list(sstype))
+    counts = np.zeros((ndock, 3), dtype=int)
+    for j, t in enumerate("EHL"):
+        sel = uok & (utype == t)
+        counts[:, j] = np.bincount(ukey[sel] // nelem, minlength=ndock)
+    mask = np.zeros(len(res), dtype=bool)
+    mask[inelem] = uok[inv]
+    return counts, mask
+
+def _unique_pairs(dock, res, nmax):
+    """unique (dock, res), sorted by dock then res"""
+    key = np.unique(dock * nmax + res)
+    return key // nmax, key % nmax
+
+def _jagged_lbub(dock, ndock):
+    ub = np.cumsum(np.bincount(dock, minlength=ndock))
+    return np.stack([ub - np.bincount(dock, minlength=ndock), ub], axis=1)
+
+def sscount_columns(body1, body2, pairs, lbub, min_helix_length=4, min_sheet_length=3,
+                    min_loop_length=1, min_element_resis=1, sstype="EHL", strict=False, **kw):
+    """ss element counts of contacting residues for each dock in lbub, as arrays
+
+    counts are (ndock, 2, 3): body A/B, E/H/L. resis{1,2} and paired{1,2} are flat residue
+    numbers (asym numbering) with (ndock, 2) lb/ub into them, the same data as the per-dock
+    dicts from filter_sscount(simple=False)"""
+    ndock = len(lbub)
+    nres = body1.asym_body.nres, body2.asym_body.nres
+    elem1, type1 = _ss_element_index(body1, min_helix_length, min_sheet_length, min_loop_length)
+    elem2, type2 = _ss_element_index(body2, min_helix_length, min_sheet_length, min_loop_length)
+    # pairs of each dock, in dock order
+    nper = lbub[:, 1] - lbub[:, 0]
+    dock = np.repeat(np.arange(ndock), nper)
+    ipair = np.arange(len(dock)) - np.repeat(np.cumsum(nper) - nper, nper)
+    pairs = pairs.reshape(-1, 2)[np.repeat(lbub[:, 0], nper) + ipair].astype(int)
+    nmax = max(len(elem1), len(elem2), np.max(pairs, initial=0) + 1)
+
+    # unique residues of each body contacting in each dock
+    ures1 = _unique_pairs(dock, pairs[:, 0], nmax)
+    ures2 = _unique_pairs(dock, pairs[:, 1], nmax)
+    count1, ok1 = _count_elements(*ures1, elem1, type1, ndock, sstype, min_element_resis)
+    count2, ok2 = _count_elements(*ures2, elem2, type2, ndock, sstype, min_element_resis)
+
+    # paired residues of A are body2 residues contacting a counted body1 residue, and vice versa
+    sel1 = np.isin(dock * nmax + pairs[:, 0], ures1[0][ok1] * nmax + ures1[1][ok1])
+    sel2 = np.isin(dock * nmax + pairs[:, 1], ures2[0][ok2] * nmax + ures2[1][ok2])
+    pdock1, paired1 = _unique_pairs(dock[sel1], pairs[sel1, 1], nmax)
+    pdock2, paired2 = _unique_pairs(dock[sel2], pairs[sel2, 0], nmax)
+    paired1, paired2 = paired1 % nres[1], paired2 % nres[0]
+    rdock1, resis1 = ures1[0][ok1], (ures1[1][ok1] % nres[0]).astype('f8')
+    rdock2, resis2 = ures2[0][ok2], (ures2[1][ok2] % nres[1]).astype('f8')
+
+    if strict:
+        # count only residues paired with a residue also in an element, with multiplicity
+        count1, ok1 = _count_elements(pdock2, paired2, elem1, type1, ndock, sstype,
+                                      min_element_resis)
+        count2, ok2 = _count_elements(pdock1, paired1, elem2, type2, ndock, sstype,
+                                      min_element_resis)
+        # element order, then order within paired
+        o1 = np.argsort(pdock2[ok1] * len(elem1) + elem1[paired2[ok1]], kind='stable')
+        o2 = np.argsort(pdock1[ok2] * len(elem2) + elem2[paired1[ok2]], kind='stable')
+        rdock1, resis1 = pdock2[ok1][o1], paired2[ok1][o1].astype('f8')
+        rdock2, resis2 = pdock1[ok2][o2], paired1[ok2][o2].astype('f8')
+        pdock1, paired1, pdock2, paired2 = rdock2, resis2, rdock1, resis1
+
+    counts = np.stack([count1, count2], axis=1)
+    return rp.Bunch(
+        counts=counts,
+        total_count=counts.sum(axis=(1, 2)),
+        resis1=resis1,
+        resis1_lbub=_jagged_lbub(rdock1, ndock),
+        resis2=resis2,
+        resis2_lbub=_jagged_lbub(rdock2, ndock),
+        paired1=paired1,
+        paired1_lbub=_jagged_lbub(pdock1, ndock),
+        paired2=paired2,
+        paired2_lbub=_jagged_lbub(pdock2, ndock),
+    )
 
-        # first residue assignment
-        temp_ss = body.ss[0]
-        temp_start = 0
-        n = 0
-        for i, ss_at_resi in enumerate(body.ss):
-            if ss_at_resi == temp_ss:  # still in the same ss element
-                temp_end = i
-            else:  # left the ss element, record it if it is sufficiently long
-                end = temp_end
-                start = temp_start
-                ss_type = temp_ss
-                if end - start >= ss_params[ss_type] - 1:
-                    # create an SS element entry
-                    self.assign_ss(n, ss_type, start, end)
-                    n = n+1
-                temp_start = i
-                temp_ss = ss_at_resi
+def sscount_dicts(body1, body2, cols):
+    """per-dock dicts, as returned by filter_sscount(simple=False), from sscount_columns"""
+    result = list()
+    for i in range(len(cols.counts)):
+        r = dict()
+        for j, (lbl, body) in enumerate([("A", body1), ("B", body2)]):
+            r[lbl] = dict(pdb_file=body.pdbfile)
+            for k, t in enumerate("EHL"):
+                r[lbl][t] = int(cols.counts[i, j, k])
+            r[lbl]["total_counts"] = int(cols.counts[i, j].sum())
+            lb, ub = cols[f'resis{j+1}_lbub'][i]
+            r[lbl]["resis"] = cols[f'resis{j+1}'][lb:ub]
+            lb, ub = cols[f'paired{j+1}_lbub'][i]
+            r[lbl]["paired_resis"] = cols[f'paired{j+1}'][lb:ub]
+        r["total_count"] = int(cols.total_count[i])
+        result.append(r)
+    return result
 
 def filter_sscount(body1, body2, pos1, pos2, min_helix_length=4, min_sheet_length=3, min_loop_length=1, min_element_resis=1, max_dist=8.0,
-                   sstype="EHL", confidence=0, min_ss_count=3, simple=True, strict=False, **kw):
+                   sstype="EHL", confidence=0, min_ss_count=3, simple=True, strict=False,
+                   columnar=False, **kw):
 
     pairs, lbub = rp.bvh.bvh_collect_pairs_vec(
         body1.bvh_cen,
@@ -52,132 +167,16 @@ def filter_sscount(body1, body2, pos1, pos2, min_helix_length=4, min_sheet_lengt
         pos2,
         max_dist,
     )
-    #map ss to an object
-    body1_ss_map, body2_ss_map = secondary_structure_map(), secondary_structure_map()
-    body1_ss_map.map_body_ss(body1, min_helix_length, min_sheet_length, min_loop_length)
-    body2_ss_map.map_body_ss(body2, min_helix_length, min_sheet_length, min_loop_length)
-    bod_len = (body1.asym_body.nres, body2.asym_body.nres)
-
-    sscounts_data = []
+    cols = sscount_columns(body1, body2, pairs, lbub, min_helix_length, min_sheet_length,
+                           min_loop_length, min_element_resis, sstype, strict)
     ss_counts = np.zeros(max(len(pos1), len(pos2)))
-    for i, (lb, ub) in enumerate(lbub):
-
-        #this loses context information.
-        body1_res, body2_res = np.unique(pairs[lb:ub][:,0]), np.unique(pairs[lb:ub][:,1])
-        #store residues in an SS element 
-        temp_result = {
-            "A" : {
-               "pdb_file" : body1.pdbfile,
-               "E" : 0,
-               "H" : 0,
-               "L" : 0,
-               "total_counts" : 0,
-               "resis" : [],
-               "paired_resis" : []},
-            "B" : {
-               "pdb_file" : body2.pdbfile,
-               "E" : 0,
-               "H" : 0,
-               "L" : 0,
-               "total_counts" : 0,
-               "resis" : [],
-               "paired_resis" : []},
-            "total_count" : 0}
-        resis = np.array([])
-        for ss_element in body1_ss_map.ss_index:
-            start = body1_ss_map.ss_element_start[ss_element]
-            end = body1_ss_map.ss_element_end[ss_element]
-            ss_type = body1_ss_map.ss_type_assignments[ss_element]
-            list_resis = body1_res[(body1_res >= start + 1) & (body1_res <= end + 1)]
-            ss_len = len(list_resis)
-            if ss_type in sstype and ss_len >= min_element_resis:
-                resis = np.append(resis, list_resis)
-                temp_result["A"][ss_type] = temp_result["A"][ss_type] + 1
-
-        # get the paired residues
-        # Correct the residue numbers to match the input numbering
-        paired_resis = np.unique(pairs[lb:ub, 1][np.isin(pairs[lb:ub, 0], resis)])
-        resis = resis - (bod_len[0] * (resis / bod_len[0]).astype(int))
-        paired_resis = paired_resis - (bod_len[1] * (paired_resis / bod_len[1]).astype(int))
-        temp_result["A"]["total_counts"] = temp_result["A"]["H"] + temp_result["A"]["E"] + temp_result["A"]["L"]
-        temp_result["A"]["resis"] = resis
-        temp_result["A"]["paired_resis"] = paired_resis
-
-        resis = np.array([])
-        for ss_element in body2_ss_map.ss_index:
-            start = body2_ss_map.ss_element_start[ss_element]
-            end = body2_ss_map.ss_element_end[ss_element]
-            ss_type = body2_ss_map.ss_type_assignments[ss_element]
-            list_resis = body2_res[(body2_res >= start + 1) & (body2_res <= end + 1)]
-            ss_len = len(list_resis)
-            if ss_type in sstype and ss_len >= min_element_resis:
-                resis= np.append(resis, list_resis)
-                temp_result["B"][ss_type] = temp_result["B"][ss_type] + 1
-
-        # get the paired residues
-        # Correct the residue numbers to match the input numbering
-        paired_resis = np.unique(pairs[lb:ub, 0][np.isin(pairs[lb:ub, 1], resis)])
-        resis = resis - (bod_len[1] * (resis / bod_len[1]).astype(int))
-        paired_resis = paired_resis - (bod_len[0] * (paired_resis / bod_len[0]).astype(int))
-        temp_result["B"]["total_counts"] = temp_result["B"]["H"] + temp_result["B"]["E"] + temp_result["B"]["L"]
-        temp_result["B"]["resis"] = resis
-        temp_result["B"]["paired_resis"] = paired_resis
-        temp_result["total_count"] = temp_result["A"]["total_counts"] + temp_result["B"]["total_counts"]
-
-        if strict:
-            #Require that, for a residue to count in an SS element, it has to be paired with a residue that is also in an SS element.
-            #reset counts
-            temp_result["A"]["E"] = 0
-            temp_result["A"]["H"] = 0
-            temp_result["A"]["L"] = 0
-            temp_result["B"]["E"] = 0
-            temp_result["B"]["H"] = 0
-            temp_result["B"]["L"] = 0
-            temp_result["A"]["total_counts"] = 0
-            temp_result["B"]["total_counts"] = 0
-            temp_result["total_count"] = 0
-
-            #check that the paired residues are also in an SS element.
-            resis = np.array([])
-            for ss_element in body1_ss_map.ss_index:
-                start = body1_ss_map.ss_element_start[ss_element]
-                end = body1_ss_map.ss_element_end[ss_element]
-                ss_type = body1_ss_map.ss_type_assignments[ss_element]
-                body1_resis = temp_result["B"]["paired_resis"]
-                list_resis = body1_resis[(body1_resis >= start + 1) & (body1_resis <= end + 1)]
-                ss_len = len(list_resis)
-                if ss_type in sstype and ss_len >= min_element_resis:
-                    resis = np.append(resis, list_resis)
-                    temp_result["A"][ss_type] = temp_result["A"][ss_type] + 1
-            temp_result["A"]["total_counts"] = temp_result["A"]["H"] + temp_result["A"]["E"] + temp_result["A"]["L"]
-            temp_result["A"]["resis"] = resis
-
-            resis = np.array([])
-            for ss_element in body2_ss_map.ss_index:
-                start = body2_ss_map.ss_element_start[ss_element]
-                end = body2_ss_map.ss_element_end[ss_element]
-                ss_type = body2_ss_map.ss_type_assignments[ss_element]
-                body2_resis = temp_result["A"]["paired_resis"]
-                list_resis = body2_resis[(body2_resis >= start + 1) & (body2_resis <= end + 1)]
-                ss_len = len(list_resis)
-                if ss_type in sstype and ss_len >= min_element_resis:
-                    resis = np.append(resis, list_resis)
-                    temp_result["B"][ss_type] = temp_result["B"][ss_type] + 1
-            temp_result["B"]["total_counts"] = temp_result["B"]["H"] + temp_result["B"]["E"] + temp_result["B"]["L"]
-            temp_result["B"]["resis"] = resis
-            temp_result["B"]["paired_resis"] = temp_result["A"]["resis"]
-            temp_result["A"]["paired_resis"] = temp_result["B"]["resis"]
-            temp_result["total_count"] = temp_result["A"]["total_counts"] + temp_result["B"]["total_counts"]
-            ss_counts[i] = temp_result["A"]["total_counts"] + temp_result["B"]["total_counts"]
-            sscounts_data.append(temp_result)
-        else:
-            ss_counts[i] = temp_result["A"]["total_counts"] + temp_result["B"]["total_counts"]
-            sscounts_data.append(temp_result)
+    ss_counts[:len(lbub)] = cols.total_count
 
     if confidence==1:
         return ss_counts >= min_ss_count
+    elif columnar:
+        return cols
     elif simple:
         return ss_counts
     else:
-        return sscounts_data
-
+        return sscount_dicts(body1, body2, cols)
@@ -1,5 +1,3 @@
-from cppimport import import_hook
-
 from .bcc import *
 from .miniball import *
 from .xform_dist import *
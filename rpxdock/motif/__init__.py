@@ -1,5 +1,4 @@
-from cppimport import import_hook
-from ._motif import jagged_bin, logsum_bins, marginal_max_score
+from ._motif import jagged_bin, logsum_bins, marginal_max_score, segment_sum, segment_median
 from .frames import *
 from .pairdat import *
 from .pairscore import *
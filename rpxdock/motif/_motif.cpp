@@ -3,7 +3,8 @@
 
 
 cfg['include_dirs'] = ['../..','../extern']
-cfg['compiler_args'] = ['-std=c++17', '-w', '-Ofast']
+# no -ffast-math here, segment_sum must not reassociate its additions
+cfg['compiler_args'] = ['-std=c++17', '-w', '-O3']
 cfg['dependencies'] = []
 
 cfg['parallel'] = False
@@ -104,6 +105,76 @@ py::tuple marginal_max_score(Mx<I> lbub, Mx<I> pairs, Vx<V> vals) {
   return py::make_tuple(*lbub1, *lbub2, *idx1, *idx2, *max1, *max2);
 }
 
+/**
+ * @brief sum of n values in the same order as numpy's pairwise summation
+ *
+ * np.sum / np.mean of a contiguous float array use this exact association,
+ * reproducing it lets segment_sum match per-slice numpy sums bit-for-bit
+ */
+template <typename V>
+V pairwise_sum(V const* a, int64_t n) {
+  if (n < 8) {
+    V res = -0.0;
+    for (int64_t i = 0; i < n; ++i) res += a[i];
+    return res;
+  } else if (n <= 128) {
+    V r[8];
+    for (int j = 0; j < 8; ++j) r[j] = a[j];
+    int64_t i = 8;
+    for (; i < n - (n % 8); i += 8)
+      for (int j = 0; j < 8; ++j) r[j] += a[i + j];
+    V res = ((r[0] + r[1]) + (r[2] + r[3])) + ((r[4] + r[5]) + (r[6] + r[7]));
+    for (; i < n; ++i) res += a[i];
+    return res;
+  } else {
+    int64_t n2 = n / 2;
+    n2 -= n2 % 8;
+    return pairwise_sum(a, n2) + pairwise_sum(a + n2, n - n2);
+  }
+}
+
+template <typename I, typename V>
+Vx<V> segment_sum(Mx<I> lbub, Vx<V> vals) {
+  if (lbub.cols() != 2) throw std::runtime_error("lbub must be shape (N,2)");
+  py::gil_scoped_release release;
+  Vx<V> out(lbub.rows());
+  for (int i = 0; i < lbub.rows(); ++i) {
+    I lb = lbub(i, 0), ub = lbub(i, 1);
+    if (lb < 0 || ub < lb || ub > vals.size())
+      throw std::runtime_error("segment_sum lbub out of bounds");
+    out[i] = V(0) + pairwise_sum(vals.data() + lb, ub - lb);
+  }
+  return out;
+}
+
+template <typename I, typename V>
+Vx<V> segment_median(Mx<I> lbub, Vx<V> vals) {
+  if (lbub.cols() != 2) throw std::runtime_error("lbub must be shape (N,2)");
+  py::gil_scoped_release release;
+  Vx<V> out(lbub.rows());
+  std::vector<V> buf;
+  for (int i = 0; i < lbub.rows(); ++i) {
+    I lb = lbub(i, 0), ub = lbub(i, 1);
+    if (lb < 0 || ub < lb || ub > vals.size())
+      throw std::runtime_error("segment_median lbub out of bounds");
+    int n = ub - lb;
+    if (n == 0) {
+      out[i] = std::numeric_limits<V>::quiet_NaN();
+      continue;
+    }
+    buf.assign(vals.data() + lb, vals.data() + ub);
+    auto mid = buf.begin() + n / 2;
+    std::nth_element(buf.begin(), mid, buf.end());
+    if (n % 2) {
+      out[i] = *mid;
+    } else {
+      V lo = *std::max_element(buf.begin(), mid);
+      out[i] = (lo + *mid) / 2;
+    }
+  }
+  return out;
+}
+
 Vx<double> logsum_bins(Vx<uint64_t> lbub, Vx<double> vals) {
   py::gil_scoped_release release;
   Vx<double> out(lbub.size());
@@ -166,6 +237,9 @@ PYBIND11_MODULE(_motif, m) {
   m.def("logsum_bins", &logsum_bins, "lbub"_a, "vals"_a);
   m.def("marginal_max_score", &marginal_max_score<int32_t, double>, "lbub"_c,
         "pairs"_c, "vals"_c);
+  m.def("segment_sum", &segment_sum<int32_t, double>, "lbub"_c, "vals"_c);
+  m.def("segment_median", &segment_median<int32_t, double>, "lbub"_c,
+        "vals"_c);
 }
 
 }  // namespace motif
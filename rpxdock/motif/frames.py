@@ -1,5 +1,4 @@
 import os, sys, time, _pickle
-from cppimport import import_hook
 import numpy as np
 
 from rpxdock.xbin import xbin_util as xu
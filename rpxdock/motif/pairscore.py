@@ -1,7 +1,7 @@
 import os, _pickle
 import numpy as np
 from rpxdock.util import Bunch
-from rpxdock.phmap import PHMap_u8u8, PHMap_u8f8
+from rpxdock.phmap import PHMap_u8u8, PHMap_u8f8, frozen
 from rpxdock.motif import bb_stubs, add_xbin_to_respairdat
 from rpxdock.motif import add_rots_to_respairdat, get_pair_keys
 from rpxdock.motif import jagged_bin, logsum_bins
@@ -23,6 +23,7 @@ class Xmap:
       self.xbin = xbin
       self.phmap = phmap
       self.attr = Bunch(attrs)
+      self.frozen_file = None
       if rehash_bincens:
          k, v = self.phmap.items_array()
          self.phmap[xbin.key_of(xbin.bincen_of(k))] = v
@@ -54,6 +55,31 @@ class Xmap:
    def xforms(self, n=-1):
       return self.xbin.bincen_of(self.phmap.keys(n))
 
+   def freeze(self):
+      """copy with phmap replaced by a read-only open addressing FrozenMap"""
+      return Xmap(self.xbin, frozen.freeze(self.phmap), self.attr)
+
+   def quantize(self, dtype='u1'):
+      """copy with phmap replaced by a read-only QuantizedMap, see phmap.quantize"""
+      return Xmap(self.xbin, frozen.quantize(self.phmap, dtype), self.attr)
+
+   def dump_frozen(self, fname):
+      frozen.dump_frozen(self.phmap, fname, meta=dict(xbin=self.xbin, attr=dict(self.attr)))
+
+   @staticmethod
+   def load_frozen(fname, mmap=True):
+      """load Xmap written by dump_frozen, with the table mmap'd in place by default"""
+      phmap, meta = frozen.load_frozen(fname, mmap)
+      xmap = Xmap(meta['xbin'], phmap, meta['attr'])
+      if mmap: xmap.frozen_file = os.path.abspath(fname)
+      return xmap
+
+   def __reduce_ex__(self, protocol):
+      # mmap'd xmaps pickle as a reference to their file, see RpxHier.share
+      if getattr(self, 'frozen_file', None):
+         return _attach_xmap, (self.frozen_file, )
+      return super().__reduce_ex__(protocol)
+
 class ResPairScore:
    def __init__(self, xbin, keys, score_map, range_map, res1, res2, rotspace, rp):
       assert np.all(score_map.has(keys))
@@ -124,6 +150,46 @@ class ResPairScore:
    #         _pickle.dump(self, out)
    #     self.score_map, self.range_map = tmp
 
+   def dump_frozen(self, dirname):
+      """write to dirname with maps frozen and arrays as .npy, so load_frozen can mmap both"""
+      os.makedirs(dirname, exist_ok=True)
+      rest = dict()
+      for k, v in vars(self).items():
+         if k == 'frozen_file': continue
+         if isinstance(v, Xmap):
+            v.dump_frozen(os.path.join(dirname, k + '.xmap'))
+         elif isinstance(v, (PHMap_u8u8, PHMap_u8f8)) or frozen.is_frozen(v):
+            frozen.dump_frozen(v, os.path.join(dirname, k + '.frozen'))
+         elif isinstance(v, np.ndarray) and v.dtype != object:
+            np.save(os.path.join(dirname, k + '.npy'), v)
+         else:
+            rest[k] = v
+      with open(os.path.join(dirname, 'rest.pickle'), 'wb') as out:
+         _pickle.dump(rest, out)
+
+   @staticmethod
+   def load_frozen(dirname, mmap=True):
+      """load ResPairScore written by dump_frozen, maps and arrays mmap'd by default"""
+      self = ResPairScore.__new__(ResPairScore)
+      with open(os.path.join(dirname, 'rest.pickle'), 'rb') as inp:
+         vars(self).update(_pickle.load(inp))
+      for f in os.listdir(dirname):
+         k, ext = os.path.splitext(f)
+         fname = os.path.join(dirname, f)
+         if ext == '.npy':
+            setattr(self, k, np.load(fname, mmap_mode='r' if mmap else None))
+         elif ext == '.frozen':
+            setattr(self, k, frozen.load_frozen(fname, mmap)[0])
+         elif ext == '.xmap':
+            setattr(self, k, Xmap.load_frozen(fname, mmap))
+      self.frozen_file = os.path.abspath(dirname) if mmap else None
+      return self
+
+   def __reduce_ex__(self, protocol):
+      if getattr(self, 'frozen_file', None):
+         return _attach_respairscore, (self.frozen_file, )
+      return super().__reduce_ex__(protocol)
+
    def bin_respairs(self, key):
       r = self.rangemap[k]
       lb = np.right_shift(r, 32)
@@ -137,6 +203,19 @@ class ResPairScore:
               f" max_cart {self.xbin.max_cart:7.2f} \n        Xmap: " +
               f"score_map {len(self.score_map):,} " + f"range_map {len(self.range_map):,}")
 
+# tables unpickled from a file reference, so each process maps a file only once
+_attached = dict()
+
+def _attach_xmap(fname):
+   if fname not in _attached:
+      _attached[fname] = Xmap.load_frozen(fname)
+   return _attached[fname]
+
+def _attach_respairscore(dirname):
+   if dirname not in _attached:
+      _attached[dirname] = ResPairScore.load_frozen(dirname)
+   return _attached[dirname]
+
 def create_res_pair_score_map(rp, xbin, min_bin_score, **kw):
    kij, kji = get_pair_keys(rp, xbin, **kw)
    keys0 = np.concatenate([kij, kji])
@@ -69,7 +69,7 @@ def make_hscore_single(pairdat, ihier, xbin_base, cart_extent, ori_extent, sstag
          grid_r2 = xbin.grid6.neighbor_sphere_radius_square_cut(smearrad, exhalf)
          kern = 1 - (np.arange(grid_r2 + 1) / grid_r2)**1.5
       smearmap = rp.xbin.smear(xbin, basemap.phmap, radius=smearrad, extrahalf=exhalf, oddlast3=1,
-                               sphere=1, kernel=kern)
+                               sphere=1, kernel=kern, nthread=kw.get('smear_nthread', 1))
    else:
       smearmap = basemap.phmap
    sm = rp.Xmap(xbin, smearmap, rehash_bincens=True)
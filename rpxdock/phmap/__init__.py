@@ -1,2 +1,2 @@
-from cppimport import import_hook
 from .phmap import *
+from .frozen import *
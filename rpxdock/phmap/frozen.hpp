@@ -0,0 +1,205 @@
+#pragma once
+/** \file */
+
+#include <pybind11/numpy.h>
+#include <pybind11/pybind11.h>
+
+#include <algorithm>
+#include <limits>
+#include <vector>
+
+namespace rpxdock {
+namespace phmap {
+
+/// fixed 64bit mixer (murmur3 fmix64), part of the on-disk frozen map format
+inline uint64_t frozen_hash(uint64_t h) noexcept {
+  h ^= h >> 33;
+  h *= 0xff51afd7ed558ccdULL;
+  h ^= h >> 33;
+  h *= 0xc4ceb9fe1a85ec53ULL;
+  h ^= h >> 33;
+  return h;
+}
+
+/**
+ * @brief read-only open addressing map over flat key / value arrays
+ *
+ * lookup interface matches PHMap (get_default / has) so scoring kernels can
+ * take either. a key's home slot is frozen_hash(key) scaled to capacity, and
+ * keys are stored in order of home slot with linear probing (no wraparound,
+ * the arrays may run past capacity). so a probe can stop at the first slot
+ * that is empty or whose key has a later home, which keeps misses as cheap as
+ * hits. unused slots hold empty_ as key. the arrays are held by reference, so
+ * a FrozenMap built on np.memmap arrays is queried in place and shares the
+ * page cache with every other process mapping the same file.
+ */
+template <typename K, typename V>
+struct FrozenMap {
+  pybind11::array_t<K> keys_;
+  pybind11::array_t<V> vals_;
+  K const *keyp_ = nullptr;
+  V const *valp_ = nullptr;
+  size_t capacity_ = 0, nslot_ = 0, size_ = 0;
+  K empty_ = 0;
+  V default_ = 0;
+
+  FrozenMap(pybind11::array_t<K> keys, pybind11::array_t<V> vals,
+            size_t capacity, size_t size, K empty, V d = 0)
+      : keys_(keys),
+        vals_(vals),
+        capacity_(capacity),
+        size_(size),
+        empty_(empty),
+        default_(d) {
+    if (keys_.ndim() != 1 || vals_.ndim() != 1)
+      throw std::runtime_error("keys and vals must be 1D");
+    if (keys_.shape(0) != vals_.shape(0))
+      throw std::runtime_error("keys and vals must be same length");
+    if (keys_.strides(0) != sizeof(K) || vals_.strides(0) != sizeof(V))
+      throw std::runtime_error("keys and vals must be contiguous");
+    nslot_ = keys_.shape(0);
+    if (nslot_ < capacity_ || nslot_ < size_)
+      throw std::runtime_error("FrozenMap arrays too short");
+    keyp_ = keys_.data();
+    valp_ = vals_.data();
+  }
+  size_t size() const { return size_; }
+  size_t home(K k) const noexcept {
+    return (unsigned __int128)frozen_hash(k) * capacity_ >> 64;
+  }
+  size_t find(K k) const noexcept {
+    // empty_ marks unused slots, it is never a stored key
+    if (size_ == 0 || k == empty_) return nslot_;
+    size_t h = home(k);
+    for (size_t i = h; i < nslot_; ++i) {
+      K s = keyp_[i];
+      if (s == k) return i;
+      if (s == empty_ || home(s) > h) break;
+    }
+    return nslot_;
+  }
+  V value(size_t islot) const noexcept { return valp_[islot]; }
+  V get_default(K k) const noexcept {
+    size_t i = find(k);
+    return (i == nslot_) ? default_ : valp_[i];
+  }
+  /// start loading a key's home slot into cache, see get_batch
+  void prefetch(K k) const noexcept {
+    if (nslot_ == 0) return;
+    size_t h = home(k);
+    __builtin_prefetch(keyp_ + h);
+    __builtin_prefetch(valp_ + h);
+  }
+  bool has(K k) const noexcept { return find(k) != nslot_; }
+  /// true if all size() keys are reachable from their home slot
+  bool is_valid() const noexcept {
+    size_t n = 0;
+    for (size_t i = 0; i < nslot_; ++i) {
+      if (keyp_[i] == empty_) continue;
+      if (find(keyp_[i]) != i) return false;
+      ++n;
+    }
+    return n == size_;
+  }
+
+  /// slots needed to lay out n keys with given capacity, fills order
+  static size_t layout(K const *keys, size_t n, size_t capacity,
+                       std::vector<size_t> &order) {
+    std::vector<size_t> homes(n);
+    for (size_t j = 0; j < n; ++j)
+      homes[j] = (unsigned __int128)frozen_hash(keys[j]) * capacity >> 64;
+    order.resize(n);
+    for (size_t j = 0; j < n; ++j) order[j] = j;
+    std::sort(order.begin(), order.end(), [&](size_t a, size_t b) {
+      return homes[a] < homes[b] || (homes[a] == homes[b] && keys[a] < keys[b]);
+    });
+    size_t pos = 0;
+    for (size_t j = 0; j < n; ++j) {
+      if (j > 0 && keys[order[j]] == keys[order[j - 1]])
+        throw std::runtime_error("duplicate key");
+      pos = std::max(pos, homes[order[j]]) + 1;
+    }
+    return std::max(pos, capacity);
+  }
+  /// fill arrays of length nslot from layout order
+  static void fill(K const *keys, V const *vals,
+                   std::vector<size_t> const &order, K empty, size_t capacity,
+                   size_t nslot, K *outk, V *outv) {
+    std::fill(outk, outk + nslot, empty);
+    std::fill(outv, outv + nslot, V(0));
+    size_t pos = 0;
+    for (size_t j : order) {
+      size_t h = (unsigned __int128)frozen_hash(keys[j]) * capacity >> 64;
+      pos = std::max(pos, h);
+      outk[pos] = keys[j];
+      outv[pos] = vals[j];
+      ++pos;
+    }
+  }
+  /// a key value not in keys[0,n)
+  static K pick_empty(K const *keys, size_t n) {
+    if (n == 0) return std::numeric_limits<K>::max();
+    K mx = *std::max_element(keys, keys + n);
+    if (mx < std::numeric_limits<K>::max()) return mx + 1;
+    K mn = *std::min_element(keys, keys + n);
+    if (mn > std::numeric_limits<K>::min()) return mn - 1;
+    throw std::runtime_error("no free key value for FrozenMap empty slots");
+  }
+};
+
+/**
+ * @brief FrozenMap with values stored as integer codes Q, read back as
+ * offset_ + scale_ * code
+ *
+ * same slots and lookup as FrozenMap<K, Q>, so a table quantized to one byte
+ * codes takes 9 bytes a slot instead of 16 and more of it stays in cache.
+ * get_default decodes to V, so the scoring kernels take it like any other
+ * Map<K, V>. the default is kept unquantized
+ */
+template <typename K, typename V, typename Q>
+struct QuantizedMap : FrozenMap<K, Q> {
+  V scale_ = 1, offset_ = 0, default_ = 0;
+
+  QuantizedMap(pybind11::array_t<K> keys, pybind11::array_t<Q> codes,
+               size_t capacity, size_t size, K empty, V scale, V offset,
+               V d = 0)
+      : FrozenMap<K, Q>(keys, codes, capacity, size, empty),
+        scale_(scale),
+        offset_(offset),
+        default_(d) {}
+  V decode(Q q) const noexcept { return offset_ + scale_ * q; }
+  V value(size_t islot) const noexcept { return decode(this->valp_[islot]); }
+  V get_default(K k) const noexcept {
+    size_t i = this->find(k);
+    return (i == this->nslot_) ? default_ : decode(this->valp_[i]);
+  }
+};
+
+/**
+ * @brief out[i] = map.get_default(keys[i]) for i in [0, n), with the slots
+ * of keys batch_prefetch_distance ahead prefetched
+ *
+ * lookups in a table much bigger than cache are each a cache miss. issuing the
+ * loads for later keys before they are needed overlaps those misses instead of
+ * waiting on them one at a time. Map is anything with get_default and prefetch
+ */
+constexpr size_t batch_prefetch_distance = 16;
+
+template <typename M, typename K, typename V>
+void get_batch(M const &map, K const *keys, V *out, size_t n) noexcept {
+  size_t d = std::min(n, batch_prefetch_distance);
+  for (size_t i = 0; i < d; ++i) map.prefetch(keys[i]);
+  for (size_t i = 0; i < n; ++i) {
+    if (i + d < n) map.prefetch(keys[i + d]);
+    out[i] = map.get_default(keys[i]);
+  }
+}
+
+/// Map<K, V> shaped names for the template template args of scoring kernels
+template <typename K, typename V>
+using QuantizedMap1 = QuantizedMap<K, V, uint8_t>;
+template <typename K, typename V>
+using QuantizedMap2 = QuantizedMap<K, V, uint16_t>;
+
+}  // namespace phmap
+}  // namespace rpxdock
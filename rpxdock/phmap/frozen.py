@@ -0,0 +1,151 @@
+"""
+read-only hash tables (FrozenMap_*) and their on-disk format
+
+a FrozenMap is an open addressing table over two flat arrays, slot keys and
+slot values, laid out by a fixed hash (see frozen.hpp). file layout: 8 byte magic,
+u8 header size, pickled header dict, then the two arrays at page-aligned
+offsets. load_frozen np.memmap's the arrays and the FrozenMap queries them in
+place, so loading is O(1) and every process mapping the same file shares one
+copy in the page cache.
+
+QuantizedMap_u8u1 / _u8u2 use the same layout with values stored as one or two
+byte codes, read back as offset + scale * code (see quantize). they are written
+and loaded the same way, with scale and offset in the header.
+"""
+
+import os, _pickle, numpy as np
+from rpxdock.phmap.phmap import (FrozenMap_u8f4, FrozenMap_u8f8, FrozenMap_u8u8, QuantizedMap_u8u1,
+                                 QuantizedMap_u8u2, freeze_phmap)
+
+_MAGIC = b'RPXFRZN1'
+_ALIGN = 4096
+
+_frozen_types = {
+   ('u8', 'f4'): FrozenMap_u8f4,
+   ('u8', 'f8'): FrozenMap_u8f8,
+   ('u8', 'u8'): FrozenMap_u8u8,
+}
+
+_quantized_types = {
+   'u1': QuantizedMap_u8u1,
+   'u2': QuantizedMap_u8u2,
+}
+
+def frozen_map_type(key_dtype, val_dtype):
+   key = np.dtype(key_dtype).str[1:], np.dtype(val_dtype).str[1:]
+   if key not in _frozen_types:
+      raise ValueError(f'no FrozenMap for key/val dtypes {key}')
+   return _frozen_types[key]
+
+def is_frozen(m):
+   return isinstance(m, tuple(_frozen_types.values())) or is_quantized(m)
+
+def is_quantized(m):
+   return isinstance(m, tuple(_quantized_types.values()))
+
+def freeze(phmap, load_factor=0.5):
+   '''read-only copy of PHMap_*, FrozenMap and QuantizedMap are returned as is'''
+   if is_frozen(phmap): return phmap
+   return freeze_phmap(phmap, load_factor)
+
+def quantize(phmap, dtype='u1', load_factor=0.5):
+   '''read-only copy of PHMap_* or FrozenMap_* with values stored as u1 or u2 codes
+
+   codes are spread linearly over the range of the values, so the error is at most
+   scale / 2. the default value is kept exactly. see quantization_error'''
+   code = np.dtype(dtype).str[1:]
+   if code not in _quantized_types:
+      raise ValueError(f'can only quantize to {list(_quantized_types)}, not {dtype}')
+   if is_quantized(phmap):
+      if phmap.slot_vals.dtype == np.dtype(dtype): return phmap
+      raise ValueError('map is already quantized')
+   fz = freeze(phmap, load_factor)
+   keys, vals = fz.slot_keys, fz.slot_vals.astype('f8')
+   used = keys != fz.empty
+   lo, hi = (vals[used].min(), vals[used].max()) if np.any(used) else (0.0, 0.0)
+   qmax = np.iinfo(dtype).max
+   scale = (hi - lo) / qmax if hi > lo else 1.0
+   codes = np.clip(np.rint((vals - lo) / scale), 0, qmax).astype(dtype)
+   codes[~used] = 0
+   maptype = _quantized_types[code]
+   return maptype(keys, codes, fz.capacity, len(fz), fz.empty, scale, lo, fz.default, check=False)
+
+def quantization_error(phmap, quantized, nsample=None):
+   '''dict of abs deviation stats of quantized from phmap over its keys, nsample random
+   keys if given'''
+   keys, vals = phmap.items_array()
+   if nsample and len(keys) > nsample:
+      which = np.random.choice(len(keys), nsample, replace=False)
+      keys, vals = keys[which], vals[which]
+   err = np.abs(quantized[keys] - vals) if len(keys) else np.zeros(1)
+   return dict(
+      n=len(keys),
+      max=float(np.max(err)),
+      mean=float(np.mean(err)),
+      rms=float(np.sqrt(np.mean(err**2))),
+      step=float(getattr(quantized, 'scale', 0.0)),
+      range=(float(np.min(vals)), float(np.max(vals))) if len(keys) else (0.0, 0.0),
+   )
+
+def dump_frozen(phmap, fname, meta=None):
+   '''write PHMap_* or FrozenMap_* to fname, meta is pickled into the header'''
+   fz = freeze(phmap)
+   keys, vals = fz.slot_keys, fz.slot_vals
+   header = dict(
+      version=1,
+      key_dtype=keys.dtype.str,
+      val_dtype=vals.dtype.str,
+      size=len(fz),
+      capacity=fz.capacity,
+      nslot=len(keys),
+      empty=fz.empty,
+      default=fz.default,
+      meta=meta,
+   )
+   if is_quantized(fz):
+      header['quant'] = dict(scale=fz.scale, offset=fz.offset)
+   hsize = len(_MAGIC) + 8 + len(_pickle.dumps(header)) + 64  # room for offsets
+   header['keys_offset'] = _aligned(hsize)
+   header['vals_offset'] = header['keys_offset'] + _aligned(keys.nbytes)
+   hbytes = _pickle.dumps(header)
+   d = os.path.dirname(fname)
+   if d: os.makedirs(d, exist_ok=True)
+   with open(fname, 'wb') as out:
+      out.write(_MAGIC)
+      out.write(np.uint64(len(hbytes)).tobytes())
+      out.write(hbytes)
+      out.seek(header['keys_offset'])
+      out.write(keys.tobytes())
+      out.seek(header['vals_offset'])
+      out.write(vals.tobytes())
+
+def read_frozen_header(fname):
+   with open(fname, 'rb') as inp:
+      if inp.read(len(_MAGIC)) != _MAGIC:
+         raise ValueError(f'{fname} is not a frozen map file')
+      nbytes = int(np.frombuffer(inp.read(8), dtype='u8')[0])
+      return _pickle.loads(inp.read(nbytes))
+
+def load_frozen(fname, mmap=True):
+   '''returns FrozenMap_*, meta. mmap=False reads the arrays into memory'''
+   h = read_frozen_header(fname)
+   n = h['nslot']
+   keys = _read_array(fname, h['key_dtype'], n, h['keys_offset'], mmap)
+   vals = _read_array(fname, h['val_dtype'], n, h['vals_offset'], mmap)
+   if 'quant' in h:
+      q = h['quant']
+      maptype = _quantized_types[vals.dtype.str[1:]]
+      m = maptype(keys, vals, h['capacity'], h['size'], h['empty'], q['scale'], q['offset'],
+                  h['default'], check=False)
+   else:
+      maptype = frozen_map_type(keys.dtype, vals.dtype)
+      m = maptype(keys, vals, h['capacity'], h['size'], h['empty'], h['default'], check=False)
+   return m, h['meta']
+
+def _read_array(fname, dtype, n, offset, mmap):
+   if n == 0: return np.empty(0, dtype=dtype)
+   if mmap: return np.memmap(fname, dtype=dtype, mode='r', offset=offset, shape=(n, ))
+   return np.fromfile(fname, dtype=dtype, count=n, offset=offset)
+
+def _aligned(n):
+   return (n + _ALIGN - 1) // _ALIGN * _ALIGN
@@ -4,7 +4,7 @@
 
 cfg['include_dirs'] = ['../..','../extern']
 cfg['compiler_args'] = ['-std=c++17', '-w', '-Ofast']
-cfg['dependencies'] = ['phmap.hpp']
+cfg['dependencies'] = ['phmap.hpp', 'frozen.hpp']
 
 cfg['parallel'] = False
 
@@ -15,12 +15,15 @@ setup_pybind11(cfg)
 /** \file */
 
 #include "rpxdock/phmap/phmap.hpp"
+#include "rpxdock/phmap/frozen.hpp"
 
 #include <pybind11/eigen.h>
 #include <pybind11/numpy.h>
 #include <pybind11/pybind11.h>
 
+#include <cstring>
 #include <iostream>
+#include <vector>
 
 #include "rpxdock/util/types.hpp"
 namespace py = pybind11;
@@ -144,6 +147,179 @@ bool PHMap_eq(PHMap<K, V> const &a, PHMap<K, V> const &b) {
   return true;
 }
 
+/////////////////////////// dump / load ///////////////////////////////
+
+// file layout: PHMapFileHeader then chunks of (u8 n, n keys, n vals). the
+// whole stream may be gzip/bz2/xz compressed, load detects which
+struct PHMapFileHeader {
+  char magic[8];
+  char key_type[4];
+  char val_type[4];
+  uint64_t size;
+  uint64_t chunk_size;
+  char default_[8];
+};
+static char const PHMAP_MAGIC[8] = {'R', 'P', 'X', 'P', 'H', 'M', 'P', '1'};
+
+template <typename T>
+void type_code(char *code) {
+  std::memset(code, 0, 4);
+  code[0] = std::is_floating_point<T>::value ? 'f'
+            : std::is_signed<T>::value       ? 'i'
+                                             : 'u';
+  code[1] = '0' + sizeof(T);
+}
+
+py::object open_phmap_stream(py::object fname, std::string mode,
+                             std::string compression, int level) {
+  auto io = py::module::import("io");
+  if (compression == "" || compression == "none")
+    return io.attr("open")(fname, mode);
+  std::string modname = compression;
+  if (compression == "gz") modname = "gzip";
+  if (compression == "xz") modname = "lzma";
+  if (modname != "gzip" && modname != "bz2" && modname != "lzma")
+    throw std::runtime_error("unknown compression: " + compression);
+  auto mod = py::module::import(modname.c_str());
+  if (mode[0] == 'r' || level < 0) return mod.attr("open")(fname, mode);
+  if (modname == "lzma")
+    return mod.attr("open")(fname, mode, "preset"_a = level);
+  return mod.attr("open")(fname, mode, "compresslevel"_a = level);
+}
+
+// peeks at the magic bytes, gzip, bz2 and xz streams are decompressed
+py::object open_phmap_input(py::object fname) {
+  auto io = py::module::import("io");
+  py::object raw = io.attr("open")(fname, "rb");
+  std::string head = raw.attr("read")(6).cast<std::string>();
+  raw.attr("seek")(0);
+  char const *mod = nullptr;
+  if (head.rfind("\x1f\x8b", 0) == 0) mod = "gzip";
+  if (head.rfind("BZh", 0) == 0) mod = "bz2";
+  if (head.rfind("\3757zXZ", 0) == 0) mod = "lzma";
+  if (!mod) return raw;
+  raw.attr("close")();
+  return py::module::import(mod).attr("open")(fname, "rb");
+}
+
+void write_block(py::object &write, void const *p, size_t nbytes) {
+  if (nbytes == 0) return;
+  py::gil_scoped_acquire acquire;
+  write(py::memoryview::from_memory(p, nbytes));
+}
+
+void read_block(py::object &readinto, void *p, size_t nbytes) {
+  py::gil_scoped_acquire acquire;
+  char *c = static_cast<char *>(p);
+  while (nbytes > 0) {
+    auto n = readinto(py::memoryview::from_memory(c, nbytes)).cast<size_t>();
+    if (n == 0) throw std::runtime_error("truncated PHMap file");
+    c += n;
+    nbytes -= n;
+  }
+}
+
+/**
+ * @brief write raw key and value blocks of chunk_size entries at a time to
+ * the binary file-like out, so memory overhead is one chunk however big the
+ * map is
+ */
+template <typename K, typename V>
+void PHMap_dump_stream(PHMap<K, V> const &map, py::object out,
+                       size_t chunk_size) {
+  if (chunk_size == 0) throw std::runtime_error("chunk_size must be > 0");
+  py::object write = out.attr("write");
+  PHMapFileHeader header;
+  std::memset(&header, 0, sizeof(header));
+  std::memcpy(header.magic, PHMAP_MAGIC, 8);
+  type_code<K>(header.key_type);
+  type_code<V>(header.val_type);
+  header.size = map.size();
+  header.chunk_size = chunk_size;
+  std::memcpy(header.default_, &map.default_, sizeof(V));
+  py::gil_scoped_release release;
+  write_block(write, &header, sizeof(header));
+  std::vector<K> keys(std::min<size_t>(chunk_size, map.size()));
+  std::vector<V> vals(keys.size());
+  uint64_t n = 0;
+  auto flush = [&]() {
+    write_block(write, &n, sizeof(n));
+    write_block(write, keys.data(), n * sizeof(K));
+    write_block(write, vals.data(), n * sizeof(V));
+    n = 0;
+  };
+  for (auto [k, v] : map.phmap_) {
+    keys[n] = k;
+    vals[n] = v;
+    if (++n == chunk_size) flush();
+  }
+  if (n > 0) flush();
+}
+
+template <typename K, typename V>
+std::unique_ptr<PHMap<K, V>> PHMap_load_stream(py::object inp) {
+  py::object readinto = inp.attr("readinto");
+  PHMapFileHeader header;
+  read_block(readinto, &header, sizeof(header));
+  if (std::memcmp(header.magic, PHMAP_MAGIC, 8) != 0)
+    throw std::runtime_error("not a PHMap file");
+  char key_type[4], val_type[4];
+  type_code<K>(key_type);
+  type_code<V>(val_type);
+  if (std::memcmp(header.key_type, key_type, 4) != 0 ||
+      std::memcmp(header.val_type, val_type, 4) != 0)
+    throw std::runtime_error(
+        "PHMap file has types " + std::string(header.key_type, 2) +
+        std::string(header.val_type, 2) + ", expected " + key_type + val_type);
+  V dflt;
+  std::memcpy(&dflt, header.default_, sizeof(V));
+  auto map = std::make_unique<PHMap<K, V>>(dflt);
+  py::gil_scoped_release release;
+  map->phmap_.reserve(header.size);
+  std::vector<K> keys(std::min(header.chunk_size, header.size));
+  std::vector<V> vals(keys.size());
+  for (uint64_t nread = 0; nread < header.size;) {
+    uint64_t n;
+    read_block(readinto, &n, sizeof(n));
+    if (n > keys.size() || nread + n > header.size)
+      throw std::runtime_error("corrupt PHMap file");
+    read_block(readinto, keys.data(), n * sizeof(K));
+    read_block(readinto, vals.data(), n * sizeof(V));
+    for (size_t i = 0; i < n; ++i) map->phmap_.emplace(keys[i], vals[i]);
+    nread += n;
+  }
+  return map;
+}
+
+template <typename K, typename V>
+void PHMap_dump(PHMap<K, V> const &map, py::object fname,
+                std::string compression, int level, size_t chunk_size) {
+  if (py::hasattr(fname, "write"))
+    return PHMap_dump_stream(map, fname, chunk_size);
+  py::object out = open_phmap_stream(fname, "wb", compression, level);
+  try {
+    PHMap_dump_stream(map, out, chunk_size);
+  } catch (...) {
+    out.attr("close")();
+    throw;
+  }
+  out.attr("close")();
+}
+
+template <typename K, typename V>
+std::unique_ptr<PHMap<K, V>> PHMap_load(py::object fname) {
+  if (py::hasattr(fname, "readinto")) return PHMap_load_stream<K, V>(fname);
+  py::object inp = open_phmap_input(fname);
+  try {
+    auto map = PHMap_load_stream<K, V>(inp);
+    inp.attr("close")();
+    return map;
+  } catch (...) {
+    inp.attr("close")();
+    throw;
+  }
+}
+
 template <typename K, typename V>
 void bind_phmap(const py::module &m, std::string name) {
   using THIS = PHMap<K, V>;
@@ -170,6 +346,14 @@ void bind_phmap(const py::module &m, std::string name) {
             return py::make_iterator(c.phmap_.begin(), c.phmap_.end());
           },
           py::keep_alive<0, 1>())
+      .def("dump", &PHMap_dump<K, V>,
+           "write raw key/value blocks to fname (path or binary file), "
+           "compression gzip, bz2 or xz, level -1 for the module default",
+           "fname"_a, "compression"_a = "", "level"_a = -1,
+           "chunk_size"_a = 1 << 20)
+      .def_static("load", &PHMap_load<K, V>,
+                  "read file written by dump, compression is detected",
+                  "fname"_a)
       .def(py::pickle(
           [](THIS const &map) {  // __getstate__
             py::tuple tup = PHMap_items_array(map);
@@ -184,6 +368,7 @@ void bind_phmap(const py::module &m, std::string name) {
             auto map = std::make_unique<THIS>(v0);
             auto keys = t[0].cast<Vx<K>>();
             auto vals = t[1].cast<Vx<V>>();
+            map->phmap_.reserve(keys.size());
             PHMap_set<K, V>(*map, keys, vals);
             return map;
           }))
@@ -191,12 +376,247 @@ void bind_phmap(const py::module &m, std::string name) {
       /**/;
 }
 
+/////////////////////////// FrozenMap //////////////////////////////////
+
+template <typename K, typename V, typename M = FrozenMap<K, V>>
+Vx<V> FrozenMap_get(M const &map, RefVx<K> keys) {
+  py::gil_scoped_release release;
+  Vx<V> out(keys.size());
+  get_batch(map, keys.data(), out.data(), keys.size());
+  return out;
+}
+
+template <typename K, typename V, typename M = FrozenMap<K, V>>
+Vx<bool> FrozenMap_has(M const &map, RefVx<K> keys) {
+  py::gil_scoped_release release;
+  Vx<bool> out(keys.size());
+  for (size_t i = 0; i < keys.size(); i++) out[i] = map.has(keys[i]);
+  return out;
+}
+
+template <typename K, typename V, typename M = FrozenMap<K, V>>
+bool FrozenMap_contains(M const &map, Vx<K> keys) {
+  py::gil_scoped_release release;
+  for (size_t i = 0; i < keys.size(); i++)
+    if (!map.has(keys[i])) return false;
+  return true;
+}
+
+template <typename K, typename V, typename M = FrozenMap<K, V>>
+py::tuple FrozenMap_items_array(M const &map, int n = -1) {
+  auto keys = std::make_unique<Vx<K>>();
+  auto vals = std::make_unique<Vx<V>>();
+  {
+    py::gil_scoped_release release;
+    if (n < 0) n = map.size();
+    n = std::min<int>(n, map.size());
+    keys->resize(n);
+    vals->resize(n);
+    int i = 0;
+    for (size_t islot = 0; islot < map.nslot_ && i < n; ++islot) {
+      if (map.keyp_[islot] == map.empty_) continue;
+      (*keys)[i] = map.keyp_[islot];
+      (*vals)[i] = map.value(islot);
+      ++i;
+    }
+  }
+  return py::make_tuple(*keys, *vals);
+}
+
+template <typename K, typename V, typename M = FrozenMap<K, V>>
+bool FrozenMap_eq(M const &a, M const &b) {
+  py::gil_scoped_release release;
+  if (a.size() != b.size()) return false;
+  if (a.default_ != b.default_) return false;
+  for (size_t i = 0; i < a.nslot_; ++i) {
+    if (a.keyp_[i] == a.empty_) continue;
+    size_t j = b.find(a.keyp_[i]);
+    if (j == b.nslot_ || b.value(j) != a.value(i)) return false;
+  }
+  return true;
+}
+
+template <typename K, typename V>
+std::unique_ptr<FrozenMap<K, V>> FrozenMap_init(py::array_t<K> keys,
+                                                py::array_t<V> vals,
+                                                size_t capacity, size_t size,
+                                                K empty, V dflt, bool check) {
+  auto map = std::make_unique<FrozenMap<K, V>>(keys, vals, capacity, size,
+                                               empty, dflt);
+  if (check) {
+    py::gil_scoped_release release;
+    if (!map->is_valid()) throw std::runtime_error("invalid FrozenMap layout");
+  }
+  return map;
+}
+
+template <typename K, typename V>
+std::unique_ptr<FrozenMap<K, V>> FrozenMap_build(K const *keys, V const *vals,
+                                                 size_t n, V dflt,
+                                                 double load_factor) {
+  if (load_factor <= 0 || load_factor >= 1)
+    throw std::runtime_error("load_factor must be in (0,1)");
+  size_t capacity = std::max<size_t>(n / load_factor, n + 1);
+  std::vector<size_t> order;
+  size_t nslot;
+  K empty;
+  {
+    py::gil_scoped_release release;
+    empty = FrozenMap<K, V>::pick_empty(keys, n);
+    nslot = FrozenMap<K, V>::layout(keys, n, capacity, order);
+  }
+  py::array_t<K> outk(nslot);
+  py::array_t<V> outv(nslot);
+  {
+    py::gil_scoped_release release;
+    FrozenMap<K, V>::fill(keys, vals, order, empty, capacity, nslot,
+                          outk.mutable_data(), outv.mutable_data());
+  }
+  return std::make_unique<FrozenMap<K, V>>(outk, outv, capacity, n, empty,
+                                           dflt);
+}
+
+template <typename K, typename V>
+std::unique_ptr<FrozenMap<K, V>> FrozenMap_from_items(
+    py::array_t<K, py::array::c_style> keys,
+    py::array_t<V, py::array::c_style> vals, V dflt, double load_factor) {
+  if (keys.ndim() != 1 || keys.size() != vals.size())
+    throw std::runtime_error("keys and vals must be 1D and same length");
+  return FrozenMap_build<K, V>(keys.data(), vals.data(), keys.size(), dflt,
+                               load_factor);
+}
+
+template <typename K, typename V>
+std::unique_ptr<FrozenMap<K, V>> freeze_phmap(PHMap<K, V> const &phmap,
+                                              double load_factor) {
+  py::tuple items = PHMap_items_array(phmap);
+  auto keys = items[0].cast<Vx<K>>();
+  auto vals = items[1].cast<Vx<V>>();
+  return FrozenMap_build<K, V>(keys.data(), vals.data(), keys.size(),
+                               phmap.default_, load_factor);
+}
+
+template <typename K, typename V>
+void bind_frozen_map(py::module &m, std::string name) {
+  using THIS = FrozenMap<K, V>;
+
+  py::class_<THIS>(m, name.c_str())
+      .def(py::init(&FrozenMap_init<K, V>), "keys"_a.noconvert(),
+           "vals"_a.noconvert(), "capacity"_a, "size"_a, "empty"_a,
+           "default"_a = 0, "check"_a = true)
+      .def_static("from_items", &FrozenMap_from_items<K, V>, "keys"_a, "vals"_a,
+                  "default"_a = 0, "load_factor"_a = 0.5)
+      .def("__len__", &THIS::size)
+      .def("__getitem__", &FrozenMap_get<K, V>, "getitem", "keys"_a)
+      .def("__getitem__", &THIS::get_default, "getitem", "key"_a)
+      .def("has", &FrozenMap_has<K, V>)
+      .def("__contains__", &FrozenMap_contains<K, V>)
+      .def("__contains__", &THIS::has)
+      .def(
+          "keys",
+          [](THIS const &c, int n) {
+            return py::object(FrozenMap_items_array<K, V>(c, n)[0]);
+          },
+          "num"_a = -1)
+      .def("items_array", &FrozenMap_items_array<K, V>, "num"_a = -1)
+      .def("__eq__", &FrozenMap_eq<K, V>)
+      .def_readonly("default", &THIS::default_)
+      .def_readonly("empty", &THIS::empty_)
+      .def_readonly("capacity", &THIS::capacity_)
+      .def_readonly("slot_keys", &THIS::keys_)
+      .def_readonly("slot_vals", &THIS::vals_)
+      .def(py::pickle(
+          [](THIS const &map) {  // __getstate__
+            return py::make_tuple(map.keys_, map.vals_, map.capacity_,
+                                  map.size_, map.empty_, map.default_);
+          },
+          [](py::tuple t) {  // __setstate__
+            if (t.size() != 6) throw std::runtime_error("Invalid state!");
+            return std::make_unique<THIS>(
+                t[0].cast<py::array_t<K>>(), t[1].cast<py::array_t<V>>(),
+                t[2].cast<size_t>(), t[3].cast<size_t>(), t[4].cast<K>(),
+                t[5].cast<V>());
+          }))
+
+      /**/;
+  m.def("freeze_phmap", &freeze_phmap<K, V>, "phmap"_a, "load_factor"_a = 0.5);
+}
+
+/////////////////////////// QuantizedMap ///////////////////////////////
+
+template <typename K, typename V, typename Q>
+std::unique_ptr<QuantizedMap<K, V, Q>> QuantizedMap_init(
+    py::array_t<K> keys, py::array_t<Q> codes, size_t capacity, size_t size,
+    K empty, V scale, V offset, V dflt, bool check) {
+  auto map = std::make_unique<QuantizedMap<K, V, Q>>(
+      keys, codes, capacity, size, empty, scale, offset, dflt);
+  if (check) {
+    py::gil_scoped_release release;
+    if (!map->is_valid()) throw std::runtime_error("invalid FrozenMap layout");
+  }
+  return map;
+}
+
+template <typename K, typename V, typename Q>
+void bind_quantized_map(py::module &m, std::string name) {
+  using THIS = QuantizedMap<K, V, Q>;
+
+  py::class_<THIS>(m, name.c_str())
+      .def(py::init(&QuantizedMap_init<K, V, Q>), "keys"_a.noconvert(),
+           "codes"_a.noconvert(), "capacity"_a, "size"_a, "empty"_a, "scale"_a,
+           "offset"_a, "default"_a = 0, "check"_a = true)
+      .def("__len__", &THIS::size)
+      .def("__getitem__", &FrozenMap_get<K, V, THIS>, "getitem", "keys"_a)
+      .def("__getitem__", &THIS::get_default, "getitem", "key"_a)
+      .def("has", &FrozenMap_has<K, V, THIS>)
+      .def("__contains__", &FrozenMap_contains<K, V, THIS>)
+      // has is inherited, bound through THIS so the self type is registered
+      .def("__contains__", [](THIS const &map, K k) { return map.has(k); })
+      .def(
+          "keys",
+          [](THIS const &c, int n) {
+            return py::object(FrozenMap_items_array<K, V, THIS>(c, n)[0]);
+          },
+          "num"_a = -1)
+      .def("items_array", &FrozenMap_items_array<K, V, THIS>, "num"_a = -1)
+      .def("__eq__", &FrozenMap_eq<K, V, THIS>)
+      .def_readonly("default", &THIS::default_)
+      .def_readonly("scale", &THIS::scale_)
+      .def_readonly("offset", &THIS::offset_)
+      .def_readonly("empty", &THIS::empty_)
+      .def_readonly("capacity", &THIS::capacity_)
+      .def_readonly("slot_keys", &THIS::keys_)
+      .def_readonly("slot_vals", &THIS::vals_)
+      .def(py::pickle(
+          [](THIS const &map) {  // __getstate__
+            return py::make_tuple(map.keys_, map.vals_, map.capacity_,
+                                  map.size_, map.empty_, map.scale_,
+                                  map.offset_, map.default_);
+          },
+          [](py::tuple t) {  // __setstate__
+            if (t.size() != 8) throw std::runtime_error("Invalid state!");
+            return std::make_unique<THIS>(
+                t[0].cast<py::array_t<K>>(), t[1].cast<py::array_t<Q>>(),
+                t[2].cast<size_t>(), t[3].cast<size_t>(), t[4].cast<K>(),
+                t[5].cast<V>(), t[6].cast<V>(), t[7].cast<V>());
+          }))
+
+      /**/;
+}
+
 PYBIND11_MODULE(phmap, m) {
   bind_phmap<uint32_t, float>(m, "PHMap_u4f4");
   bind_phmap<uint64_t, float>(m, "PHMap_u8f4");
   bind_phmap<uint64_t, double>(m, "PHMap_u8f8");
   bind_phmap<uint64_t, uint64_t>(m, "PHMap_u8u8");
 
+  bind_frozen_map<uint64_t, float>(m, "FrozenMap_u8f4");
+  bind_frozen_map<uint64_t, double>(m, "FrozenMap_u8f8");
+  bind_frozen_map<uint64_t, uint64_t>(m, "FrozenMap_u8u8");
+
+  bind_quantized_map<uint64_t, double, uint8_t>(m, "QuantizedMap_u8u1");
+  bind_quantized_map<uint64_t, double, uint16_t>(m, "QuantizedMap_u8u2");
+
   m.def("test_mod_phmap_inplace", &test_mod_phmap_inplace<uint64_t, uint64_t>);
 }
 
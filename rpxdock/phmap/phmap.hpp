@@ -26,6 +26,8 @@ struct PHMap {
     return (it == phmap_.end()) ? default_ : it->second;
   }
   bool has(K k) const noexcept { return phmap_.find(k) != phmap_.end(); }
+  /// no-op, parallel_flat_hash_map has prefetch compiled out
+  void prefetch(K k) const noexcept {}
 };
 
 }  // namespace phmap
@@ -6,5 +6,6 @@ from .xform_grid import *
 from .compound import *
 from .xform_hier import *
 from .lattice_hier import *
+from .shared import *
 # XformHier = XformHier_f4
 # create_XformHier_nside = create_XformHier_nside_f4
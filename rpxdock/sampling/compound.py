@@ -72,16 +72,10 @@ class CompoundHier:
 
    def split_indices(self, resl, idx):
       idx = self.check_indices(resl, idx)
-      cell = self.split_indices_cell(resl, idx)
-      hier = self.split_indices_hier(resl, idx)
-      assert len(cell) == len(hier)
-      split = list()
-      for c, h, d in zip(cell, hier, self.dims):
-         c = np.left_shift(c, np.uint64(resl * d))
-         split.append(np.bitwise_or(c, h))
-      return np.stack(split)
+      return sd.sampling.split_compound_indices(resl, idx, self.ncells, self.dims)
 
-   def get_xforms(self, resl=0, idx=None):
+   def get_xform_parts(self, resl=0, idx=None):
+      '''ok mask and a list with the xforms of each part for the ok indices'''
       if idx is None: idx = np.arange(self.size(resl))
       split = self.split_indices(resl, idx)
       ok = np.repeat(True, len(idx))
@@ -90,7 +84,12 @@ class CompoundHier:
          v, x = p.get_xforms(resl, sidx)
          ok &= v
          xforms.append(x)
-      return ok, np.stack(xforms, axis=1)[ok]
+      if not np.all(ok): xforms = [x[ok] for x in xforms]
+      return ok, xforms
+
+   def get_xforms(self, resl=0, idx=None):
+      ok, xforms = self.get_xform_parts(resl, idx)
+      return ok, np.stack(xforms, axis=1)
 
    def expand_top_N(self, nexpand, resl, scores, indices):
       dummy = self.dummies[scores.dtype]
@@ -109,18 +108,19 @@ class ProductHier(CompoundHier):
       super().__init__(*args)
 
    def combine_xforms(self, xparts):
-      x = xparts[:, -1]
-      for i in reversed(range(xparts.shape[1] - 1)):
-         x = xparts[:, i] @ x
-      return x
+      '''product of the part xforms, xparts stacked (N, nparts, 4, 4) or a list of (N, 4, 4)'''
+      if isinstance(xparts, np.ndarray):
+         xparts = [xparts[:, i] for i in range(xparts.shape[1])]
+      return sd.sampling.product_xforms(list(xparts))
 
    def get_xforms(self, *args, **kw):
-      ok, xparts = super().get_xforms(*args, **kw)
+      ok, xparts = self.get_xform_parts(*args, **kw)
       return ok, self.combine_xforms(xparts)
 
    def expand_top_N(self, nexpand, resl, scores, indices):
-      idx, xparts = super().expand_top_N(nexpand, resl, scores, indices)
-      return idx, self.combine_xforms(xparts)
+      idx, _ = self.dummies[scores.dtype].expand_top_N(nexpand, resl, scores, indices)
+      ok, xforms = self.get_xforms(resl + 1, idx)
+      return idx[ok], xforms
 
 class SlideHier:
    def __init__(self, sampler, body1, body2):
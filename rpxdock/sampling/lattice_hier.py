@@ -11,17 +11,22 @@ class LatticeHier(CompoundHier):
          assert d[2] == 0
 
    def combine_xforms(self, xparts):
-      offset = xparts[:, 0, 2, 3]
+      '''xparts stacked (N, nparts, 4, 4), or a list of (N, 4, 4) which is modified in place
+      and then stacked, cheaper than writing into the strided stacked array'''
+      if isinstance(xparts, np.ndarray):
+         xparts = [xparts[:, i] for i in range(xparts.shape[1])]
+      offset = xparts[0][:, 2, 3]
       for i, d in enumerate(self.directions):
-         xparts[:, i + 1, 0, 3] = offset * d[0]
-         xparts[:, i + 1, 1, 3] = offset * d[1]
-      xparts[:, 0, 2, 3] = 0  #
-      return xparts
+         xparts[i + 1][:, 0, 3] = offset * d[0]
+         xparts[i + 1][:, 1, 3] = offset * d[1]
+      xparts[0][:, 2, 3] = 0  #
+      return np.stack(xparts, axis=1)
 
    def get_xforms(self, *args, **kw):
-      ok, xparts = super().get_xforms(*args, **kw)
+      ok, xparts = self.get_xform_parts(*args, **kw)
       return ok, self.combine_xforms(xparts)
 
    def expand_top_N(self, nexpand, resl, scores, indices):
-      idx, xparts = super().expand_top_N(nexpand, resl, scores, indices)
-      return idx, self.combine_xforms(xparts)
+      idx, _ = self.dummies[scores.dtype].expand_top_N(nexpand, resl, scores, indices)
+      ok, xforms = self.get_xforms(resl + 1, idx)
+      return idx[ok], xforms
@@ -5,7 +5,6 @@ import gzip
 
 import pandas as pd
 
-from cppimport import import_hook
 from rpxdock.sampling._orientations import read_karney_orientations
 
 if sys.version_info[0] < 3:
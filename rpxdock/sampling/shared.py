@@ -0,0 +1,64 @@
+import os, shutil, tempfile, numpy as np
+
+class SharedBaseSamples:
+   '''
+   iresl 0 indices and xforms of a hierarchical sampler, computed once and shared read-only
+
+   the arrays are saved as .npy files, in /dev/shm where there is one, and memory mapped on
+   first use. pickling sends only the file names, so every job in a process pool maps the
+   same pages instead of redoing sampler.get_xforms(0, ...) and the index splitting behind
+   it. pass as base_samples to hier_search. use as a context manager, or call close(), in the
+   creating process to remove the files
+   '''
+   def __init__(self, sampler, tmpdir=None):
+      self.size0, self.dim = int(sampler.size(0)), int(sampler.dim)
+      indices = np.arange(sampler.size(0), dtype='u8')
+      mask, xforms = sampler.get_xforms(0, indices)
+      if tmpdir is None and os.path.isdir('/dev/shm'): tmpdir = '/dev/shm'
+      self.path = tempfile.mkdtemp(prefix='rpxdock_base_samples_', dir=tmpdir)
+      np.save(os.path.join(self.path, 'indices.npy'), indices[mask])
+      np.save(os.path.join(self.path, 'xforms.npy'), xforms)
+      self.owner = os.getpid()
+      self._arrays = None
+
+   @property
+   def indices(self):
+      return self._load()[0]
+
+   @property
+   def xforms(self):
+      return self._load()[1]
+
+   def __len__(self):
+      return len(self.indices)
+
+   def check_sampler(self, sampler):
+      if (int(sampler.size(0)), int(sampler.dim)) != (self.size0, self.dim):
+         raise ValueError(f'base samples for size0 {self.size0} dim {self.dim} used with '
+                          f'sampler size0 {sampler.size(0)} dim {sampler.dim}')
+
+   def _load(self):
+      if self._arrays is None:
+         self._arrays = tuple(
+            np.load(os.path.join(self.path, f), mmap_mode='r')
+            for f in ('indices.npy', 'xforms.npy'))
+      return self._arrays
+
+   def __getstate__(self):
+      state = self.__dict__.copy()
+      state['_arrays'] = None
+      return state
+
+   def __repr__(self):
+      return f'SharedBaseSamples(size0={self.size0}, dim={self.dim}, path={self.path!r})'
+
+   def close(self):
+      self._arrays = None
+      if os.getpid() == self.owner:
+         shutil.rmtree(self.path, ignore_errors=True)
+
+   def __enter__(self):
+      return self
+
+   def __exit__(self, *args):
+      self.close()
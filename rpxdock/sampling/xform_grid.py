@@ -2,6 +2,36 @@ import numpy as np
 import rpxdock.homog as hm
 
 def grid_sym_axis(cart, ang, axis=[0, 0, 1], flip=None):
+   axis, xflip = _sym_axis_frames(cart, axis, flip)
+   grid = _grid_sym_axis(cart, ang, axis)
+   if flip:
+      grid = np.concatenate([grid, xflip @ grid])
+   return grid
+
+class GridSymAxis:
+   '''
+   grid_sym_axis samples generated lazily, about chunk_size at a time
+
+   iterating yields chunks whose concatenation is grid_sym_axis(cart, ang, axis, flip), so a
+   streaming grid_search never holds the whole grid. picklable, unlike a generator
+   '''
+   def __init__(self, cart, ang, axis=[0, 0, 1], flip=None, chunk_size=100_000):
+      self.cart, self.ang = np.asarray(cart), np.asarray(ang)
+      self.axis, self.xflip = _sym_axis_frames(self.cart, axis, flip)
+      self.flip = flip
+      self.chunk_size = chunk_size
+
+   def __len__(self):
+      return len(self.cart) * len(self.ang) * (2 if self.flip else 1)
+
+   def __iter__(self):
+      ncart = max(1, self.chunk_size // max(1, len(self.ang)))
+      for xflip in [None, self.xflip] if self.flip else [None]:
+         for lb in range(0, len(self.cart), ncart):
+            grid = _grid_sym_axis(self.cart[lb:lb + ncart], self.ang, self.axis)
+            yield grid if xflip is None else xflip @ grid
+
+def _sym_axis_frames(cart, axis, flip):
    if not isinstance(axis, (np.ndarray, list, tuple)):
       raise TypeError('axis must be ndarray, list tuple')
    if len(axis) not in (3, 4):
@@ -13,11 +43,13 @@ def grid_sym_axis(cart, ang, axis=[0, 0, 1], flip=None):
    if flip and hm.hdot(axis, flip) > 0.001:
       raise ValueError('flip axis must be perpendicular to main axis')
    axis = np.array(axis[:3] / np.linalg.norm(axis[:3]))
-   c = hm.htrans(cart[:, None] * axis[:3])
-   r = hm.hrot(axis, ang)
-   grid = (r[None] @ c[:, None]).reshape(-1, 4, 4)
+   xflip = None
    if flip:
       cen = np.mean(cart)
       xflip = hm.hrot(flip, 180.0, axis * cen)
-      grid = np.concatenate([grid, xflip @ grid])
-   return grid
+   return axis, xflip
+
+def _grid_sym_axis(cart, ang, axis):
+   c = hm.htrans(cart[:, None] * axis[:3])
+   r = hm.hrot(axis, ang)
+   return (r[None] @ c[:, None]).reshape(-1, 4, 4)
@@ -20,6 +20,7 @@ setup_pybind11(cfg)
 #include <pybind11/eigen.h>
 #include <pybind11/numpy.h>
 #include <pybind11/pybind11.h>
+#include <pybind11/stl.h>
 
 #include <algorithm>
 #include <iostream>
@@ -431,6 +432,61 @@ Mx<I> unpack_zorder(int dim, I resl, Vx<I> idx) {
   return out;
 }
 
+/// split CompoundHier indices into one index per part: the cell index is a
+/// mixed radix number over the part ncells, and the hier index interleaves all
+/// dims so is unpacked then repacked per part, as in pack/unpack_zorder
+template <typename I>
+Mx<I> split_compound_indices(I resl, Vx<I> idx, Vx<I> ncells, Vx<I> dims) {
+  int nparts = dims.size(), dim = dims.sum();
+  Mx<I> out(nparts, idx.size());
+  {
+    py::gil_scoped_release release;
+    I mask = (((I)1) << (dim * resl)) - 1;
+    std::vector<I> coord(dim);
+    for (size_t i = 0; i < idx.size(); ++i) {
+      I cell = idx[i] >> (dim * resl), hier_index = idx[i] & mask;
+      for (int j = 0; j < dim; ++j)
+        coord[j] = util::undilate(dim, hier_index >> j);
+      for (int p = 0, jbeg = 0; p < nparts; jbeg += dims[p++]) {
+        I index = 0;
+        for (int j = 0; j < dims[p]; ++j)
+          index |= util::dilate(dims[p], coord[jbeg + j]) << j;
+        out(p, i) = (cell % ncells[p]) << (dims[p] * resl) | index;
+        cell /= ncells[p];
+      }
+    }
+  }
+  return out;
+}
+
+/// part xforms, each (N, 4, 4), to products xparts[0] @ ... @ xparts[-1]. no
+/// forcecast, so only safe casts: mixed f4 and f8 parts give f8, like numpy
+template <typename F>
+py::array_t<F> product_xforms(
+    std::vector<py::array_t<F, py::array::c_style>> xparts) {
+  if (xparts.empty()) throw std::invalid_argument("product_xforms: no parts");
+  size_t n = xparts[0].shape(0);
+  std::vector<F const*> in;
+  for (auto& x : xparts) {
+    if (x.ndim() != 3 || x.shape(0) != n || x.shape(1) != 4 || x.shape(2) != 4)
+      throw std::invalid_argument("product_xforms: parts must be (N, 4, 4)");
+    in.push_back(x.data());
+  }
+  py::array_t<F> out(std::vector<size_t>{n, 4, 4});
+  F* outptr = out.mutable_data();
+  using M4 = Matrix<F, 4, 4, RowMajor>;
+  {
+    py::gil_scoped_release release;
+    for (size_t i = 0; i < n; ++i) {
+      M4 x = Map<M4 const>(in.back() + 16 * i);
+      for (int p = (int)in.size() - 2; p >= 0; --p)
+        x = Map<M4 const>(in[p] + 16 * i) * x;
+      Map<M4>(outptr + 16 * i) = x;
+    }
+  }
+  return out;
+}
+
 template <typename F, typename I>
 struct DummyHier {
   I dim_, ncell_;
@@ -497,6 +553,10 @@ PYBIND11_MODULE(xform_hierarchy, m) {
   m.def("unpack_zorder", &unpack_zorder<uint64_t>, "dim"_a, "resl"_a,
         "indices"_a);
   m.def("pack_zorder", &pack_zorder<uint64_t>, "resl"_a, "indices"_a);
+  m.def("split_compound_indices", &split_compound_indices<uint64_t>, "resl"_a,
+        "indices"_a, "ncells"_a, "dims"_a);
+  m.def("product_xforms", &product_xforms<float>, "xparts"_a);
+  m.def("product_xforms", &product_xforms<double>, "xparts"_a);
 
   bind_OriCart1Hier<float, uint64_t>(m, "OriCart1Hier_f4");
   m.def("create_OriCart1Hier_4f_nside", &OriCart1Hier_nside<float, uint64_t>,
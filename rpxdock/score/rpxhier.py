@@ -1,9 +1,16 @@
-import os, logging, glob, numpy as np, rpxdock as rp
+import os, logging, glob, tempfile, shutil, atexit, threading, numpy as np, rpxdock as rp
+from collections import abc
 from rpxdock.xbin import xbin_util as xu
 from rpxdock.score import score_functions as sfx
 
 log = logging.getLogger(__name__)
 
+# with reuse_contacts, docks share a bvh traversal while no contact moves more than this fraction
+# of max_pair_dist. the shared traversal searches out to 1.4x max_pair_dist, about 2.7x the
+# volume, which bounds the extra pairs filtered per dock. only speed depends on it, every dock
+# still gets exactly its own contacts
+REUSE_CONTACTS_MAXWIDE = 0.4
+
 """
 RpxHier holds score information at each level of searching / scoring 
 Grid search just uses the last/finest scorefunction 
@@ -26,33 +33,142 @@ class RpxHier:
             assert all("_SSdep_" in f for f in files)
             self.use_ss = True
          assert "base" in files[0]
-         data = rp.util.load_threads(files, len(files))
-         self.base = data[0]
-         self.hier = data[1:]
-         self.resl = list(h.attr.cart_extent for h in self.hier)
       elif (isinstance(files[0], rp.ResPairScore)
             and all(isinstance(f, rp.Xmap) for f in files[1:])):
-         self.base = files[0]
-         self.hier = list(files[1:])
-         self.use_ss = self.base.attr.opts.use_ss_key
-         assert all(self.use_ss == h.attr.cli_args.use_ss_key for h in self.hier)
+         self.use_ss = files[0].attr.opts.use_ss_key
+         assert all(self.use_ss == h.attr.cli_args.use_ss_key for h in files[1:])
       else:
          raise ValueError('RpxHier expects filenames or ResPairScore+[Xmap*]')
-      # append extra copies of highest resl score to use for higher res search steps
-      self.actual_nresl = len(self.hier)
-      for i in range(10):
-         self.hier.append(self.hier[-1])
-      self.cart_extent = [h.attr.cart_extent for h in self.hier]
-      self.ori_extent = [h.attr.ori_extent for h in self.hier]
-      self.max_pair_dist = [max_pair_dist + h.attr.cart_extent for h in self.hier]
-      self.map_pairs_multipos = xu.ssmap_pairs_multipos if self.use_ss else xu.map_pairs_multipos
-      self.map_pairs = xu.ssmap_of_selected_pairs if self.use_ss else xu.map_of_selected_pairs
+      # tables are read from file when first used, see preload
+      self.skip_base = bool(kw.skip_hscore_base)
+      self._base = LazyTables(files[:1])
+      # extra copies of highest resl score to use for higher res search steps
+      self.actual_nresl = len(files) - 1
+      self.hier = LazyTables(list(files[1:]) + [files[-1]] * 10)
+      self._max_pair_dist = max_pair_dist
+      self._bind_map_functions()
+      # fused pair collection / lookup / marginal max, see scorepos. opt in with --fused_scorepos
+      self.fused_scorepos = bool(kw.fused_scorepos)
+      # share bvh traversals between neighboring docks, see _marginal_max_unfused
+      self.reuse_contacts = bool(kw.reuse_contacts)
+      if self.fused_scorepos and self.reuse_contacts:
+         log.info('reuse_contacts scores with the unfused path, fused_scorepos is ignored')
+      self.nthread = kw.nthread or 1
       self.score_only_sspair = kw.score_only_sspair
       self.function = kw.function
 
+   @property
+   def base(self):
+      if self.skip_base:
+         raise ValueError('RpxHier base table was skipped, see --skip_hscore_base')
+      return self._base[0]
+
+   @base.setter
+   def base(self, base):
+      self._base[0] = base
+
+   @property
+   def cart_extent(self):
+      return PerLevel(self.hier, lambda h: h.attr.cart_extent)
+
+   @property
+   def ori_extent(self):
+      return PerLevel(self.hier, lambda h: h.attr.ori_extent)
+
+   @property
+   def max_pair_dist(self):
+      return PerLevel(self.hier, lambda h: self._max_pair_dist + h.attr.cart_extent)
+
+   resl = cart_extent
+
+   @property
+   def xhresl(self):
+      '''
+      cart and ori resl of the top level search the tables were made for
+
+      stored on the base, but recomputed from the options the hier tables were made with (see
+      rpxgen.make_and_dump_hier_score_tables) where possible, so samplers don't load the base
+      '''
+      if self.skip_base or not self._base.is_loaded(0):
+         cli_args = self.hier[0].attr.cli_args
+         if cli_args is not None:
+            return rp.sampling.xform_hier_guess_sampling_covrads(**cli_args)[1]
+      return self.base.attr.xhresl
+
+   def preload(self, nresl=None, base=False):
+      '''
+      load the first nresl (default all) hier tables and optionally the base now, in parallel
+
+      tables are otherwise loaded on first use. load them before forking worker processes so
+      the workers share the parent's copy instead of each loading their own
+      '''
+      nresl = self.actual_nresl if nresl is None else min(nresl, len(self.hier))
+      self.hier.load(range(nresl))
+      if base and not self.skip_base: self._base.load()
+      return self
+
+   def memory_report(self):
+      '''files loaded so far, files not loaded and their total size on disk'''
+      notloaded = self._base.unloaded_files() + self.hier.unloaded_files()
+      return rp.Bunch(
+         loaded=self._base.loaded_files() + self.hier.loaded_files(),
+         not_loaded=notloaded,
+         bytes_not_loaded=sum(_file_size(f) for f in notloaded),
+      )
+
+   def _bind_map_functions(self):
+      self.map_pairs_multipos = xu.ssmap_pairs_multipos if self.use_ss else xu.map_pairs_multipos
+      self.map_pairs = xu.ssmap_of_selected_pairs if self.use_ss else xu.map_of_selected_pairs
+      self.map_marginal_max = (xu.ssmap_marginal_max_range_vec
+                               if self.use_ss else xu.map_marginal_max_range_vec)
+
+   def __getstate__(self):
+      # native functions don't pickle, they are rebound from use_ss
+      state = dict(vars(self))
+      for k in ('map_pairs_multipos', 'map_pairs', 'map_marginal_max'):
+         del state[k]
+      return state
+
+   def __setstate__(self, state):
+      vars(self).update(state)
+      self._bind_map_functions()
+
    def __len__(self):
       return len(self.hier)
 
+   def share(self, dirname=None):
+      '''
+      move score tables into read-only files mmap'd by every process that uses them
+
+      afterwards pickling this RpxHier, as ProcessPoolExecutor does for every job, stores only
+      file names. each worker maps the files the first time it sees them and all processes
+      share one copy of the tables in the page cache. tables loaded from .frozen files are used
+      in place. tables not yet loaded (see preload) stay file names and are loaded by each
+      process that uses them. dirname defaults to a new dir in /dev/shm (or the temp dir)
+      removed at exit
+      '''
+      if dirname is None:
+         shm = '/dev/shm' if os.path.isdir('/dev/shm') else None
+         dirname = tempfile.mkdtemp(prefix='rpxdock_hscore_', dir=shm)
+         _remove_at_exit(dirname)
+      if self._base.is_loaded(0) and not getattr(self.base, 'frozen_file', None):
+         fname = os.path.join(dirname, 'base')
+         self.base.dump_frozen(fname)
+         self.base = rp.ResPairScore.load_frozen(fname)
+      shared = dict()
+      for i in range(len(self.hier)):
+         if not self.hier.is_loaded(i): continue
+         h = self.hier[i]
+         if id(h) not in shared:
+            if getattr(h, 'frozen_file', None):
+               shared[id(h)] = h
+            else:
+               fname = os.path.join(dirname, f'hier{i}.frozen')
+               h.dump_frozen(fname)
+               shared[id(h)] = rp.Xmap.load_frozen(fname)
+         self.hier[i] = shared[id(h)]
+      return self
+
    def hier_mindis(self, iresl):
       return [1.5, 2.0, 2.75, 3.25, 3.5][iresl]
 
@@ -120,6 +236,7 @@ class RpxHier:
       iresl=-1,
       bounds=(),
       residue_summary=np.mean,  # TODO hook up to options to select
+      profiler=None,
       **kw,
    ):
       '''
@@ -131,11 +248,15 @@ class RpxHier:
       :param pos2:
       :param iresl:
       :param bounds:
+      :param profiler: rp.Profiler to record time in each scoring stage
       :param kw:
       :return:
       '''
       kw = rp.Bunch(kw)
+      prof = profiler or rp.util.null_profiler
       pos1, pos2 = pos1.reshape(-1, 4, 4), pos2.reshape(-1, 4, 4)
+      if len(pos1) == 0 or len(pos2) == 0:
+         return np.zeros(0)  # grid chunks can filter down to nothing
       # if not bounds:
       # bounds = [-2e9], [2e9], nsym[0], [-2e9], [2e9], nsym[1]
       # if len(bounds) is 2:
@@ -151,39 +272,83 @@ class RpxHier:
       # print('nres asym', body1.asym_body.nres, body2.asym_body.nres)
       # print(bounds[2], bounds[5])
 
+      #TODO: Figure out if this should be handled in the score functions below.
+      if kw.wts.rpx == 0 or not self.fused_scorepos or self.reuse_contacts:
+         lbub, lbub1, lbub2, ressc1, ressc2 = self._marginal_max_unfused(
+            body1, body2, pos1, pos2, iresl, bounds, profiler=prof, **kw)
+         if kw.wts.rpx == 0:
+            return kw.wts.ncontact * (lbub[:, 1] - lbub[:, 0])  # option to score based on ncontacts only
+      else:
+         # one native pass over all docks: bvh pairs are looked up and reduced to per-residue
+         # max scores as they are found, so the full pair list is never materialized
+         xmap = self.hier[iresl]
+         ssstub = body1.ssid, body2.ssid, body1.stub, body2.stub
+         ssstub = ssstub if self.use_ss else ssstub[2:]
+         with prof.stage('map_marginal_max', max(len(pos1), len(pos2))):
+            lbub, lbub1, lbub2, ressc1, ressc2 = self.map_marginal_max(
+               body1.bvh_cen,
+               body2.bvh_cen,
+               pos1,
+               pos2,
+               self.max_pair_dist[iresl],
+               xmap.xbin,
+               xmap.phmap,
+               *ssstub,
+               **_bounds_kw(bounds),
+               nthread=kw.nthread or self.nthread,
+            )
+      if bounds: assert len(bounds[0]) in (1, len(lbub))
+
+      score_functions = {"fun2" : sfx.score_fun2, "lin" : sfx.lin, "exp" : sfx.exp, "mean" : sfx.mean, "median" : sfx.median, "stnd" : sfx.stnd, "sasa_priority" : sfx.sasa_priority}
+      score_fx = score_functions.get(self.function)
+
+      with prof.stage('score_function', len(lbub)):
+         if score_fx:
+            scores = score_fx(pos1, pos2, lbub, lbub1, lbub2, ressc1, ressc2, wts=kw.wts,
+                              iresl=iresl)
+         else:
+            logging.info(f"Failed to find score function {self.function}, falling back to 'stnd'")
+            scores = score_functions["stnd"](pos1, pos2, lbub, lbub1, lbub2, ressc1, ressc2,
+                                             wts=kw.wts)
+      return scores
+
+   def _marginal_max_unfused(self, body1, body2, pos1, pos2, iresl, bounds, profiler, **kw):
+      kw = rp.Bunch(kw)
+      ndock = max(len(pos1), len(pos2))
       # calling bvh c++ function that will look at pair of (arrays of) positions, scores pairs that are in contact (ID from maxpair distance)
       # lbub: len pos1
-      pairs, lbub = rp.bvh.bvh_collect_pairs_range_vec(
-         body1.bvh_cen,
-         body2.bvh_cen,
-         pos1,
-         pos2,
-         self.max_pair_dist[iresl],
-         *bounds,
-      )
+      if self.reuse_contacts:
+         # hier_search children arrive grouped by parent. runs of docks within maxwide of each
+         # other get one traversal at a widened radius, which each dock then filters exactly
+         with profiler.stage('bvh_collect_pairs', ndock):
+            pairs, lbub = rp.bvh.bvh_collect_pairs_grouped_vec(
+               body1.bvh_cen,
+               body2.bvh_cen,
+               pos1,
+               pos2,
+               self.max_pair_dist[iresl],
+               REUSE_CONTACTS_MAXWIDE * self.max_pair_dist[iresl],
+               *bounds,
+               nthread=kw.nthread or self.nthread,
+            )
+      else:
+         with profiler.stage('bvh_collect_pairs', ndock):
+            pairs, lbub = rp.bvh.bvh_collect_pairs_range_vec(
+               body1.bvh_cen,
+               body2.bvh_cen,
+               pos1,
+               pos2,
+               self.max_pair_dist[iresl],
+               *bounds,
+               nthread=kw.nthread or self.nthread,
+            )
 
       # TODO some output or analysis of distances?
 
       # pairs, lbub = body1.filter_pairs(pairs, self.score_only_sspair, other=body2, lbub=lbub)
 
-      if bounds: assert len(bounds[0]) in (1, len(lbub))
-      # if len(bounds[0]) > 1:
-      #    print(len(lbub), len(bounds[0]))
-
-      #    # print(lbub)
-      #    for i, (lb, ub) in enumerate(lbub):
-      #       asym_res1 = pairs[lb:ub, 0] % body1.asym_body.nres
-      #       asym_res2 = pairs[lb:ub, 1] % body2.asym_body.nres
-      #       print(i, f'{np.min(asym_res1)}-{np.max(asym_res1)}', bounds[0][i], bounds[1][i])
-      #       print(i, f'{np.min(asym_res2)}-{np.max(asym_res2)}', bounds[3][i], bounds[4][i])
-      #       assert np.all(asym_res1 >= bounds[0][i])
-      #       assert np.all(asym_res1 <= bounds[1][i])
-      #       assert np.all(asym_res2 >= bounds[3][i])
-      #       assert np.all(asym_res2 <= bounds[4][i])
-
-      #TODO: Figure out if this should be handled in the score functions below.
       if kw.wts.rpx == 0:
-         return kw.wts.ncontact * (lbub[:, 1] - lbub[:, 0]) # option to score based on ncontacts only
+         return lbub, None, None, None, None
 
       xbin = self.hier[iresl].xbin
       phmap = self.hier[iresl].phmap
@@ -191,32 +356,26 @@ class RpxHier:
       ssstub = ssstub if self.use_ss else ssstub[2:]
 
       # hashtable of scores for each pair of res in contact in each dock
-      pscore = self.map_pairs_multipos(
-         xbin,
-         phmap,
-         pairs,
-         *ssstub,
-         # body1.ssid, body2.ssid, body1.stub, body2.stub,
-         lbub,
-         pos1,
-         pos2,
-      )
+      with profiler.stage('hash_lookup', len(pairs)):
+         pscore = self.map_pairs_multipos(
+            xbin,
+            phmap,
+            pairs,
+            *ssstub,
+            # body1.ssid, body2.ssid, body1.stub, body2.stub,
+            lbub,
+            pos1,
+            pos2,
+         )
 
       # summarize pscores for a dock
-      lbub1, lbub2, idx1, idx2, ressc1, ressc2 = rp.motif.marginal_max_score(
-         lbub,
-         pairs,
-         pscore,
-      )
-      score_functions = {"fun2" : sfx.score_fun2, "lin" : sfx.lin, "exp" : sfx.exp, "mean" : sfx.mean, "median" : sfx.median, "stnd" : sfx.stnd, "sasa_priority" : sfx.sasa_priority}
-      score_fx = score_functions.get(self.function)
-
-      if score_fx:
-         scores = score_fx(pos1, pos2, lbub, lbub1, lbub2, ressc1, ressc2, wts=kw.wts, iresl=iresl)
-      else:
-         logging.info(f"Failed to find score function {self.function}, falling back to 'stnd'")
-         scores = score_functions["stnd"](pos1, pos2, lbub, lbub1, lbub2, ressc1, ressc2, wts=kw.wts)
-      return scores
+      with profiler.stage('marginal_max_score', len(pairs)):
+         lbub1, lbub2, idx1, idx2, ressc1, ressc2 = rp.motif.marginal_max_score(
+            lbub,
+            pairs,
+            pscore,
+         )
+      return lbub, lbub1, lbub2, ressc1, ressc2
 
    def iresls(self):
       return [i for i in range(len(self.hier))]
@@ -225,18 +384,139 @@ class RpxHier:
       return np.stack([h[x] for h in self.hier])
 
    def score_by_resl(self, resl, x_or_k):
-      if resl < 0 or resl > self.resl[0] * 2:
+      '''
+      score with the table whose cart_extent is closest to resl
+
+      extents are base_cart_resl plus a sampling resl that halves each level (see
+      xform_hier_guess_sampling_covrads), so they follow from level 0 and only the table used
+      is loaded. tables without the options they were made with fall back to loading all
+      '''
+      resl0 = self.resl[0]
+      if resl < 0 or resl > resl0 * 2:
          raise ValueError("resl out of bounds")
-      iresl = np.argmin(np.abs(resl - self.resl))
+      base_cart_resl = getattr(self.hier[0].attr.cli_args, 'base_cart_resl', None)
+      if base_cart_resl is None:
+         extents = np.array(self.resl[:self.actual_nresl])
+      else:
+         halving = 0.5**np.arange(self.actual_nresl)
+         extents = base_cart_resl + (resl0 - base_cart_resl) * halving
+      iresl = np.argmin(np.abs(resl - extents))
       return self.hier[iresl][x_or_k]
 
    def score_base(self, x_or_k):
       return self.base[x_or_k]
 
+class LazyTables:
+   '''
+   list of score tables that reads each from its file on first access
+
+   items are tables or file names, loaded with loadfunc (default load_hscore_file). all items
+   naming the same file share one table. pickles without loading anything
+   '''
+   def __init__(self, items, loadfunc=None):
+      self._items = list(items)
+      self._sources = [x if isinstance(x, str) else None for x in self._items]
+      self.loadfunc = loadfunc or load_hscore_file
+      self._loaded = list()
+      self._lock = threading.Lock()
+
+   def __getitem__(self, i):
+      if isinstance(i, slice):
+         return [self[j] for j in range(*i.indices(len(self)))]
+      if not self.is_loaded(i): self.load([i], nthread=1)
+      return self._items[i]
+
+   def __setitem__(self, i, table):
+      self._items[i] = table
+
+   def __len__(self):
+      return len(self._items)
+
+   def __iter__(self):
+      return (self[i] for i in range(len(self)))
+
+   def source(self, i):
+      '''file item i was (or will be) loaded from, None if it was given as a table'''
+      return self._sources[i]
+
+   def is_loaded(self, i):
+      return not isinstance(self._items[i], str)
+
+   def loaded_files(self):
+      return list(self._loaded)
+
+   def unloaded_files(self):
+      return list(dict.fromkeys(x for x in self._items if isinstance(x, str)))
+
+   def load(self, which=None, nthread=0):
+      '''load items which (default all), one thread per file unless nthread given'''
+      which = range(len(self)) if which is None else which
+      with self._lock:
+         fnames = list(dict.fromkeys(self._items[i] for i in which if not self.is_loaded(i)))
+         if not fnames: return
+         tables = rp.util.load_threads(fnames, nthread or len(fnames), loadfunc=self.loadfunc)
+         tables = dict(zip(fnames, tables))
+         for i, x in enumerate(self._items):
+            if isinstance(x, str) and x in tables:
+               self._items[i] = tables[x]
+         self._loaded.extend(fnames)
+         log.debug(f'loaded hscore tables {fnames}')
+
+   def __getstate__(self):
+      state = dict(vars(self))
+      del state['_lock']
+      return state
+
+   def __setstate__(self, state):
+      vars(self).update(state)
+      self._lock = threading.Lock()
+
+class PerLevel(abc.Sequence):
+   '''read-only sequence of fn(table) for each table in a LazyTables, loads only those used'''
+   def __init__(self, tables, fn):
+      self.tables, self.fn = tables, fn
+
+   def __getitem__(self, i):
+      if isinstance(i, slice):
+         return [self[j] for j in range(*i.indices(len(self)))]
+      return self.fn(self.tables[i])
+
+   def __len__(self):
+      return len(self.tables)
+
+   def __eq__(self, other):
+      return list(self) == list(other)
+
+   def __repr__(self):
+      return f'PerLevel({list(self)})'
+
+def _file_size(fname):
+   if not os.path.isdir(fname): return os.path.getsize(fname)
+   return sum(os.path.getsize(os.path.join(d, f)) for d, _, fs in os.walk(fname) for f in fs)
+
+def _remove_at_exit(dirname):
+   pid = os.getpid()
+
+   def remove():
+      if os.getpid() == pid: shutil.rmtree(dirname, ignore_errors=True)
+
+   atexit.register(remove)
+
+def _bounds_kw(bounds):
+   return dict(zip(['lb1', 'ub1', 'nasym1', 'lb2', 'ub2', 'nasym2'], bounds))
+
+def load_hscore_file(fname):
+   """load a pickled table, or mmap a frozen one (see rpxdock/app/util/freeze_hscore.py)"""
+   if fname.endswith('.frozen'):
+      return rp.Xmap.load_frozen(fname)
+   return rp.util.load(fname)
+
 def _check_hscore_files_aliases(alias, hscore_data_dir):
    try:
       pattern = os.path.join(hscore_data_dir, alias, '*.pickle')
       g = sorted(glob.glob(pattern))
+      # use frozen copies of tables where they have been made
+      g = [f[:-7] + '.frozen' if os.path.exists(f[:-7] + '.frozen') else f for f in g]
       if len(g) > 0:
          return g
    except:
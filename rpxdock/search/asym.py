@@ -5,7 +5,7 @@ log = logging.getLogger(__name__)
 
 def asym_get_sample_hierarchy(body, hscore, extent=100):
    "set up XformHier with appropriate bounds and resolution"
-   cart_xhresl, ori_xhresl = hscore.base.attr.xhresl
+   cart_xhresl, ori_xhresl = hscore.xhresl
    rg = body.rg()
    cart_samp_resl = 0.707 * cart_xhresl
    ori_samp_resl = cart_samp_resl / rg * 180 / np.pi
@@ -44,7 +44,8 @@ def make_asym(bodies, hscore, sampler, search=hier_search, **kw):
    ncontact, _ = evaluator(xforms, kw.nresl - 1, wnct)
    return rp.Result(
       body_=None if kw.dont_store_body_in_results else bodies,
-      attrs=dict(arg=kw, stats=stats, ttotal=t.total),
+      attrs=dict(arg=kw, stats=stats, ttotal=t.total,
+                 **evaluator.profiler.result_attrs(kw.profile_trace)),
       scores=(["model"], scores[ibest].astype("f4")),
       xforms=(["model", "hrow", "hcol"], xforms),
       rpx=(["model"], rpx.astype("f4")),
@@ -58,26 +59,32 @@ class AsymEvaluator:
       self.kw = rp.Bunch(kw)
       self.bodies = bodies
       self.hscore = hscore
+      self.profiler = rp.Profiler('AsymEvaluator', enabled=bool(self.kw.profile))
 
    def __call__(self, xforms, iresl=-1, wts={}, **kw):
       kw = self.kw.sub(wts=wts)
       xeye = np.eye(4, dtype="f4")
       body1, body2 = self.bodies
+      prof = self.profiler
       xforms = xforms.reshape(-1, 4, 4)
 
       # check clash, or get non-clash range
       if kw.max_trim > 0:
-         trim = body2.intersect_range(body1, xeye, xforms, **kw)
-         trim, trimok = rp.search.trim_ok(trim, body2.nres, **kw)
-         ok = trimok
+         with prof.stage('intersect_range', len(xforms)):
+            trim = body2.intersect_range(body1, xeye, xforms, **kw)
+            trim, trimok = rp.search.trim_ok(trim, body2.nres, **kw)
+            ok = trimok
       else:
-         ok = body1.clash_ok(body2, xforms, xeye, **kw)
+         with prof.stage('clash_ok', len(xforms)):
+            ok = body1.clash_ok(body2, xforms, xeye, **kw)
          trim = [0], [body2.nres - 1]
 
       # score everything that didn't clash
       scores = np.zeros(len(xforms))
       bounds = (*trim, -1, *trim, -1)
-      scores[ok] = self.hscore.scorepos(body1, body2, xforms[ok], xeye, iresl, bounds, **kw)
+      with prof.stage('scorepos', np.sum(ok)):
+         scores[ok] = self.hscore.scorepos(body1, body2, xforms[ok], xeye, iresl, bounds,
+                                           profiler=prof, **kw)
       # scores[ok] = self.hscore.scorepos(body1, body2, xeye, xforms[ok], iresl, bounds, **kw)
 
       # record ranges used
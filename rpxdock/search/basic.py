@@ -4,6 +4,8 @@ import numpy as np
 from rpxdock import Bunch
 
 def grid_search(sampler, evaluator, **kw):
+   if not isinstance(sampler, np.ndarray) and hasattr(sampler, '__iter__'):
+      return stream_grid_search(sampler, evaluator, **kw)
    if (not isinstance(sampler, np.ndarray) or sampler.ndim not in (3, 4) or sampler.shape[-2:] !=
        (4, 4)):
       raise ValueError('sampler for grid_search should be array of samples')
@@ -12,6 +14,62 @@ def grid_search(sampler, evaluator, **kw):
    stats = Bunch(ntot=len(scores), neval=[(t, len(scores))])
    return xforms, scores, extra, stats
 
+def stream_grid_search(sampler, evaluator, grid_topk=0, grid_min_score=None, **kw):
+   '''
+   grid_search over chunks of samples, keeping only the best as it goes
+
+   sampler is an iterable of sample arrays, like rp.sampling.GridSymAxis. after each chunk the
+   grid_topk best scoring samples seen so far are kept, plus any scoring at least
+   grid_min_score, so memory is bounded by grid_topk (and the number above grid_min_score)
+   rather than by grid size. survivors are returned in sampler order, so the result is the
+   corresponding subset of a full grid_search
+   '''
+   if not grid_topk and grid_min_score is None:
+      raise ValueError('streaming grid_search needs grid_topk or grid_min_score')
+   grid_topk = int(grid_topk or 0)
+   best, neval, ntot = None, list(), 0
+   for chunk in sampler:
+      scores, extra, t = evaluate_positions(evaluator, chunk, **kw)
+      neval.append((t, len(scores)))
+      chunk = Bunch(index=np.arange(ntot, ntot + len(scores)), xforms=chunk, scores=scores,
+                    extra=extra)
+      ntot += len(scores)
+      best = chunk if best is None else _concat_chunks(best, chunk)
+      best = _select_chunk(best, _keep_best(best.scores, grid_topk, grid_min_score))
+   if best is None: raise ValueError('grid_search sampler has no samples')
+   stats = Bunch(ntot=ntot, neval=neval)
+   return best.xforms, best.scores, best.extra, stats
+
+def _keep_best(scores, topk, min_score=None):
+   keep = np.zeros(len(scores), dtype=bool)
+   if topk >= len(scores): keep[:] = True
+   elif topk > 0: keep[np.argpartition(-scores, topk - 1)[:topk]] = True
+   if min_score is not None: keep |= scores >= min_score
+   return np.nonzero(keep)[0]
+
+def _select_chunk(chunk, idx):
+   extra = dict()
+   for k, v in chunk.extra.items():
+      if isinstance(v, np.ndarray) and len(v) == len(chunk.scores):
+         v = v[idx]
+      elif isinstance(v, tuple) and isinstance(v[1], np.ndarray):
+         v = v[0], v[1][idx]
+      extra[k] = v
+   return Bunch(index=chunk.index[idx], xforms=chunk.xforms[idx], scores=chunk.scores[idx],
+                extra=type(chunk.extra)(extra))
+
+def _concat_chunks(a, b):
+   extra = dict()
+   for k, v in a.extra.items():
+      if isinstance(v, np.ndarray):
+         v = np.concatenate([v, b.extra[k]])
+      elif isinstance(v, tuple) and isinstance(v[1], np.ndarray):
+         v = v[0], np.concatenate([v[1], b.extra[k][1]])
+      extra[k] = v
+   return Bunch(index=np.concatenate([a.index, b.index]),
+                xforms=np.concatenate([a.xforms, b.xforms]),
+                scores=np.concatenate([a.scores, b.scores]), extra=type(a.extra)(extra))
+
 def evaluate_positions(evaluator, xforms, executor=None, **kw):
    t = perf_counter()
    if executor:
@@ -14,7 +14,7 @@ def make_cyclic_hier_sampler(monomer, hscore, **kw):
    ori_resl: orientation resolution for sampling
    returns "arrays of pos" to check for a given search resolution where pos are represented by matrices
    '''
-   cart_resl, ori_resl = hscore.base.attr.xhresl
+   cart_resl, ori_resl = hscore.xhresl
    ncart = int(np.ceil(2 * monomer.radius_max() / cart_resl))
    return rp.sampling.OriCart1Hier_f4([0.0], [ncart * cart_resl], [ncart], ori_resl)
 
@@ -75,7 +75,8 @@ def make_cyclic(monomer, sym, hscore, search=None, sampler=None, **kw):
    ncontact, _ = evaluator(xforms, kw.nresl - 1, wnct)
    return rp.Result(
       body_=None if kw.dont_store_body_in_results else [monomer],
-      attrs=dict(arg=kw, stats=stats, ttotal=t.total, tdump=tdump, sym=sym),
+      attrs=dict(arg=kw, stats=stats, ttotal=t.total, tdump=tdump, sym=sym,
+                 **evaluator.profiler.result_attrs(kw.profile_trace)),
       scores=(["model"], scores[ibest].astype("f4")),
       xforms=(["model", "hrow", "hcol"], xforms),
       rpx=(["model"], rpx.astype("f4")),
@@ -97,25 +98,29 @@ class CyclicEvaluator:
       self.body = body
       self.hscore = hscore
       self.symrot = hm.hrot([0, 0, 1], 360 / int(sym[1:]), degrees=True)
+      self.profiler = rp.Profiler('CyclicEvaluator', enabled=bool(self.kw.profile))
 
    # __call__ gets called if class if called like a fcn
    def __call__(self, xforms, iresl=-1, wts={}, **kw):
       kw = self.kw.sub(wts=wts)
       xeye = np.eye(4, dtype="f4")
-      body, sfxn = self.body, self.hscore.scorepos
+      body, sfxn, prof = self.body, self.hscore.scorepos, self.profiler
       xforms = xforms.reshape(-1, 4, 4)  # body.pos
       xsym = self.symrot @ xforms  # symmetrized version of xforms
 
       # check for "flatness"
-      ok = np.abs((xforms @ body.pcavecs[0])[:, 2]) <= self.kw.max_longaxis_dot_z
+      with prof.stage('flatness', len(xforms)):
+         ok = np.abs((xforms @ body.pcavecs[0])[:, 2]) <= self.kw.max_longaxis_dot_z
 
       # check clash, or get non-clash range
       if kw.max_trim > 0:
-         trim = body.intersect_range(body, xforms[ok], xsym[ok], **kw)
-         trim, trimok = rp.search.trim_ok(trim, body.nres, **kw)
-         ok[ok] &= trimok
+         with prof.stage('intersect_range', np.sum(ok)):
+            trim = body.intersect_range(body, xforms[ok], xsym[ok], **kw)
+            trim, trimok = rp.search.trim_ok(trim, body.nres, **kw)
+            ok[ok] &= trimok
       else:
-         ok[ok] &= body.clash_ok(body, xforms[ok], xsym[ok], **kw)
+         with prof.stage('clash_ok', np.sum(ok)):
+            ok[ok] &= body.clash_ok(body, xforms[ok], xsym[ok], **kw)
          trim = [0], [body.nres - 1]
 
       # score everything that didn't clash
@@ -130,7 +135,8 @@ class CyclicEvaluator:
          sampling at highest resl probably 0.6A due to ori + cart
          returns score # for each "dock"
       '''
-      scores[ok] = sfxn(body, body, xforms[ok], xsym[ok], iresl, bounds, **kw)
+      with prof.stage('scorepos', np.sum(ok)):
+         scores[ok] = sfxn(body, body, xforms[ok], xsym[ok], iresl, bounds, profiler=prof, **kw)
 
       # record ranges used (trim data to return)
       lb = np.zeros(len(scores), dtype="i4")
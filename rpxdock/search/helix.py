@@ -5,7 +5,7 @@ log = logging.getLogger(__name__)
 
 def helix_get_sample_hierarchy(body, hscore, extent=100):
    "set up XformHier with appropriate bounds and resolution"
-   cart_xhresl, ori_xhresl = hscore.base.attr.xhresl
+   cart_xhresl, ori_xhresl = hscore.xhresl
    rg = body.rg()
    cart_samp_resl = 0.707 * cart_xhresl
    ori_samp_resl = cart_samp_resl / rg * 180 / np.pi
@@ -54,7 +54,8 @@ def make_helix(body, hscore, sampler, search=hier_search, **kw):
 
    return rp.Result(
       body_=None if kw.dont_store_body_in_results else [body, body.copy()],
-      attrs=dict(arg=kw, stats=stats, ttotal=t.total),
+      attrs=dict(arg=kw, stats=stats, ttotal=t.total,
+                 **evaluator.profiler.result_attrs(kw.profile_trace)),
       scores=(["model"], scores[ibest].astype("f4")),
       xforms=(["model", "hrow", "hcol"], xforms),
       rpx=(["model"], rpx.astype("f4")),
@@ -72,12 +73,14 @@ class HelixEvaluator:
       self.kw = rp.Bunch(kw)
       self.body = body.copy()
       self.hscore = hscore
+      self.profiler = rp.Profiler('HelixEvaluator', enabled=bool(self.kw.profile))
 
    def __call__(self, xforms, iresl=-1, wts={}, **kw):
       kw = self.kw.sub(wts=wts)
       xeye = np.eye(4, dtype="f4")
       body = self.body.copy()
       body2 = self.body.copy()
+      prof = self.profiler
       xforms = xforms.reshape(-1, 4, 4)
       cart_extent = self.hscore.cart_extent[iresl]
       ori_extent = self.hscore.ori_extent[iresl]
@@ -89,20 +92,24 @@ class HelixEvaluator:
 
       assert kw.symframe_num_helix_repeats >= kw.helix_max_isecond
 
-      axis, ang = hm.axis_angle_of(xforms)
-      ang = ang * 180 / np.pi
+      with prof.stage('helix_geometry', len(xforms)):
+         axis, ang = hm.axis_angle_of(xforms)
+         ang = ang * 180 / np.pi
 
-      aok = np.logical_and(ang >= kw.helix_min_primary_angle - ori_extent,
-                           ang <= kw.helix_max_primary_angle + ori_extent)
-      dhelix = np.abs(hm.hdot(axis, xforms[:, :, 3]))
-      dok = np.logical_and(dhelix >= kw.helix_min_delta_z - cart_extent,
-                           dhelix <= helix_max_delta_z + cart_extent)
-      ok = np.logical_and(dok, aok)
+         aok = np.logical_and(ang >= kw.helix_min_primary_angle - ori_extent,
+                              ang <= kw.helix_max_primary_angle + ori_extent)
+         dhelix = np.abs(hm.hdot(axis, xforms[:, :, 3]))
+         dok = np.logical_and(dhelix >= kw.helix_min_delta_z - cart_extent,
+                              dhelix <= helix_max_delta_z + cart_extent)
+         ok = np.logical_and(dok, aok)
       # ok = np.tile(True, len(xforms))
 
       scores = np.zeros((len(xforms), 2))
-      ok[ok] = body.clash_ok(body2, xforms[ok], xeye, **kw)
-      scores[ok, 0] = self.hscore.scorepos(body, body, xforms[ok], xeye, iresl, **kw)
+      with prof.stage('clash_ok', np.sum(ok)):
+         ok[ok] = body.clash_ok(body2, xforms[ok], xeye, **kw)
+      with prof.stage('scorepos', np.sum(ok)):
+         scores[ok, 0] = self.hscore.scorepos(body, body, xforms[ok], xeye, iresl, profiler=prof,
+                                              **kw)
 
       ok[ok] &= scores[ok, 0] >= kw.helix_min_primary_score
       ok[ok] &= scores[ok, 0] <= kw.helix_max_primary_score
@@ -113,22 +120,25 @@ class HelixEvaluator:
          scores = scores[:, 0]
       else:
          xforms2 = xforms
-         for i in range(2, helix_max_iclash):
-            xforms2 = xforms @ xforms2
-            ok[ok] = body.clash_ok(body2, xforms2[ok], xeye, **kw)
+         with prof.stage('clash_ok', np.sum(ok)):
+            for i in range(2, helix_max_iclash):
+               xforms2 = xforms @ xforms2
+               ok[ok] = body.clash_ok(body2, xforms2[ok], xeye, **kw)
          xforms2 = xforms
          scores2 = np.zeros((kw.helix_max_isecond, len(xforms)))
          for i2 in range(2, kw.helix_max_isecond):
             xforms2 = xforms @ xforms2
             if i2 < kw.helix_min_isecond: continue
-            scores2[i2, ok] = self.hscore.scorepos(
-               body,
-               body2,
-               xforms2[ok],
-               xeye,
-               iresl - kw.helix_iresl_second_shift,
-               **kw,
-            )
+            with prof.stage('scorepos', np.sum(ok)):
+               scores2[i2, ok] = self.hscore.scorepos(
+                  body,
+                  body2,
+                  xforms2[ok],
+                  xeye,
+                  iresl - kw.helix_iresl_second_shift,
+                  profiler=prof,
+                  **kw,
+               )
 
          # xforms2 = xforms
          # scores2 = np.zeros((kw.helix_max_isecond, len(xforms)))
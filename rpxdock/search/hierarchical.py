@@ -1,30 +1,69 @@
-import logging, itertools, numpy as np, rpxdock as rp
+import os, logging, itertools, hashlib, numpy as np, rpxdock as rp
 
 log = logging.getLogger(__name__)
 
-def hier_search(sampler, evaluator, **kw):
+def hier_search(sampler, evaluator, checkpoint=None, **kw):
    '''
    :param sampler:
    :param evaluator:
+   :param checkpoint: file to save search state to after each iresl, and resume from
    :param kw:
    :return:
    gets positions and scores and stuff for sampling
+
+   with kw.hier_prune_topk, after iresl 0 the best few samples are followed down to the last
+   iresl to get hier_prune_topk completed scores. at later iresls, parents scoring below the
+   worst of those (times kw.hier_prune_slack, default 0.9) are not expanded, as the smeared
+   coarse tables make a parent's score a rough upper bound on its descendants'. the bound is
+   not strict, so pruning is a heuristic and can drop a good subtree; lower slack makes that
+   less likely. stats.nsaved is the evaluations skipped at each iresl, and the dive is counted
+   in stats.neval at iresl 0
+
+   kw.base_samples, a rp.sampling.SharedBaseSamples for this sampler, supplies the iresl 0
+   samples so jobs sharing a sampler don't each regenerate them
    '''
    kw = rp.Bunch(kw)
    neval, indices, scores = list(), None, None
    nresl = kw.nresl if kw.nresl else evaluator.hscore.actual_nresl
+   start, bound, nsaved = 0, None, list()
+   prof = getattr(evaluator, 'profiler', rp.util.null_profiler)
+   if checkpoint:
+      key = hier_checkpoint_key(sampler, **kw)
+      inputs = hier_checkpoint_inputs(evaluator, nresl)
+      state = load_hier_checkpoint(checkpoint, key, inputs)
+      if state:
+         start = state.iresl + 1
+         indices, scores, extra, neval = state.indices, state.scores, state.extra, state.neval
+         bound, nsaved = state.bound, state.nsaved
+         log.info(f"{kw.output_prefix} resuming after iresl {state.iresl} from {checkpoint}")
+         if start >= kw.nresl:
+            mask, xforms = sampler.get_xforms(state.iresl, indices)
+            assert np.all(mask)
    
    #Uncomment to dump docking metrics at each resolution level of the search.
    #iresl_list = []
    #data_list = []
    #spec = kw.spec
    #bodies = kw.bodies
-   for iresl in range(kw.nresl):
-      indices, xforms = expand_samples(iresl, sampler, indices, scores, **kw)
+   for iresl in range(start, kw.nresl):
+      nsaved.append(0)
+      if bound is not None:
+         indices, scores, nsaved[-1] = prune_samples(iresl, sampler, indices, scores, bound, **kw)
+      with prof.stage('expand_samples', len(indices) if iresl else sampler.size(0)):
+         indices, xforms = expand_samples(iresl, sampler, indices, scores, **kw)
       scores, extra, t = rp.search.evaluate_positions(**kw.sub(vars()))
       neval.append((t, len(scores)))
       log.info(f"{kw.output_prefix} iresl {iresl} ntot {len(scores):11,} " +
-               f"nonzero {np.sum(scores > 0):5,}")
+               f"nonzero {np.sum(scores > 0):5,}" +
+               (f" pruned {nsaved[-1]:,}" if bound is not None else ''))
+      if kw.hier_prune_topk and iresl == 0 and iresl + 1 < kw.nresl:
+         bound, tprobe, nprobe = hier_prune_bound(sampler, evaluator, iresl, indices, scores,
+                                                  **kw)
+         neval[-1] = neval[-1][0] + tprobe, neval[-1][1] + nprobe
+         if bound is not None: bound *= kw.hier_prune_slack or 0.9
+      if checkpoint:
+         dump_hier_checkpoint(checkpoint, key, iresl, indices, scores, extra, neval, bound,
+                              nsaved, inputs)
    #Uncomment to dump docking metrics at each resolution level of the search. 
    """
       iresl_list.append(iresl)
@@ -56,11 +95,142 @@ def hier_search(sampler, evaluator, **kw):
    rp.util.dump(search_data, kw.output_prefix + '_iresl_Result.pickle')
    """
 
-   stats = rp.Bunch(ntot=sum(x[1] for x in neval), neval=neval)
+   stats = rp.Bunch(ntot=sum(x[1] for x in neval), neval=neval, nsaved=nsaved)
 
    return xforms, scores, extra, stats
 
-def expand_samples(iresl, sampler, indices=None, scores=None, beam_size=None, **kw):
+def hier_prune_bound(sampler, evaluator, iresl, indices, scores, hier_prune_topk, nresl,
+                     **kw):
+   '''
+   lower bound on the hier_prune_topk-th best final score, from following only the
+   hier_prune_topk best samples at each iresl after this one down to the last
+
+   returns bound, or None if the dive finds fewer than hier_prune_topk nonzero scores, and the
+   time and number of evaluations the dive took
+   '''
+   kw = rp.Bunch(kw)
+   ttot, ntot = 0, 0
+   for i in range(iresl + 1, nresl):
+      nexpand = min(hier_prune_topk, len(scores))
+      indices, xforms = sampler.expand_top_N(nexpand, i - 1, scores, indices)
+      scores, extra, t = rp.search.evaluate_positions(**kw.sub(
+         evaluator=evaluator,
+         xforms=xforms,
+         iresl=i,
+      ))
+      ttot, ntot = ttot + t, ntot + len(scores)
+   scores = scores[scores > 0]
+   if len(scores) < hier_prune_topk: return None, ttot, ntot
+   return np.partition(scores, -hier_prune_topk)[-hier_prune_topk], ttot, ntot
+
+def prune_samples(iresl, sampler, indices, scores, bound, beam_size=None, **kw):
+   '''
+   drop samples from iresl - 1 whose score, an upper bound on their children's, is below bound
+
+   the best sample is always kept. returns indices, scores and the number of child evaluations
+   saved, from parents expand_samples would have expanded
+   '''
+   keep = scores >= bound
+   keep[np.argmax(scores)] = True
+   nexpand = max(1, int(beam_size / 2**sampler.dim))
+   nsaved = (min(nexpand, len(scores)) - min(nexpand, np.sum(keep))) * 2**sampler.dim
+   return indices[keep], scores[keep], int(nsaved)
+
+def hier_checkpoint_key(sampler, nresl=None, beam_size=None, hier_prune_topk=0,
+                        hier_prune_slack=0.9, wts=None, function=None, **kw):
+   '''identifies the search a checkpoint belongs to, a mismatch means start over'''
+   key = (f'{type(sampler).__name__} size0 {sampler.size(0)} dim {sampler.dim} ' +
+          f'nresl {nresl} beam_size {beam_size}')
+   if hier_prune_topk: key += f' hier_prune_topk {hier_prune_topk} slack {hier_prune_slack}'
+   if wts: key += f' wts {sorted(dict(wts).items())}'
+   if function: key += f' function {function}'
+   return key
+
+def hier_checkpoint_inputs(evaluator, nresl=None):
+   '''
+   digest of the bodies and score tables an evaluator holds, None if it holds neither
+
+   bodies are hashed by their coordinates, tables by the file they are loaded from or, for
+   tables given as objects, by their type, size and resolution
+   '''
+   h, found = hashlib.sha1(), False
+   for name, v in sorted(getattr(evaluator, '__dict__', {}).items()):
+      for x in v if isinstance(v, (list, tuple)) else [v]:
+         if isinstance(x, rp.Body):
+            h.update(name.encode() + np.ascontiguousarray(x.coord).tobytes())
+            found = True
+         elif isinstance(getattr(x, 'hier', None), rp.score.LazyTables):  # RpxHier, maybe proxied
+            h.update(f'{name} base {os.path.basename(x._base.source(0) or "")}'.encode())
+            for i in range(min(nresl or x.actual_nresl, len(x.hier))):
+               h.update(_table_tag(x.hier, i).encode())
+            found = True
+   return h.hexdigest() if found else None
+
+def _table_tag(tables, i):
+   if tables.source(i): return os.path.basename(tables.source(i))
+   t = tables[i]
+   return f'{type(t.phmap).__name__} {len(t)} {t.attr.cart_extent} {t.attr.ori_extent}'
+
+def dump_hier_checkpoint(fname, key, iresl, indices, scores, extra, neval, bound=None,
+                         nsaved=(), inputs=None):
+   '''
+   save hier_search state after iresl: sampler indices, scores, extra and timing
+
+   indices are in the sampler's index space at iresl, so xforms are not stored. written to a
+   temp file then renamed, so a job killed mid write leaves the previous checkpoint intact.
+   inputs is hier_checkpoint_inputs of the evaluator
+   '''
+   arrays = dict(key=np.array(key), iresl=np.array(iresl), indices=indices, scores=scores,
+                 neval=np.array(neval, dtype='f8').reshape(-1, 2),
+                 nsaved=np.array(nsaved, dtype='i8'))
+   if bound is not None: arrays['bound'] = np.array(bound)
+   if inputs is not None: arrays['inputs'] = np.array(inputs)
+   for k, v in extra.items():
+      if isinstance(v, tuple):
+         arrays['extradims_' + k] = np.array(v[0])
+         v = v[1]
+      arrays['extra_' + k] = v
+   d = os.path.dirname(fname)
+   if d: os.makedirs(d, exist_ok=True)
+   tmp = fname + '.tmp'
+   with open(tmp, 'wb') as out:
+      np.savez(out, **arrays)
+   os.replace(tmp, fname)
+
+def load_hier_checkpoint(fname, key=None, inputs=None):
+   '''
+   state saved by dump_hier_checkpoint, or None if no checkpoint or key doesn't match
+
+   with inputs, a checkpoint saved with different (or unknown) bodies / tables doesn't match
+   '''
+   if not os.path.exists(fname): return None
+   with np.load(fname) as npz:
+      if key is not None and str(npz['key']) != key:
+         log.warning(f'ignoring checkpoint {fname} for a different search: {npz["key"]}')
+         return None
+      if inputs is not None and ('inputs' not in npz.files or str(npz['inputs']) != inputs):
+         log.warning(f'ignoring checkpoint {fname} for different bodies or score tables')
+         return None
+      extra = rp.Bunch()
+      for k in npz.files:
+         if k.startswith('extra_'):
+            dims = 'extradims_' + k[6:]
+            extra[k[6:]] = (tuple(npz[dims]), npz[k]) if dims in npz.files else npz[k]
+      return rp.Bunch(
+         iresl=int(npz['iresl']),
+         indices=npz['indices'],
+         scores=npz['scores'],
+         extra=extra,
+         neval=[(t, int(n)) for t, n in npz['neval']],
+         bound=float(npz['bound']) if 'bound' in npz.files else None,
+         nsaved=[int(n) for n in npz['nsaved']] if 'nsaved' in npz.files else list(),
+      )
+
+def expand_samples(iresl, sampler, indices=None, scores=None, beam_size=None, base_samples=None,
+                   **kw):
+   if iresl == 0 and base_samples is not None:
+      base_samples.check_sampler(sampler)
+      return base_samples.indices, base_samples.xforms
    if iresl == 0:
       indices = np.arange(sampler.size(0), dtype="u8")
       mask, xforms = sampler.get_xforms(0, indices)
@@ -76,7 +76,8 @@ def make_multicomp(
 
    data = dict(
       attrs=dict(arg=kw, stats=stats, ttotal=t.total, tdump=tdump, output_prefix=kw.output_prefix,
-                 output_body='all', sym=spec.arch),
+                 output_body='all', sym=spec.arch,
+                 **evaluator.profiler.result_attrs(kw.profile_trace)),
       scores=(["model"], scores[ibest].astype("f4")),
       xforms=(["model", "comp", "hrow", "hcol"], xforms),
       rpx=(["model"], rpx.astype("f4")),
@@ -110,6 +111,7 @@ class MultiCompEvaluatorBase:
       self.spec = spec
       self.kw.wts = wts
       self.bodies = [b.copy_with_sym(spec.nfold[i], spec.axis[i]) for i, b in enumerate(bodies)]
+      self.profiler = rp.Profiler(type(self).__name__, enabled=bool(self.kw.profile))
 
 class MultiCompEvaluator(MultiCompEvaluatorBase):
    def __init__(self, *arg, **kw):
@@ -118,23 +120,25 @@ class MultiCompEvaluator(MultiCompEvaluatorBase):
    def __call__(self, xforms, iresl=-1, wts={}, **kw):
       kw = self.kw.sub(wts=wts)
       xeye = np.eye(4, dtype="f4")
-      B = self.bodies
+      B, prof = self.bodies, self.profiler
       # print(f"docking {len(B)} bodies")
       X = xforms.reshape(-1, xforms.shape[-3], 4, 4)
       xnbr = self.spec.to_neighbor_olig
 
       # check for "flatness" (ok = an array of "the good stuff that passes these checks")
-      delta_h = np.array(
-         [hm.hdot(X[:, i] @ B[i].com(), self.spec.axis[i]) for i in range(len(B))])
-      ok = np.max(np.abs(delta_h[None] - delta_h[:, None]), axis=(0, 1)) < kw.max_delta_h
+      with prof.stage('flatness', len(X)):
+         delta_h = np.array(
+            [hm.hdot(X[:, i] @ B[i].com(), self.spec.axis[i]) for i in range(len(B))])
+         ok = np.max(np.abs(delta_h[None] - delta_h[:, None]), axis=(0, 1)) < kw.max_delta_h
       # ok = np.repeat(True, len(X))
 
       # check clash, or get non-clash range
-      for i in range(len(B)):
-         if xnbr[i] is not None:
-            ok[ok] &= B[i].clash_ok(B[i], X[ok, i], xnbr[i] @ X[ok, i], **kw)
-         for j in range(i):
-            ok[ok] &= B[i].clash_ok(B[j], X[ok, i], X[ok, j], **kw)
+      with prof.stage('clash_ok', np.sum(ok)):
+         for i in range(len(B)):
+            if xnbr[i] is not None:
+               ok[ok] &= B[i].clash_ok(B[i], X[ok, i], xnbr[i] @ X[ok, i], **kw)
+            for j in range(i):
+               ok[ok] &= B[i].clash_ok(B[j], X[ok, i], X[ok, j], **kw)
 
       if xnbr[0] is None and xnbr[1] is not None and xnbr[2] is not None:  # layer hack
          logging.debug("touch")
@@ -157,7 +161,8 @@ class MultiCompEvaluator(MultiCompEvaluatorBase):
          ifscore = list()
          for i in range(len(B)):
             for j in range(i):
-               ifscore.append(self.hscore.scorepos(B[j], B[i], X[ok, j], X[ok, i], iresl, wts=wts))
+               ifscore.append(self.hscore.scorepos(B[j], B[i], X[ok, j], X[ok, i], iresl, wts=wts,
+                                                   profiler=prof))
                # ifscore = np.stack(ifscore)
                logging.debug(f"ifscore is {len(ifscore)} long and is a {type(ifscore)}")
 
@@ -179,10 +184,12 @@ class MultiCompEvaluator(MultiCompEvaluatorBase):
                   logging.debug("found self")
                   Xsym = self.spec.to_neighbor_olig @ X
                   s_ifscore.append(
-                     self.hscore.scorepos(B[j], B[i], X[ok, j], Xsym[ok, i], iresl, wts=wts))
+                     self.hscore.scorepos(B[j], B[i], X[ok, j], Xsym[ok, i], iresl, wts=wts,
+                                          profiler=prof))
                else:
                   ns_ifscore.append(
-                     self.hscore.scorepos(B[j], B[i], X[ok, j], X[ok, i], iresl, wts=wts))
+                     self.hscore.scorepos(B[j], B[i], X[ok, j], X[ok, i], iresl, wts=wts,
+                                          profiler=prof))
          logging.debug(f"self scores is length {len(s_ifscore[0])}")
          logging.debug(f"non-self scores is legnth {len(ns_ifscore[0])}")
          logging.debug(f"OK len is {len(ok)}")
@@ -241,14 +248,15 @@ class TwoCompEvaluatorWithTrim(MultiCompEvaluatorBase):
 
    def eval_trim_one(self, trim_component, x, iresl=-1, wts={}, **kw):
       kw = self.kw.sub(wts=wts)
-      B = self.bodies
+      B, prof = self.bodies, self.profiler
       X = x.reshape(-1, 2, 4, 4)
       xnbr = self.spec.to_neighbor_olig
 
       # check for "flatness"
-      d1 = hm.hdot(X[:, 0] @ B[0].com(), self.spec.axis[0])
-      d2 = hm.hdot(X[:, 1] @ B[1].com(), self.spec.axis[1])
-      ok = abs(d1 - d2) < kw.max_delta_h
+      with prof.stage('flatness', len(X)):
+         d1 = hm.hdot(X[:, 0] @ B[0].com(), self.spec.axis[0])
+         d2 = hm.hdot(X[:, 1] @ B[1].com(), self.spec.axis[1])
+         ok = abs(d1 - d2) < kw.max_delta_h
 
       lbA = np.zeros(len(X), dtype='i4')
       lbB = np.zeros(len(X), dtype='i4')
@@ -256,52 +264,54 @@ class TwoCompEvaluatorWithTrim(MultiCompEvaluatorBase):
       ubB = np.ones(len(X), dtype='i4') * (self.bodies[1].asym_body.nres - 1)
 
       # one-sided trim
-      if trim_component == 'A':
-         trimA1 = B[0].intersect_range(B[1], X[ok, 0], X[ok, 1], **kw)
-         trimA1, trimok = trim_ok(trimA1, B[0].asym_body.nres, **kw)
-         ok[ok] &= trimok
-
-         xa = X[ok, 0]
-         if xnbr is not None:
-            trimA2 = B[0].intersect_range(B[0], xa, xnbr[0] @ xa, **kw)
-         trimA2, trimok2 = trim_ok(trimA2, B[0].asym_body.nres, **kw)
-         ok[ok] &= trimok2
-         lbA[ok] = np.maximum(trimA1[0][trimok2], trimA2[0])
-         ubA[ok] = np.minimum(trimA1[1][trimok2], trimA2[1])
-
-         xb = X[ok, 1]
-         if xnbr is not None:
-            trimB = B[1].intersect_range(B[1], xb, xnbr[1] @ xb, **kw)
-         trimB, trimok = trim_ok(trimB, B[1].asym_body.nres, **kw)
-         ok[ok] &= trimok
-         lbB[ok], ubB[ok] = trimB
-      elif trim_component == 'B':
-         trimB1 = B[1].intersect_range(B[0], X[ok, 1], X[ok, 0], **kw)
-         trimB1, trimok = trim_ok(trimB1, B[1].asym_body.nres, **kw)
-         ok[ok] &= trimok
-
-         xb = X[ok, 1]
-         if xnbr is not None:
-            trimB2 = B[1].intersect_range(B[1], xb, xnbr[1] @ xb, **kw)
-         trimB2, trimok2 = trim_ok(trimB2, B[1].asym_body.nres, **kw)
-         ok[ok] &= trimok2
-         lbB[ok] = np.maximum(trimB1[0][trimok2], trimB2[0])
-         ubB[ok] = np.minimum(trimB1[1][trimok2], trimB2[1])
-
-         xa = X[ok, 0]
-         if xnbr is not None:
-            trimA = B[0].intersect_range(B[0], xa, xnbr[0] @ xa, **kw)
-         trimA, trimok = trim_ok(trimA, B[0].asym_body.nres, **kw)
-         ok[ok] &= trimok
-         lbA[ok], ubA[ok] = trimA
-      else:
-         raise ValueError('trim_component invalid')
+      with prof.stage('intersect_range', np.sum(ok)):
+         if trim_component == 'A':
+            trimA1 = B[0].intersect_range(B[1], X[ok, 0], X[ok, 1], **kw)
+            trimA1, trimok = trim_ok(trimA1, B[0].asym_body.nres, **kw)
+            ok[ok] &= trimok
+
+            xa = X[ok, 0]
+            if xnbr is not None:
+               trimA2 = B[0].intersect_range(B[0], xa, xnbr[0] @ xa, **kw)
+            trimA2, trimok2 = trim_ok(trimA2, B[0].asym_body.nres, **kw)
+            ok[ok] &= trimok2
+            lbA[ok] = np.maximum(trimA1[0][trimok2], trimA2[0])
+            ubA[ok] = np.minimum(trimA1[1][trimok2], trimA2[1])
+
+            xb = X[ok, 1]
+            if xnbr is not None:
+               trimB = B[1].intersect_range(B[1], xb, xnbr[1] @ xb, **kw)
+            trimB, trimok = trim_ok(trimB, B[1].asym_body.nres, **kw)
+            ok[ok] &= trimok
+            lbB[ok], ubB[ok] = trimB
+         elif trim_component == 'B':
+            trimB1 = B[1].intersect_range(B[0], X[ok, 1], X[ok, 0], **kw)
+            trimB1, trimok = trim_ok(trimB1, B[1].asym_body.nres, **kw)
+            ok[ok] &= trimok
+
+            xb = X[ok, 1]
+            if xnbr is not None:
+               trimB2 = B[1].intersect_range(B[1], xb, xnbr[1] @ xb, **kw)
+            trimB2, trimok2 = trim_ok(trimB2, B[1].asym_body.nres, **kw)
+            ok[ok] &= trimok2
+            lbB[ok] = np.maximum(trimB1[0][trimok2], trimB2[0])
+            ubB[ok] = np.minimum(trimB1[1][trimok2], trimB2[1])
+
+            xa = X[ok, 0]
+            if xnbr is not None:
+               trimA = B[0].intersect_range(B[0], xa, xnbr[0] @ xa, **kw)
+            trimA, trimok = trim_ok(trimA, B[0].asym_body.nres, **kw)
+            ok[ok] &= trimok
+            lbA[ok], ubA[ok] = trimA
+         else:
+            raise ValueError('trim_component invalid')
 
       # score everything that didn't clash
       bounds = lbA[ok], ubA[ok], B[0].asym_body.nres, lbB[ok], ubB[ok], B[1].asym_body.nres
       scores = np.zeros(len(X))
-      scores[ok] = self.hscore.scorepos(body1=B[0], body2=B[1], pos1=X[ok, 0], pos2=X[ok, 1],
-                                        iresl=iresl, bounds=bounds, **kw)
+      with prof.stage('scorepos', np.sum(ok)):
+         scores[ok] = self.hscore.scorepos(body1=B[0], body2=B[1], pos1=X[ok, 0], pos2=X[ok, 1],
+                                           iresl=iresl, bounds=bounds, profiler=prof, **kw)
 
       # if np.sum(ok):
       # print(iresl, np.sum(ok), np.min(scores[ok]), np.max(scores[ok]), np.mean(lbA),
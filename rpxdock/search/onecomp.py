@@ -82,7 +82,8 @@ def make_onecomp(
 
    data = dict(
       attrs=dict(arg=kw, stats=stats, ttotal=t.total, output_prefix=kw.output_prefix,
-                 output_body='all', sym=spec.arch),
+                 output_body='all', sym=spec.arch,
+                 **evaluator.profiler.result_attrs(kw.profile_trace)),
       scores=(["model"], scores[ibest].astype("f4")),
       xforms=(["model", "hrow", "hcol"], xforms),
       rpx=(["model"], rpx.astype("f4")),
@@ -122,22 +123,25 @@ class OneCompEvaluator:
       self.kw.wts = wts
       self.body = body.copy_with_sym(spec.nfold, spec.axis)
       self.trimmable_components = trimmable_components
+      self.profiler = rp.Profiler('OneCompEvaluator', enabled=bool(self.kw.profile))
 
    def __call__(self, xforms, iresl=-1, wts={}, **kw):
       kw = self.kw.sub(wts=wts)
       xeye = np.eye(4, dtype="f4")
-      body, sfxn = self.body, self.hscore.scorepos
+      body, sfxn, prof = self.body, self.hscore.scorepos, self.profiler
       X = xforms.reshape(-1, 4, 4)  #@ body.pos
       Xsym = self.spec.to_neighbor_olig @ X
 
       # check clash, or get non-clash range
       ok = np.ones(len(xforms), dtype='bool')
       if kw.max_trim > 0:
-         trim = body.intersect_range(body, X[ok], Xsym[ok], **kw)
-         trim, trimok = rp.search.trim_ok(trim, body.nres, **kw)
-         ok[ok] &= trimok
+         with prof.stage('intersect_range', len(X)):
+            trim = body.intersect_range(body, X[ok], Xsym[ok], **kw)
+            trim, trimok = rp.search.trim_ok(trim, body.nres, **kw)
+            ok[ok] &= trimok
       else:
-         ok[ok] &= body.clash_ok(body, X[ok], Xsym[ok], **kw)
+         with prof.stage('clash_ok', len(X)):
+            ok[ok] &= body.clash_ok(body, X[ok], Xsym[ok], **kw)
          trim = [0], [body.nres - 1]
 
       # if iresl == 4:
@@ -151,7 +155,8 @@ class OneCompEvaluator:
       # score everything that didn't clash
       scores = np.zeros(len(X))
       bounds = (*trim, -1, *trim, -1)
-      scores[ok] = sfxn(body, body, X[ok], Xsym[ok], iresl, bounds, **kw)
+      with prof.stage('scorepos', np.sum(ok)):
+         scores[ok] = sfxn(body, body, X[ok], Xsym[ok], iresl, bounds, profiler=prof, **kw)
       '''
       bounds: valid residue ranges to score after trimming i.e. don't score resi that were trimmed 
       sfxn: hscore.scorepos scores stuff from the hscore that got passed 
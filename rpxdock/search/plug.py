@@ -32,7 +32,7 @@ def make_plugs(plug, hole, hscore, search=hier_search, sampler=None, **kw):
    #assert np.allclose(np.min(rpx + ncontact, axis=1), scores)
    data = dict(
       attrs=dict(arg=kw, stats=stats, sym=hole.sym, ttotal=t.total, tdump=tdump,
-                 output_body='all'),
+                 output_body='all', **evaluator.profiler.result_attrs(kw.profile_trace)),
       scores=(["model"], scores.astype("f4")),
       xforms=(["model", "hrow", "hcol"], xforms),
       tot_plug=(["model"], ifacescores[:, 0].astype("f4")),
@@ -58,6 +58,7 @@ class PlugEvaluator:
       self.hole = hole
       self.hscore = hscore
       self.symrot = rp.homog.hrot([0, 0, 1], 360 / int(hole.sym[1:]), degrees=True)
+      self.profiler = rp.Profiler('PlugEvaluator', enabled=bool(self.kw.profile))
 
    def __call__(self, xforms, iresl=-1, wts={}, **_):
       wts = self.kw.wts.sub(wts)
@@ -72,30 +73,38 @@ class PlugEvaluator:
       xforms = xforms.reshape(-1, 4, 4)
       plug, hole, sfxn = self.plug, self.hole, self.hscore.scorepos
       dclsh, max_trim = self.kw.clashdis, self.kw.max_trim
+      prof = self.profiler
       xsym = self.symrot @ xforms
 
       # check for "flatness"
-      ok = np.abs((xforms @ plug.pcavecs[0])[:, 2]) <= self.kw.max_longaxis_dot_z
+      with prof.stage('flatness', len(xforms)):
+         ok = np.abs((xforms @ plug.pcavecs[0])[:, 2]) <= self.kw.max_longaxis_dot_z
 
       if not self.kw.plug_fixed_olig:  # check chash in formed oligomer
-         ok[ok] &= plug.clash_ok(plug, xforms[ok], xsym[ok], mindis=dclsh)
+         with prof.stage('clash_ok', np.sum(ok)):
+            ok[ok] &= plug.clash_ok(plug, xforms[ok], xsym[ok], mindis=dclsh)
 
       if max_trim > 0:  # get non-clash range
-         trim = plug.intersect_range(hole, xforms[ok], max_trim=max_trim, mindis=dclsh)
-         trim, trimok = rp.search.trim_ok(trim, plug.nres, max_trim)
-         ok[ok] &= trimok
+         with prof.stage('intersect_range', np.sum(ok)):
+            trim = plug.intersect_range(hole, xforms[ok], max_trim=max_trim, mindis=dclsh)
+            trim, trimok = rp.search.trim_ok(trim, plug.nres, max_trim)
+            ok[ok] &= trimok
       else:  #  check clash olig vs hole
-         ok[ok] &= plug.clash_ok(hole, xforms[ok], xeye, mindis=dclsh)
+         with prof.stage('clash_ok', np.sum(ok)):
+            ok[ok] &= plug.clash_ok(hole, xforms[ok], xeye, mindis=dclsh)
          trim = [0], [plug.nres - 1]
 
       # score everything that didn't clash
       xok = xforms[ok]
       scores = np.zeros((len(xforms), 2))
       scores[ok, 0] = 9999
-      if not self.kw.plug_fixed_olig:
-         bounds = (*trim, -1, *trim, -1)
-         scores[ok, 0] = sfxn(plug, plug, xok, xsym[ok], iresl, bounds=bounds, wts=wts)
-      scores[ok, 1] = sfxn(plug, hole, xok, xeye[:, ], iresl, bounds=trim, wts=wts)
+      with prof.stage('scorepos', len(xok)):
+         if not self.kw.plug_fixed_olig:
+            bounds = (*trim, -1, *trim, -1)
+            scores[ok, 0] = sfxn(plug, plug, xok, xsym[ok], iresl, bounds=bounds, wts=wts,
+                                 profiler=prof)
+         scores[ok, 1] = sfxn(plug, hole, xok, xeye[:, ], iresl, bounds=trim, wts=wts,
+                              profiler=prof)
 
       # record ranges used
       plb = np.zeros(len(scores), dtype="i4")
@@ -125,7 +134,7 @@ def _debug_dump_plugs(xforms, plug, hole, scores, ibest, evaluator, **kw):
 
 def plug_get_sample_hierarchy(plug, hole, hscore):
    "set up XformHier with appropriate bounds and resolution"
-   cart_samp_resl, ori_samp_resl = hscore.base.attr.xhresl
+   cart_samp_resl, ori_samp_resl = hscore.xhresl
    r0 = max(hole.rg_xy(), 2 * plug.radius_max())
    nr1 = np.ceil(r0 / cart_samp_resl)
    r1 = nr1 * cart_samp_resl
@@ -144,7 +153,7 @@ def plug_get_sample_hierarchy(plug, hole, hscore):
 _default_samplers = {hier_search: plug_get_sample_hierarchy}
 
 def plug_test_hier_sampler(plug, hole, hscore, n=6):
-   r, rori = hscore.base.attr.xhresl
+   r, rori = hscore.xhresl
    cartub = np.array([n * r, r, r])
    cartlb = np.array([-n * r, 0, 0])
    cartbs = np.array([2 * n, 1, 1], dtype="i")
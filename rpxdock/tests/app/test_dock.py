@@ -0,0 +1,32 @@
+import concurrent.futures, threading, rpxdock as rp
+from rpxdock.app.dock import stream_bodies_and_jobs
+
+def test_stream_bodies_and_jobs(monkeypatch):
+   events, lock, job0_started = list(), threading.Lock(), threading.Event()
+
+   def fake_body(source, tag=None, **kw):
+      # the last body waits for the first job, so this times out unless jobs start before
+      # all bodies are built
+      if source == 'c': assert job0_started.wait(timeout=10)
+      with lock:
+         events.append(('body', source))
+      return source + tag
+
+   def fake_job(ijob, bodies):
+      with lock:
+         events.append(('job', ijob))
+      if ijob == 0: job0_started.set()
+      return ijob, '+'.join(bodies)
+
+   monkeypatch.setattr(rp.body, 'get_body_cached', fake_body)
+   body_args = [dict(source=s, tag='!') for s in 'abcde']
+   jobs = [[0, 3], [0, 4], [1, 3], [1, 4], [2, 3], [2, 4]]  # like a 2 comp product
+   with concurrent.futures.ThreadPoolExecutor(2) as pool:
+      submit = lambda ijob, bodies: pool.submit(fake_job, ijob, bodies)
+      result = stream_bodies_and_jobs(pool, body_args, jobs, submit, ncpu=1)
+   assert result == [(0, 'a!+d!'), (1, 'a!+e!'), (2, 'b!+d!'), (3, 'b!+e!'), (4, 'c!+d!'),
+                     (5, 'c!+e!')]
+   # bodies built once each, in the order jobs need them
+   assert [e[1] for e in events if e[0] == 'body'] == list('adebc')
+   # first job is started before the last bodies are built
+   assert events.index(('job', 0)) < events.index(('body', 'c'))
@@ -1,7 +1,7 @@
 from decimal import MAX_PREC
 from os import supports_bytes_environ
 from rpxdock.motif.frames import stub_from_points
-import _pickle
+import os, _pickle, shutil
 from time import perf_counter
 import numpy as np, rpxdock as rp, rpxdock.homog as hm
 from rpxdock.body import Body, get_trimming_subbodies
@@ -107,6 +107,96 @@ def test_body_pickle(C3_1nza, tmpdir):
    assert np.allclose(b.bvh_bb.centers(), b2.bvh_bb.centers())
    assert np.allclose(b.bvh_cen.centers(), b2.bvh_cen.centers())
 
+def _assert_same_body(b, b2):
+   assert set(vars(b)) == set(vars(b2))
+   for k, v in vars(b).items():
+      v2 = getattr(b2, k)
+      if isinstance(v, np.ndarray):
+         assert v.dtype == v2.dtype and np.all(v == v2), k
+      elif isinstance(v, (rp.bvh.BVH_f4, rp.bvh.BVH_f8)):
+         assert type(v) == type(v2)
+         for x, x2 in zip(v.__getstate__(), v2.__getstate__()):
+            assert np.all(x == x2), k
+      elif isinstance(v, Body):
+         assert (v is b) == (v2 is b2)
+         if v is not b: _assert_same_body(v, v2)
+      elif k == 'orig_coords':
+         assert all(np.all(x == x2) for x, x2 in zip(v, v2))
+      elif k in ('trimN_subbodies', 'trimC_subbodies'):
+         assert len(v) == len(v2)
+         for x, x2 in zip(v, v2):
+            _assert_same_body(x, x2)
+      else:
+         assert v == v2, k
+
+def test_body_dump_load(tmpdir):
+   tmpdir = str(tmpdir)
+   b = rp.data.get_body('DHR14').copy_with_sym('C3', [0, 0, 1])
+   b.trimN_subbodies = [rp.data.get_body('top7'), rp.data.get_body('tiny')]
+   rp.body.dump_body(b, tmpdir + '/b.body.npz')
+   b2 = rp.body.load_body(tmpdir + '/b.body.npz')
+   _assert_same_body(b, b2)
+   assert b2.asym_body.asym_body is b2.asym_body
+   x = hm.htrans([20, 0, 0])
+   d = rp.bvh.bvh_min_dist(b.bvh_bb, b.bvh_bb, np.eye(4), x)
+   d2 = rp.bvh.bvh_min_dist(b2.bvh_bb, b2.bvh_bb, np.eye(4), x)
+   assert d == d2
+
+def test_get_body_cached(tmpdir):
+   tmpdir = str(tmpdir)
+   b = rp.data.get_body('tiny')
+   src = tmpdir + '/tiny.pdb'
+   with open(src, 'w') as out:
+      out.write('not a real pdb, cache hits never read it\n')
+   cache = tmpdir + '/cache'
+   os.makedirs(cache)
+   key = rp.body.body_cache_key(src, 'C1', bvh_dtype='f8')
+   rp.body.dump_body(b, os.path.join(cache, key))
+   b2 = rp.body.get_body_cached(src, body_cache=cache, bvh_dtype='f8')
+   assert b2.pdbfile == src and b2.label == 'tiny'
+   assert np.all(b2.coord == b.coord)
+   # a renamed copy hits the same entry, and is named after the copy
+   src2 = tmpdir + '/renamed.pdb'
+   shutil.copy(src, src2)
+   assert rp.body.body_cache_key(src2, 'C1', bvh_dtype='f8') == key
+   b3 = rp.body.get_body_cached(src2, body_cache=cache, bvh_dtype='f8')
+   assert b3.pdbfile == src2 and b3.label == 'renamed'
+   assert b3.asym_body.label == 'renamed'
+   # key depends on file content and on args that change the body
+   assert key != rp.body.body_cache_key(src, 'C2', bvh_dtype='f8')
+   assert key != rp.body.body_cache_key(src, 'C1', bvh_dtype='f4')
+   sel = rp.app.options.DefaultResidueSelector('1:3')
+   assert rp.body.body_cache_key(src, allowed_res=sel) == rp.body.body_cache_key(
+      src, allowed_res=rp.app.options.DefaultResidueSelector('1 2 3'))
+   assert key == rp.body.body_cache_key(src, 'C1', bvh_dtype='f8', output_prefix='foo')
+   with open(src, 'a') as out:
+      out.write('changed\n')
+   assert key != rp.body.body_cache_key(src, 'C1', bvh_dtype='f8')
+   # no stable key, no caching
+   assert rp.body.body_cache_key(src, allowed_res=object()) is None
+
+def _allowed_upto(body, n, **kw):
+   return range(1, n + 1)
+
+def test_get_body_cached_allowed_res_callable(tmpdir):
+   from functools import partial
+   cache = str(tmpdir) + '/cache'
+   src = rp.data.datadir + '/pdb/C3_1nza_1.pdb.gz'
+   kw = dict(sym='C3', body_cache=cache)
+   b1 = rp.body.get_body_cached(src, allowed_res=lambda body, **kw: range(1, 11), **kw)
+   b2 = rp.body.get_body_cached(src, allowed_res=lambda body, **kw: range(1, 21), **kw)
+   assert np.sum(b1.allowed_residues) == 10
+   assert np.sum(b2.allowed_residues) == 20
+   b3 = rp.body.get_body_cached(src, allowed_res=partial(_allowed_upto, n=5), **kw)
+   b4 = rp.body.get_body_cached(src, allowed_res=partial(_allowed_upto, n=7), **kw)
+   assert np.sum(b3.allowed_residues) == 5
+   assert np.sum(b4.allowed_residues) == 7
+   assert len(os.listdir(cache)) == 4
+   # same callable again is a hit
+   b5 = rp.body.get_body_cached(src, allowed_res=partial(_allowed_upto, n=5), **kw)
+   assert np.all(b5.allowed_residues == b3.allowed_residues)
+   assert len(os.listdir(cache)) == 4
+
 def test_body_copy_sym(body_tiny):
    c2 = body_tiny.copy_with_sym('C2')
    rot = hm.hrot([0, 0, 1], np.pi)
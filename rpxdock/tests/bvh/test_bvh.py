@@ -1031,6 +1031,135 @@ def test_bvh_threading_isect_may_fail():
 
    print("bvh_isect", tottmain / tottthread)
 
+def test_bvh_vec_nthread():
+   Npts, npos = 1000, 1001
+   xyz1 = np.random.rand(Npts, 3) - [0.5, 0.5, 0.5]
+   xyz2 = np.random.rand(Npts, 3) - [0.5, 0.5, 0.5]
+   bvh1 = BVH(xyz1)
+   bvh2 = BVH(xyz2)
+   pos1 = hm.rand_xform(npos, cart_sd=0.5)
+   pos2 = hm.rand_xform(npos, cart_sd=0.5)
+   mindist = 0.05
+   dirn = np.array([1.0, 0, 0])
+   ref = dict(
+      isect=bvh.bvh_isect_vec(bvh1, bvh2, pos1, pos2, mindist),
+      range=bvh.isect_range(bvh1, bvh2, pos1, pos2, mindist, 100),
+      fixed=bvh.bvh_isect_fixed_range_vec(bvh1, bvh2, pos1, pos2, mindist, [100], [900]),
+      count=bvh.bvh_count_pairs_vec(bvh1, bvh2, pos1, pos2, mindist),
+      slide=bvh.bvh_slide_vec(bvh1, bvh2, pos1, pos2, mindist, dirn),
+      pairs=bvh.bvh_collect_pairs_vec(bvh1, bvh2, pos1, pos2, mindist),
+      rpairs=bvh.bvh_collect_pairs_range_vec(bvh1, bvh2, pos1, pos2, mindist, [100], [900]),
+   )
+   assert np.all(ref['count'] == np.diff(ref['pairs'][1], axis=1)[:, 0])
+   for nt in (2, 3, 7, 0):
+      # output identical to single thread, pairs in position order
+      assert np.all(ref['isect'] == bvh.bvh_isect_vec(bvh1, bvh2, pos1, pos2, mindist, nthread=nt))
+      lb, ub = bvh.isect_range(bvh1, bvh2, pos1, pos2, mindist, 100, nthread=nt)
+      assert np.all(ref['range'][0] == lb) and np.all(ref['range'][1] == ub)
+      clash, ids = bvh.bvh_isect_fixed_range_vec(bvh1, bvh2, pos1, pos2, mindist, [100], [900],
+                                                 nthread=nt)
+      assert np.all(ref['fixed'][0] == clash) and np.all(ref['fixed'][1] == ids)
+      count = bvh.bvh_count_pairs_vec(bvh1, bvh2, pos1, pos2, mindist, nthread=nt)
+      assert np.all(ref['count'] == count)
+      slide = bvh.bvh_slide_vec(bvh1, bvh2, pos1, pos2, mindist, dirn, nthread=nt)
+      assert np.all(ref['slide'] == slide)
+      pairs, lbub = bvh.bvh_collect_pairs_vec(bvh1, bvh2, pos1, pos2, mindist, nthread=nt)
+      assert np.all(ref['pairs'][0] == pairs) and np.all(ref['pairs'][1] == lbub)
+      pairs, lbub = bvh.bvh_collect_pairs_range_vec(bvh1, bvh2, pos1, pos2, mindist, [100],
+                                                    [900], nthread=nt)
+      assert np.all(ref['rpairs'][0] == pairs) and np.all(ref['rpairs'][1] == lbub)
+   pairs, lbub = bvh.bvh_collect_pairs_vec(bvh1, bvh2, pos1[:0], pos2[:0], mindist, nthread=4)
+   assert pairs.shape == (0, 2) and lbub.shape == (0, 2)
+
+def bench_bvh_vec_nthread(body=None, nthreads=(1, 2, 4, 0), mindist=3.0, maxdist=10.0):
+   # not collected by pytest, times the threaded kernels on the iresl 0 docks of a C3 search
+   body = body or rp.data.get_body('DHR14')
+   sampler = rp.search.make_cyclic_hier_sampler(body, rp.data.small_hscore())
+   ok, pos1 = sampler.get_xforms(0, np.arange(sampler.size(0), dtype='u8'))
+   pos1 = pos1[ok]
+   pos2 = hm.hrot([0, 0, 1], 120, degrees=True) @ pos1
+   ref = None
+   for nt in nthreads:
+      t = perf_counter()
+      clash = bvh.bvh_isect_vec(body.bvh_bb, body.bvh_bb, pos1, pos2, mindist, nthread=nt)
+      tisect = perf_counter() - t
+      t = perf_counter()
+      pairs, lbub = bvh.bvh_collect_pairs_range_vec(body.bvh_cen, body.bvh_cen, pos1[~clash],
+                                                    pos2[~clash], maxdist, nthread=nt)
+      tpairs = perf_counter() - t
+      if ref is None: ref = clash, pairs, tisect, tpairs
+      assert np.all(clash == ref[0]) and np.all(pairs == ref[1])
+      print(f'nthread {nt:3} ndock {len(pos1):,} bvh_isect_vec {tisect:7.3f}s ' +
+            f'{ref[2] / tisect:5.2f}x, bvh_collect_pairs_range_vec ndock {np.sum(~clash):,} ' +
+            f'npair {len(pairs):,} {tpairs:7.3f}s {ref[3] / tpairs:5.2f}x')
+
+def test_bvh_float32():
+   Npts, npos = 1000, 1000
+   xyz1 = np.random.rand(Npts, 3) - [0.5, 0.5, 0.5]
+   xyz2 = np.random.rand(Npts, 3) - [0.5, 0.5, 0.5]
+   bvh1, bvh2 = rp.bvh.BVH_f8(xyz1), rp.bvh.BVH_f8(xyz2)
+   fvh1, fvh2 = rp.bvh.BVH_f4(xyz1), rp.bvh.BVH_f4(xyz2)
+   assert isinstance(fvh1, rp.bvh.bvh_type('f4'))
+   fcen = fvh1.centers()[np.argsort(fvh1.obj_id())]
+   assert np.allclose(fcen, bvh1.centers()[np.argsort(bvh1.obj_id())], atol=1e-6)
+   pos1 = hm.rand_xform(npos, cart_sd=0.5).astype('f4')
+   pos2 = hm.rand_xform(npos, cart_sd=0.5).astype('f4')
+   mindist = 0.05
+   dirn = np.array([1.0, 0, 0])
+
+   isect = bvh.bvh_isect_vec(bvh1, bvh2, pos1, pos2, mindist)
+   fisect = bvh.bvh_isect_vec(fvh1, fvh2, pos1, pos2, mindist)
+   assert np.sum(isect != fisect) <= 2
+   count = bvh.bvh_count_pairs_vec(bvh1, bvh2, pos1, pos2, mindist)
+   fcount = bvh.bvh_count_pairs_vec(fvh1, fvh2, pos1, pos2, mindist)
+   assert np.sum(count != fcount) <= 2
+   pairs, lbub = bvh.bvh_collect_pairs_vec(bvh1, bvh2, pos1, pos2, mindist)
+   fpairs, flbub = bvh.bvh_collect_pairs_vec(fvh1, fvh2, pos1, pos2, mindist)
+   assert np.all(np.diff(flbub, axis=1)[:, 0] == fcount)
+   assert abs(len(pairs) - len(fpairs)) <= 2
+   rpairs, rlbub = bvh.bvh_collect_pairs_range_vec(fvh1, fvh2, pos1, pos2, mindist)
+   assert np.all(rpairs == fpairs) and np.all(rlbub == flbub)
+   lb, ub = bvh.isect_range(bvh1, bvh2, pos1, pos2, mindist, 100)
+   flb, fub = bvh.isect_range(fvh1, fvh2, pos1, pos2, mindist, 100)
+   assert np.sum(lb != flb) + np.sum(ub != fub) <= 2
+   slide = bvh.bvh_slide_vec(bvh1, bvh2, pos1, pos2, mindist, dirn)
+   fslide = bvh.bvh_slide_vec(fvh1, fvh2, pos1, pos2, mindist, dirn)
+   assert fslide.dtype == np.float32
+   ok = slide < 9e8
+   assert np.all(ok == (fslide < 9e8))
+   assert np.allclose(slide[ok], fslide[ok], atol=1e-4)
+
+   fvh3 = _pickle.loads(_pickle.dumps(fvh1))
+   assert isinstance(fvh3, rp.bvh.BVH_f4)
+   assert np.all(fvh3.centers() == fvh1.centers())
+
+def test_collect_pairs_grouped():
+   Npts, nparent, nchild = 1000, 50, 16
+   xyz1 = np.random.rand(Npts, 3) - [0.5, 0.5, 0.5]
+   xyz2 = np.random.rand(Npts, 3) - [0.5, 0.5, 0.5]
+   bvh1 = BVH(xyz1)
+   bvh2 = BVH(xyz2)
+   # consecutive runs of positions near a parent, like expanded hier_search samples
+   n = nparent * nchild
+   delta = hm.hrot(hm.rand_unit(n), np.random.rand(n) * 0.1, degrees=False)
+   delta[:, :3, 3] = np.random.randn(n, 3) * 0.02
+   pos1 = hm.rand_xform(n, cart_sd=0.5)
+   pos2 = np.repeat(hm.rand_xform(nparent, cart_sd=0.5), nchild, axis=0) @ delta
+   pos2 = pos1 @ pos2
+   lb1, ub1 = np.random.randint(0, 500, n), np.random.randint(500, 1000, n)
+   mindist = 0.05
+   ref, reflbub = bvh.bvh_collect_pairs_range_vec(bvh1, bvh2, pos1, pos2, mindist, lb1, ub1)
+   ipos = np.repeat(np.arange(n), reflbub[:, 1] - reflbub[:, 0])
+   refkey = np.sort((ipos * Npts + ref[:, 0]) * Npts + ref[:, 1])
+   for maxwide, nt in [(0, 1), (0.05, 1), (0.2, 3), (1.0, 1)]:
+      pairs, lbub = bvh.bvh_collect_pairs_grouped_vec(bvh1, bvh2, pos1, pos2, mindist, maxwide,
+                                                      lb1, ub1, nthread=nt)
+      # same pairs for each position, order within a position may differ
+      assert np.all(lbub == reflbub)
+      assert np.all(np.sort((ipos * Npts + pairs[:, 0]) * Npts + pairs[:, 1]) == refkey)
+   pairs, lbub = bvh.bvh_collect_pairs_grouped_vec(bvh1, bvh2, pos1[:0], pos2[:0], mindist, 0.1)
+   assert pairs.shape == (0, 2) and lbub.shape == (0, 2)
+
 def test_bvh_threading_mindist_may_fail():
    from concurrent.futures import ThreadPoolExecutor
    from itertools import repeat
@@ -1111,3 +1240,4 @@ if __name__ == "__main__":
 
    # test_bvh_threading_mindist_may_fail()
    # test_bvh_threading_isect_may_fail()
+   bench_bvh_vec_nthread()
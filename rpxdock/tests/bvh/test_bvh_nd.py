@@ -1,7 +1,6 @@
 import _pickle
 from time import perf_counter
 import numpy as np
-from cppimport import import_hook
 import rpxdock.homog as hm
 from rpxdock.bvh.bvh_nd import *
 from scipy.spatial.distance import cdist
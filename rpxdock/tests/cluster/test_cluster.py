@@ -1,7 +1,7 @@
-from rpxdock.cluster import cookie_cutter
+from rpxdock.cluster import cookie_cutter, cookie_cutter_grid
 from scipy.spatial.distance import pdist
 
-import numpy as np
+import numpy as np, rpxdock as rp
 
 def test_cluster():
    mesh = np.meshgrid(np.arange(3), np.arange(3), np.arange(3))
@@ -16,6 +16,8 @@ def test_cluster():
    assert 4 == len(cookie_cutter(mesh, 2.26))
    assert 2 == len(cookie_cutter(mesh, 2.83))
    assert 1 == len(cookie_cutter(mesh, 3.48))
+   for thresh in [0, 0.99, 1.0, 1.01, 1.42, 1.74, 2, 2.26, 2.83, 3.48]:
+      assert np.all(cookie_cutter(mesh, thresh) == cookie_cutter_grid(mesh, thresh))
 
 def test_cluster_rand():
    thresh = 0.1
@@ -27,6 +29,7 @@ def test_cluster_rand():
    for i in range(1000):
       x = np.random.random((npts, ncol))
       keep = cookie_cutter(x, thresh)
+      assert np.all(keep == cookie_cutter_grid(x, thresh))
       y = x[keep]
       # print(x.shape, y.shape[0], thresh)
       nhit.append(y.shape[0])
@@ -36,5 +39,43 @@ def test_cluster_rand():
 
    assert minmindis < thresh * 1.1  # arbitrary, failure should be really rare
 
+def dock_like_points(n, ncen=30, spread=30.0, seed=0):
+   # random docks, rows of ncen 4d points as in filter_redundancy, clustered around 100 modes
+   rng = np.random.default_rng(seed)
+   cen = rng.normal(size=(ncen, 4)) * 10
+   cen[:, 3] = 1
+   modes = rng.normal(size=(100, 3)) * spread
+   pos = rng.normal(size=(n, 3)) * spread / 5 + modes[rng.integers(100, size=n)]
+   crd = cen[None] + np.concatenate([pos, np.zeros((n, 1))], axis=1)[:, None]
+   crd[:, :, :3] += rng.normal(size=(n, ncen, 3)) * 0.3
+   return crd.reshape(n, -1)
+
+def test_cookie_cutter_grid_docks():
+   ncen = 30
+   crd = dock_like_points(5000, ncen)
+   for redundancy in [1.0, 3.0, 6.0]:
+      thresh = redundancy * np.sqrt(ncen)
+      assert np.all(cookie_cutter(crd, thresh) == cookie_cutter_grid(crd, thresh))
+      crd32 = crd.astype('f4')
+      assert np.all(cookie_cutter(crd32, thresh) == cookie_cutter_grid(crd32, thresh))
+   assert len(cookie_cutter_grid(crd[:0], 1.0)) == 0
+
+# timing only, not collected by pytest, test_cookie_cutter_grid_docks checks correctness
+def bench_cookie_cutter_grid(ndock=(10_000, ), ncen=30, redundancy=3.0, check=True):
+   for n in ndock:
+      crd = dock_like_points(n, ncen)
+      thresh = redundancy * np.sqrt(ncen)
+      t = rp.Timer().start()
+      keep = cookie_cutter_grid(crd, thresh)
+      t.checkpoint('grid')
+      msg = f'cookie_cutter ndock {n:9,} nkeep {len(keep):9,} grid {t.sum.grid:7.3f}s'
+      if check:
+         assert np.all(keep == cookie_cutter(crd, thresh))
+         t.checkpoint('brute')
+         msg += f' brute force {t.sum.brute:7.3f}s speedup {t.sum.brute / t.sum.grid:6.1f}x'
+      print(msg)
+
 if __name__ == "__main__":
    test_cluster_rand()
+   test_cookie_cutter_grid_docks()
+   bench_cookie_cutter_grid([100_000, 300_000, 1_000_000])
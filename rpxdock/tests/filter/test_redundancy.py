@@ -0,0 +1,72 @@
+import numpy as np, rpxdock as rp
+from rpxdock.filter.redundancy import xform_redundancy
+
+def dock_xforms(n, nmode=20, cart_sd=5.0, ang_sd=0.1, seed=0):
+   # random rigid xforms clustered around nmode modes, like the output of a dock
+   np.random.seed(seed)
+   modes = rp.homog.rand_xform(nmode, cart_sd=30)
+   axis = rp.homog.rand_unit(n)
+   ang = np.random.randn(n) * ang_sd
+   x = rp.homog.hrot(axis, ang)
+   x[:, :3, 3] = np.random.randn(n, 3) * cart_sd
+   return modes[np.random.randint(nmode, size=n)] @ x
+
+def greedy_xform_brute(x, lever, weight, thresh, categories):
+   keep = list()
+   for i in range(len(x)):
+      for j in keep:
+         if categories[i] != categories[j]: continue
+         d2 = 0
+         for c in range(len(lever)):
+            d2cart, d2ori = rp.geom.xform_dist2_split(x[i, c], x[j, c], lever[c])
+            d2 += weight[c] * (d2cart[0, 0] + d2ori[0, 0])
+         if d2 <= thresh**2: break
+      else:
+         keep.append(i)
+   return np.array(keep)
+
+def test_cookie_cutter_xform_brute():
+   x = dock_xforms(600).reshape(-1, 2, 4, 4)
+   cat = np.random.randint(2, size=len(x))
+   lever, weight = np.array([10.0, 20.0]), np.array([0.3, 0.7])
+   for thresh in [1.0, 3.0, 6.0]:
+      keep = rp.cluster.cookie_cutter_xform(x.reshape(-1, 4, 4), cat, lever, weight, thresh)
+      assert np.all(keep == greedy_xform_brute(x, lever, weight, thresh, cat))
+      x32 = x.astype('f4')
+      keep32 = rp.cluster.cookie_cutter_xform(x32.reshape(-1, 4, 4), cat, lever.astype('f4'),
+                                              weight.astype('f4'), np.float32(thresh))
+      assert np.all(keep == keep32)
+
+def test_xform_redundancy_vs_coords():
+   body = rp.data.get_body('DHR14')
+   xforms = dock_xforms(3000)
+   scores = np.random.rand(len(xforms))
+   kw = rp.Bunch(max_bb_redundancy=3.0, max_cluster=len(xforms))
+   icrd = rp.filter_redundancy(xforms, body, scores, **kw)
+   ixf = rp.filter_redundancy(xforms, body, scores, redundancy_method='xform', **kw)
+   assert abs(len(ixf) / len(icrd) - 1) < 0.1
+
+   # xform metric agrees with rms distance between transformed body centroids, within
+   # the anisotropy of the body (DHR14 is long, worst case here)
+   x = dock_xforms(400, nmode=1, cart_sd=2, ang_sd=0.05)
+   crd = x[:, None] @ body.cen[::10, :, None]
+   rms = np.sqrt(np.mean(np.sum((crd[0::2] - crd[1::2])**2, axis=(2, 3)), axis=1))
+   for k, r in enumerate(rms):
+      assert len(xform_redundancy(x[2 * k:2 * k + 2], [body], r * 1.3)) == 1
+      assert len(xform_redundancy(x[2 * k:2 * k + 2], [body], r * 0.8)) == 2
+
+def test_xform_redundancy_multicomp():
+   bodies = [rp.data.get_body('DHR14'), rp.data.get_body('top7')]
+   xforms = dock_xforms(2000).reshape(-1, 2, 4, 4)
+   scores = np.random.rand(len(xforms))
+   kw = rp.Bunch(max_bb_redundancy=3.0, max_cluster=len(xforms))
+   icrd = rp.filter_redundancy(xforms, bodies, scores, **kw)
+   ixf = rp.filter_redundancy(xforms, bodies, scores, redundancy_method='xform', **kw)
+   assert abs(len(ixf) / len(icrd) - 1) < 0.1
+   assert len(rp.filter_redundancy(xforms[:0], bodies, scores[:0], redundancy_method='xform',
+                                   **kw)) == 0
+
+if __name__ == '__main__':
+   test_cookie_cutter_xform_brute()
+   test_xform_redundancy_vs_coords()
+   test_xform_redundancy_multicomp()
@@ -0,0 +1,82 @@
+import numpy as np, rpxdock as rp
+from rpxdock.filter import sscount
+
+def test_ss_elements():
+   ss = np.array(list('LLHHHHHLLEEELHHHL'))
+   start, end, sstype = sscount.ss_elements(ss)
+   # runs shorter than the minimum length and the final run are not elements
+   assert list(start) == [0, 2, 7, 9, 12]
+   assert list(end) == [1, 6, 8, 11, 12]
+   assert ''.join(sstype) == 'LHLEL'
+   start, end, sstype = sscount.ss_elements(ss, min_helix_length=4, min_loop_length=2)
+   assert ''.join(sstype) == 'LHLE'
+
+def sscount_reference(body1, body2, pairs, lbub, min_helix_length=4, min_sheet_length=3,
+                      min_loop_length=1, min_element_resis=1, sstype="EHL", strict=False):
+   # one dock at a time, like the original filter_sscount loop
+   elems = list()
+   for body in (body1, body2):
+      ssmap = sscount.secondary_structure_map()
+      ssmap.map_body_ss(body, min_helix_length, min_sheet_length, min_loop_length)
+      elems.append(
+         list(zip(ssmap.ss_element_start, ssmap.ss_element_end, ssmap.ss_type_assignments)))
+   nres = body1.asym_body.nres, body2.asym_body.nres
+
+   def count(res, elem):
+      counts, resis = dict(E=0, H=0, L=0), np.array([])
+      for start, end, t in elem:
+         inelem = res[(res >= start + 1) & (res <= end + 1)]
+         if t in sstype and len(inelem) >= min_element_resis:
+            resis = np.append(resis, inelem)
+            counts[t] += 1
+      return counts, resis
+
+   result = list()
+   for lb, ub in lbub:
+      p = pairs[lb:ub]
+      r = dict()
+      for c, i, j in [('A', 0, 1), ('B', 1, 0)]:
+         counts, resis = count(np.unique(p[:, i]), elems[i])
+         paired = np.unique(p[np.isin(p[:, i], resis), j]) % nres[j]
+         r[c] = dict(counts, resis=resis % nres[i], paired_resis=paired)
+      if strict:
+         # residues count only if paired with a residue counted on the other side
+         countA, resisA = count(r['B']['paired_resis'], elems[0])
+         countB, resisB = count(r['A']['paired_resis'], elems[1])
+         r['A'] = dict(countA, resis=resisA, paired_resis=resisB)
+         r['B'] = dict(countB, resis=resisB, paired_resis=resisA)
+      r['total_count'] = sum(r[c][t] for c in 'AB' for t in 'EHL')
+      result.append(r)
+   return result
+
+def test_filter_sscount_vs_reference():
+   body1 = rp.data.get_body('DHR14').copy_with_sym('C3', [0, 0, 1])
+   body2 = rp.data.get_body('top7').copy_with_sym('C2', [1, 0, 0])
+   np.random.seed(0)
+   pos1 = rp.homog.rand_xform(100, cart_sd=3)
+   pos2 = rp.homog.rand_xform(100, cart_sd=3)
+   pos2[:, :3, 3] += [30, 0, 0]
+   pairs, lbub = rp.bvh.bvh_collect_pairs_vec(body1.bvh_cen, body2.bvh_cen, pos1, pos2, 8.0)
+   assert np.sum(lbub[:, 1] > lbub[:, 0]) > 50
+   for strict in (False, True):
+      for min_element_resis in (1, 3):
+         kw = dict(strict=strict, min_element_resis=min_element_resis, sstype='EH')
+         ref = sscount_reference(body1, body2, pairs, lbub, **kw)
+         cols = sscount.filter_sscount(body1, body2, pos1, pos2, columnar=True, **kw)
+         counts = sscount.filter_sscount(body1, body2, pos1, pos2, **kw)
+         dicts = sscount.filter_sscount(body1, body2, pos1, pos2, simple=False, **kw)
+         for i, r in enumerate(ref):
+            assert counts[i] == r['total_count'] == cols.total_count[i]
+            assert dicts[i]['total_count'] == r['total_count']
+            for j, c in enumerate('AB'):
+               assert list(cols.counts[i, j]) == [r[c][t] for t in 'EHL']
+               for k in ('resis', 'paired_resis'):
+                  assert np.all(dicts[i][c][k] == r[c][k])
+                  assert len(dicts[i][c][k]) == len(r[c][k])
+         ok = sscount.filter_sscount(body1, body2, pos1, pos2, confidence=1, min_ss_count=4,
+                                     **kw)
+         assert np.all(ok == (counts >= 4))
+
+if __name__ == '__main__':
+   test_ss_elements()
+   test_filter_sscount_vs_reference()
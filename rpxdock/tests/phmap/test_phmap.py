@@ -1,4 +1,4 @@
-import os, _pickle
+import os, _pickle, pytest
 import numpy as np
 from rpxdock import phmap
 
@@ -86,6 +86,26 @@ def test_phmap_dump_load(tmpdir):
    assert np.all(phm2[k] == v)
    assert np.all(phm2[k[shuf]] == v[shuf])
 
+@pytest.mark.parametrize("compression", ["", "gzip", "bz2", "xz"])
+def test_phmap_dump_load_binary(tmpdir, compression):
+   phm = phmap.PHMap_u8f4()
+   k = np.unique(np.random.randint(0, 2**64, 10000, dtype="u8"))
+   v = np.random.rand(len(k)).astype("f4")
+   phm[k] = v
+   phm.default = -1
+   fname = os.path.join(tmpdir, "foo.bin")
+   phm.dump(fname, compression=compression, chunk_size=999)
+   phm2 = phmap.PHMap_u8f4.load(fname)
+   assert phm2 == phm
+   assert phm2.default == -1
+   with pytest.raises(RuntimeError):
+      phmap.PHMap_u8f8.load(fname)
+
+   with open(fname, "wb") as out:  # open file objects work too
+      phmap.PHMap_u8f4().dump(out)
+   with open(fname, "rb") as inp:
+      assert len(phmap.PHMap_u8f4.load(inp)) == 0
+
 def test_phmap_cpp_roundtrip():
    N = 2
    phm = phmap.PHMap_u8u8()
@@ -149,6 +169,120 @@ def test_phmap_eq():
    phm2[ua([1, 2])] = fa([4, 5])
    assert phm != phm2
 
+def test_frozen_map():
+   N = 10000
+   phm = phmap.PHMap_u8f8()
+   k = np.unique(np.random.randint(0, 2**64, N, dtype="u8"))
+   v = np.random.rand(len(k))
+   phm[k] = v
+   phm.default = -1
+   fz = phmap.freeze(phm)
+   assert len(fz) == len(phm)
+   assert fz.capacity > len(fz)
+   assert fz.default == -1
+   assert np.all(fz[k] == v)
+   shuf = np.argsort(np.random.rand(len(k)))
+   assert np.all(fz[k[shuf]] == v[shuf])
+   missing = np.random.randint(0, 2**64, N, dtype="u8")
+   assert np.all(fz[missing] == phm[missing])
+   assert np.all(fz.has(missing) == phm.has(missing))
+   assert k in fz
+   assert int(k[7]) in fz
+   assert fz[int(k[7])] == v[7]
+   fk, fv = fz.items_array()
+   assert set(fk) == set(k)
+   assert np.all(phm[fk] == fv)
+   assert fz == phmap.FrozenMap_u8f8.from_items(k[shuf], v[shuf], -1, load_factor=0.5)
+   assert fz != phmap.FrozenMap_u8f8.from_items(k[1:], v[1:], -1)
+   assert _pickle.loads(_pickle.dumps(fz)) == fz
+   with pytest.raises(RuntimeError):
+      phmap.FrozenMap_u8f8(fz.slot_keys[::-1].copy(), fz.slot_vals, fz.capacity, len(fz),
+                           fz.empty)
+   with pytest.raises(RuntimeError):
+      phmap.FrozenMap_u8f8.from_items(k[[0, 0]], v[:2])
+
+def test_frozen_map_empty_key():
+   # the unused slot marker is max key + 1, a plausible neighboring xbin key
+   phm = phmap.PHMap_u8f8()
+   k = np.arange(100, 200, dtype="u8")
+   phm[k] = np.arange(1, 101, dtype="f8")
+   phm.default = -1
+   for fz in (phmap.freeze(phm), phmap.quantize(phm, "u1"), phmap.quantize(phm, "u2")):
+      assert fz.empty == 200
+      empty = np.array([fz.empty], dtype="u8")
+      assert fz[empty][0] == -1
+      assert fz[int(fz.empty)] == -1
+      assert not fz.has(empty)[0]
+      assert fz.empty not in fz
+
+def test_frozen_map_batch():
+   # lookups are batched with prefetch ahead, check runs shorter and longer than the distance
+   rng = np.random.RandomState(0)
+   phm = phmap.PHMap_u8f8()
+   k = np.unique(rng.randint(0, 2**64, 1000, dtype="u8"))
+   phm[k] = rng.rand(len(k))
+   phm.default = -1
+   fz, q = phmap.freeze(phm), phmap.quantize(phm, "u2")
+   assert len(phmap.freeze(phmap.PHMap_u8f8())[k]) == len(k)
+   for n in (0, 1, 15, 16, 17, 1000):
+      keys = np.where(rng.rand(n) < 0.5, k[:n], k[:n] + 1)
+      keys[::7] = fz.empty  # unused slot marker, never a hit
+      assert np.all(fz[keys] == phm[keys])
+      assert np.all((q[keys] == -1) == (phm[keys] == -1))
+
+def test_frozen_dump_load(tmpdir):
+   phm = phmap.PHMap_u8u8()
+   k = np.unique(np.random.randint(0, 2**64, 1000, dtype="u8"))
+   v = np.random.randint(0, 2**64, len(k), dtype="u8")
+   phm[k] = v
+   fname = os.path.join(tmpdir, "foo.frozen")
+   phmap.dump_frozen(phm, fname, meta=dict(foo="bar"))
+   for mmap in (True, False):
+      fz, meta = phmap.load_frozen(fname, mmap=mmap)
+      assert meta == dict(foo="bar")
+      assert isinstance(fz, phmap.FrozenMap_u8u8)
+      assert len(fz) == len(phm)
+      assert np.all(fz[k] == v)
+      assert fz.slot_keys.flags.writeable != mmap  # read-only mapped file
+
+@pytest.mark.parametrize("dtype", ["u1", "u2"])
+def test_quantize(tmpdir, dtype):
+   phm = phmap.PHMap_u8f8()
+   phm.default = -0.123
+   k = np.unique(np.random.randint(0, 2**64, 10000, dtype="u8"))
+   v = np.random.randn(len(k)) * 3
+   phm[k] = v
+   q = phmap.quantize(phm, dtype)
+   assert phmap.is_quantized(q) and phmap.is_frozen(q)
+   assert q.slot_vals.dtype == np.dtype(dtype)
+   assert len(q) == len(phm)
+   assert np.isclose(q.scale, (v.max() - v.min()) / np.iinfo(dtype).max)
+   assert np.max(np.abs(q[k] - v)) <= q.scale / 2 * 1.0001
+   assert np.isclose(q[k[np.argmin(v)]], v.min())
+   missing = np.random.randint(0, 2**64, 1000, dtype="u8")
+   assert np.all(q[missing] == phm[missing])  # default is exact
+   assert np.all(q.has(missing) == phm.has(missing))
+   qk, qv = q.items_array()
+   assert set(qk) == set(k)
+   assert np.all(qv == q[qk])
+   assert phmap.quantize(q, dtype) is q
+   assert phmap.quantize(phmap.freeze(phm), dtype) == q
+   assert _pickle.loads(_pickle.dumps(q)) == q
+
+   err = phmap.quantization_error(phm, q)
+   assert err["n"] == len(k)
+   assert err["max"] <= q.scale / 2 * 1.0001
+   assert 0 < err["rms"] < err["max"]
+   assert err["step"] == q.scale
+
+   fname = os.path.join(tmpdir, "foo.frozen")
+   phmap.dump_frozen(q, fname)
+   q2, _ = phmap.load_frozen(fname)
+   assert isinstance(q2, type(q))
+   assert q2 == q
+   assert q2.default == phm.default
+   assert np.all(q2[k] == q[k])
+
 if __name__ == "__main__":
    import tempfile
 
@@ -156,6 +290,12 @@ if __name__ == "__main__":
    test_phmap_items()
    test_phmap_contains()
    test_phmap_dump_load(tempfile.mkdtemp())
+   test_phmap_dump_load_binary(tempfile.mkdtemp(), "gzip")
    test_phmap_cpp_roundtrip()
    test_phmap_items_array()
    test_phmap_eq()
+   test_frozen_map()
+   test_frozen_map_empty_key()
+   test_frozen_map_batch()
+   test_frozen_dump_load(tempfile.mkdtemp())
+   test_quantize(tempfile.mkdtemp(), "u1")
@@ -80,6 +80,26 @@ def test_compound_split():
    assert np.max(split[1]) + 1 == ch3d2.size(resl)
    # print(split)
 
+def test_compound_split_native():
+   # split_compound_indices against the numpy cell / zorder splitting
+   h = CompoundHier(ch2d3, ch3, ZeroDHier(rp.homog.rand_xform(2)), ch3d2)
+   for resl in range(4):
+      idx = np.random.randint(0, h.size(resl), 1000).astype('u8')
+      cell = h.split_indices_cell(resl, idx)
+      hier = h.split_indices_hier(resl, idx)
+      ref = [np.bitwise_or(np.left_shift(c, np.uint64(resl * d)), hh)
+             for c, hh, d in zip(cell, hier, h.dims)]
+      assert np.all(h.split_indices(resl, idx) == np.stack(ref))
+
+def test_product_xforms():
+   xparts = rp.homog.rand_xform(3 * 100).reshape(100, 3, 4, 4)
+   ref = xparts[:, 0] @ xparts[:, 1] @ xparts[:, 2]
+   assert np.allclose(product_xforms([xparts[:, i] for i in range(3)]), ref)
+   assert np.allclose(ProductHier(ch2, ch3, ch5).combine_xforms(xparts), ref)
+   assert product_xforms([xparts[:, 0].astype('f4')]).dtype == np.float32
+   assert product_xforms([xparts[:, 0].astype('f4'), xparts[:, 1]]).dtype == np.float64
+   assert np.allclose(product_xforms([xparts[:, 0]]), xparts[:, 0])
+
 def test_compound_get_xforms():
    ok, a = h3.parts[0].get_xforms(0, [0])
    ok, b = h3.get_xforms(0, [0])
@@ -4,7 +4,6 @@ import numpy as np
 import rpxdock.sampling.orientations as ori
 import pytest
 
-from cppimport import import_hook
 from rpxdock.sampling._orientations_test import *
 
 def test_orientation_cpp():
@@ -0,0 +1,26 @@
+import os, pickle, numpy as np, pytest
+from concurrent.futures import ProcessPoolExecutor
+from rpxdock.sampling import *
+
+def _sum_xforms(base_samples):
+   return base_samples.xforms.sum(), len(base_samples)
+
+def test_shared_base_samples(tmpdir):
+   sampler = CompoundHier(CartHier2D_f8([0, 0], [3, 3], [3, 3]),
+                          CartHier3D_f8([0, 0, 0], [2, 2, 2], [2, 2, 2]))
+   ok, xforms = sampler.get_xforms(0, np.arange(sampler.size(0)))
+   with SharedBaseSamples(sampler, tmpdir=str(tmpdir)) as base:
+      assert np.all(base.indices == np.arange(sampler.size(0))[ok])
+      assert np.all(base.xforms == xforms)
+      assert not base.xforms.flags.writeable
+      base.check_sampler(sampler)
+      with pytest.raises(ValueError):
+         base.check_sampler(CompoundHier(CartHier1D_f8([0], [2], [2])))
+
+      # pickles by file name, workers map the same arrays
+      assert len(pickle.dumps(base)) < 1000
+      with ProcessPoolExecutor(2) as pool:
+         result = list(pool.map(_sum_xforms, [base] * 4))
+      assert result == [(xforms.sum(), len(xforms))] * 4
+      assert os.path.exists(base.path)
+   assert not os.path.exists(base.path)
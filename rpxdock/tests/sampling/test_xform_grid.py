@@ -1,4 +1,4 @@
-from rpxdock.sampling.xform_grid import grid_sym_axis
+from rpxdock.sampling.xform_grid import grid_sym_axis, GridSymAxis
 import rpxdock.homog as hm
 import numpy as np
 
@@ -18,6 +18,19 @@ def test_grid_sym_axis_flip():
    assert grid.shape == (len(cart) * len(ang) * 2, 4, 4)
    assert 0.0001 > np.max(hm.line_angle(grid[:, :3, 3], axis))
 
+def test_grid_sym_axis_chunks():
+   cart = np.arange(-10.5, 10.6)
+   ang = np.arange(-60, 60.1, 10)
+   axis = [0, 0, 1]
+   for flip in (None, [1, 0, 0]):
+      grid = grid_sym_axis(cart=cart, ang=ang, axis=axis, flip=flip)
+      lazy = GridSymAxis(cart=cart, ang=ang, axis=axis, flip=flip, chunk_size=50)
+      chunks = list(lazy)
+      assert len(chunks) > 2 and max(len(c) for c in chunks) <= 50
+      assert len(lazy) == len(grid)
+      assert np.allclose(np.concatenate(chunks), grid)
+
 if __name__ == '__main__':
    test_grid_sym_axis()
    test_grid_sym_axis_flip()
+   test_grid_sym_axis_chunks()
@@ -1,7 +1,6 @@
 from time import perf_counter
 import itertools as it
 import numpy as np
-from cppimport import import_hook
 from rpxdock.sampling import *
 from rpxdock.bvh.bvh_nd import *
 import rpxdock.homog as hm
@@ -1,5 +1,8 @@
+import os, _pickle, pytest
+from time import perf_counter
 import numpy as np
 import rpxdock.homog as hm
+from rpxdock.xbin import xbin_util as xu
 import rpxdock
 
 def rand_xform_sphere(n, radius, maxang=0):
@@ -97,3 +100,206 @@ def test_rpxhier(hscore, N=1000):
    # print("base", hscore.base.xbin.cart_resl, hscore.base.xbin.ori_resl)
    # for h in hscore.hier:
    #     print("hier", h.xbin.cart_resl, h.xbin.ori_resl)
+
+def test_rpxhier_frozen(hscore, tmpdir):
+   hier = list()
+   for i, h in enumerate(hscore.hier[:hscore.actual_nresl]):
+      fname = os.path.join(tmpdir, f"hier{i}.frozen")
+      h.dump_frozen(fname)
+      frozen = rpxdock.Xmap.load_frozen(fname)
+      assert len(frozen) == len(h)
+      assert frozen.attr.cart_extent == h.attr.cart_extent
+      xforms = h.xforms(1000)
+      assert np.all(frozen[xforms] == h[xforms])
+      perturb = rand_xform_sphere(len(xforms), h.attr.cart_extent, h.attr.ori_extent)
+      xforms = xforms @ perturb.astype("f")
+      assert np.all(frozen[xforms] == h[xforms])
+      hier.append(frozen)
+   hfrozen = rpxdock.RpxHier([hscore.base] + hier)
+   assert hfrozen.use_ss == hscore.use_ss
+   assert hfrozen.max_pair_dist == hscore.max_pair_dist
+
+def test_rpxhier_quantized(hscore, body):
+   hier = [h.quantize("u1") for h in hscore.hier[:hscore.actual_nresl]]
+   hquant = rpxdock.RpxHier([hscore.base] + hier)
+   sampler = rpxdock.search.make_cyclic_hier_sampler(body, hscore)
+   symrot = hm.hrot([0, 0, 1], 120, degrees=True)
+   wts = rpxdock.Bunch(ncontact=0.1, rpx=1.0)
+   ok, xforms = sampler.get_xforms(0, np.arange(sampler.size(0), dtype="u8"))
+   xforms = xforms[body.clash_ok(body, xforms[ok], symrot @ xforms[ok])]
+   for iresl, h in enumerate(hier):
+      xh = hscore.hier[iresl].xforms(1000)
+      assert np.all(np.abs(h[xh] - hscore.hier[iresl][xh]) <= h.phmap.scale / 2 * 1.0001)
+      scores = hscore.scorepos(body, body, xforms, symrot @ xforms, iresl, wts=wts)
+      qscores = hquant.scorepos(body, body, xforms, symrot @ xforms, iresl, wts=wts)
+      assert np.sum(scores > 0) > 100
+      assert np.corrcoef(scores, qscores)[0, 1] > 0.99
+
+def bench_rpxhier_lookup_throughput(hscore, body, npad=20_000_000):
+   # not collected by pytest, run this file to time lookups on the key stream scoring sends to
+   # the tables: residue pairs in contact in clash free docks
+   sampler = rpxdock.search.make_cyclic_hier_sampler(body, hscore)
+   symrot = hm.hrot([0, 0, 1], 120, degrees=True)
+   ok, xforms = sampler.get_xforms(1, np.arange(sampler.size(1), dtype="u8"))
+   xforms = xforms[ok]
+   pos1 = xforms[body.clash_ok(body, xforms, symrot @ xforms)][:2000]
+   pos2 = symrot @ pos1
+   h = hscore.hier[1]
+   pairs, lbub = rpxdock.bvh.bvh_collect_pairs_range_vec(body.bvh_cen, body.bvh_cen, pos1, pos2,
+                                                         hscore.max_pair_dist[1])
+   # pad the table with random keys to a size that doesn't fit in cache
+   phm = rpxdock.phmap.PHMap_u8f8()
+   keys, vals = h.phmap.items_array()
+   phm[keys] = vals
+   phm[np.random.randint(0, 2**63, npad, dtype="u8")] = np.random.rand(npad)
+   maps = dict(phmap=phm, frozen=rpxdock.phmap.freeze(phm), u1=rpxdock.phmap.quantize(phm, "u1"))
+   ref = xu.map_pairs_multipos(h.xbin, phm, pairs, body.stub, body.stub, lbub, pos1, pos2)
+   assert np.sum(ref != 0) > 100
+   for name, m in maps.items():
+      t = perf_counter()
+      pscore = xu.map_pairs_multipos(h.xbin, m, pairs, body.stub, body.stub, lbub, pos1, pos2)
+      t = perf_counter() - t
+      if name == "u1": assert np.all(np.abs(pscore - ref) <= m.scale / 2 * 1.0001)
+      else: assert np.all(pscore == ref)
+      print(f"{name:6} table {len(m):,} map_pairs_multipos {len(pairs) / t / 1e6:6.2f}M pairs/s")
+
+def test_rpxhier_share(hscore, tmpdir):
+   hier = rpxdock.RpxHier([hscore.base] + hscore.hier[:hscore.actual_nresl])
+   hier.share(str(tmpdir))
+   assert len(hier.hier) == len(hscore.hier)
+   assert all(h.frozen_file for h in hier.hier)
+   assert hier.base.frozen_file
+   # shared tables pickle as file names and unpickle to one mmap'd copy per process
+   pickled = _pickle.dumps(hier)
+   assert len(pickled) < len(_pickle.dumps(hscore)) / 10
+   hier2 = _pickle.loads(pickled)
+   hier3 = _pickle.loads(pickled)
+   assert hier2.base is hier3.base
+   assert all(a is b for a, b in zip(hier2.hier, hier3.hier))
+   assert hier2.hier[-1] is hier2.hier[hscore.actual_nresl - 1]
+   for h, h2 in zip(hscore.hier, hier2.hier):
+      xforms = h.xforms(1000)
+      xforms = xforms @ rand_xform_sphere(len(xforms), h.attr.cart_extent,
+                                          h.attr.ori_extent).astype("f")
+      assert np.all(h[xforms] == h2[xforms])
+   keys = hscore.base.keys[:1000]
+   assert np.all(hier2.base.bin_score(keys) == hscore.base.bin_score(keys))
+   assert np.all(hier2.base.stub == hscore.base.stub)
+   assert hier2.use_ss == hscore.use_ss
+
+def test_rpxhier_lazy():
+   hscore = rpxdock.RpxHier("small_ilv_h", hscore_data_dir=rpxdock.data.hscoredir)
+   nfiles = hscore.actual_nresl + 1
+   report = hscore.memory_report()
+   assert not report.loaded and len(report.not_loaded) == nfiles
+   assert report.bytes_not_loaded > 0
+   # pickles as file names while nothing is loaded
+   hscore2 = _pickle.loads(_pickle.dumps(hscore))
+   assert len(_pickle.dumps(hscore)) < 10000
+   h0 = hscore.hier[0]
+   assert hscore.hier.is_loaded(0) and not hscore.hier.is_loaded(1)
+   assert hscore.hier[0] is h0
+   assert hscore.max_pair_dist[0] == 8.0 + h0.attr.cart_extent
+   assert not hscore.hier.is_loaded(1)
+   xhresl = hscore.xhresl
+   assert not any(f.endswith("base.pickle") for f in hscore.memory_report().loaded)
+   assert np.allclose(xhresl, hscore.base.attr.xhresl)
+   assert hscore.hier[-1] is hscore.hier[hscore.actual_nresl - 1]
+   hscore.preload()
+   assert len(hscore.memory_report().loaded) == nfiles
+   assert not hscore.memory_report().not_loaded
+   assert hscore2.max_pair_dist == hscore.max_pair_dist
+   for h, h2 in zip(hscore.hier[:hscore.actual_nresl], hscore2.hier):
+      xforms = h.xforms(1000)
+      assert np.all(h[xforms] == h2[xforms])
+
+def test_rpxhier_score_by_resl(hscore):
+   lazy = rpxdock.RpxHier("small_ilv_h", hscore_data_dir=rpxdock.data.hscoredir)
+   nresl = hscore.actual_nresl
+   resls = np.array(hscore.resl[:nresl])
+   for iresl in range(nresl):
+      xforms = hscore.hier[iresl].xforms(100)
+      for resl in [resls[iresl], resls[iresl] * 1.05, resls[iresl] * 0.95]:
+         expect = hscore.hier[np.argmin(np.abs(resl - resls))][xforms]
+         assert np.all(lazy.score_by_resl(resl, xforms) == expect)
+   # only level 0, for its extent, and the level used are loaded
+   lazy = rpxdock.RpxHier("small_ilv_h", hscore_data_dir=rpxdock.data.hscoredir)
+   lazy.score_by_resl(resls[2], hscore.hier[2].xforms(10))
+   assert lazy.hier.is_loaded(0) and lazy.hier.is_loaded(2)
+   assert len(lazy.hier.loaded_files()) == 2
+   with pytest.raises(ValueError):
+      lazy.score_by_resl(resls[0] * 3, hscore.hier[2].xforms(10))
+
+def test_rpxhier_skip_base():
+   hscore = rpxdock.RpxHier("small_ilv_h", hscore_data_dir=rpxdock.data.hscoredir,
+                            skip_hscore_base=True)
+   hscore.preload(base=True)
+   report = hscore.memory_report()
+   assert len(report.loaded) == hscore.actual_nresl
+   assert len(report.not_loaded) == 1 and report.not_loaded[0].endswith("base.pickle")
+   assert report.bytes_not_loaded == os.path.getsize(report.not_loaded[0])
+   with pytest.raises(ValueError):
+      hscore.base
+   assert np.allclose(hscore.xhresl, rpxdock.data.small_hscore().base.attr.xhresl)
+
+def test_rpxhier_reuse_contacts(hscore, body):
+   reuse = rpxdock.RpxHier([hscore.base] + hscore.hier[:hscore.actual_nresl], reuse_contacts=True)
+   assert not hscore.reuse_contacts and reuse.reuse_contacts
+   sampler = rpxdock.search.make_cyclic_hier_sampler(body, hscore)
+   symrot = hm.hrot([0, 0, 1], 120, degrees=True)
+   wts = rpxdock.Bunch(ncontact=0.1, rpx=1.0)
+   idx = np.arange(sampler.size(0), dtype="u8")
+   ok, xforms = sampler.get_xforms(0, idx)
+   idx = idx[ok]
+   for iresl in range(hscore.actual_nresl):
+      ok = body.clash_ok(body, xforms, symrot @ xforms)
+      idx, xforms = idx[ok], xforms[ok]
+      # scored in expansion order, so siblings are consecutive as in hier_search
+      scores = hscore.scorepos(body, body, xforms, symrot @ xforms, iresl, wts=wts)
+      scores2 = reuse.scorepos(body, body, xforms, symrot @ xforms, iresl, wts=wts)
+      assert np.sum(scores > 0) > 100
+      assert np.allclose(scores, scores2, atol=1e-4)
+      idx, xforms = sampler.expand_top_N(100, iresl, scores, idx)
+
+def test_rpxhier_fused_scorepos(hscore, body):
+   fused = rpxdock.RpxHier([hscore.base] + hscore.hier[:hscore.actual_nresl], fused_scorepos=True)
+   assert not hscore.fused_scorepos and fused.fused_scorepos
+   sampler = rpxdock.search.make_cyclic_hier_sampler(body, hscore)
+   symrot = hm.hrot([0, 0, 1], 120, degrees=True)
+   wts = rpxdock.Bunch(ncontact=0.1, rpx=1.0)
+   idx = np.arange(sampler.size(0), dtype="u8")
+   ok, xforms = sampler.get_xforms(0, idx)
+   xforms = xforms[ok]
+   xforms = xforms[body.clash_ok(body, xforms, symrot @ xforms)]
+   for iresl in range(hscore.actual_nresl):
+      scores = hscore.scorepos(body, body, xforms, symrot @ xforms, iresl, wts=wts)
+      scores2 = fused.scorepos(body, body, xforms, symrot @ xforms, iresl, wts=wts)
+      assert np.sum(scores > 0) > 100
+      assert np.allclose(scores, scores2)
+
+def bench_rpxhier_fused_scorepos(hscore, body, nthreads=(1, 2, 4, 0), iresl=0):
+   # not collected by pytest, run this file to time fused vs unfused scorepos on all the clash
+   # free iresl 0 docks, at each thread count
+   fused = rpxdock.RpxHier([hscore.base] + hscore.hier[:hscore.actual_nresl], fused_scorepos=True)
+   sampler = rpxdock.search.make_cyclic_hier_sampler(body, hscore)
+   symrot = hm.hrot([0, 0, 1], 120, degrees=True)
+   wts = rpxdock.Bunch(ncontact=0.1, rpx=1.0)
+   ok, xforms = sampler.get_xforms(iresl, np.arange(sampler.size(iresl), dtype="u8"))
+   xforms = xforms[ok]
+   xforms = xforms[body.clash_ok(body, xforms, symrot @ xforms)]
+   ref = hscore.scorepos(body, body, xforms, symrot @ xforms, iresl, wts=wts, nthread=1)
+   assert np.sum(ref > 0) > 100
+   for nthread in nthreads:
+      t = dict()
+      for name, h in (('unfused', hscore), ('fused', fused)):
+         t[name] = perf_counter()
+         scores = h.scorepos(body, body, xforms, symrot @ xforms, iresl, wts=wts, nthread=nthread)
+         t[name] = perf_counter() - t[name]
+         assert np.all(scores == ref)
+      print(f"scorepos iresl {iresl} ndock {len(xforms):,} nthread {nthread:3} " +
+            f"unfused {t['unfused']:7.3f}s fused {t['fused']:7.3f}s " +
+            f"speedup {t['unfused'] / t['fused']:5.2f}x")
+
+if __name__ == "__main__":
+   bench_rpxhier_lookup_throughput(rpxdock.data.small_hscore(), rpxdock.data.get_body("DHR14"))
+   bench_rpxhier_fused_scorepos(rpxdock.data.small_hscore(), rpxdock.data.get_body("DHR14"))
@@ -0,0 +1,157 @@
+import warnings, numpy as np, rpxdock as rp
+from rpxdock.score import score_functions as sfx
+
+# per-dock python loop versions of score_functions, the reference for the vectorized ones
+
+def loop_stnd(pos1, pos2, lbub, lbub1, lbub2, ressc1, ressc2, **kw):
+   kw = rp.Bunch(kw)
+   scores = np.zeros(max(len(pos1), len(pos2)))
+   for i, (lb, ub) in enumerate(lbub):
+      side1 = np.sum(ressc1[lbub1[i, 0]:lbub1[i, 1]])
+      side2 = np.sum(ressc2[lbub2[i, 0]:lbub2[i, 1]])
+      mscore = (side1 + side2)
+      scores[i] = kw.wts.rpx * mscore + kw.wts.ncontact * (ub - lb)
+   return scores
+
+def loop_mean(pos1, pos2, lbub, lbub1, lbub2, ressc1, ressc2, **kw):
+   kw = rp.Bunch(kw)
+   scores = np.zeros(max(len(pos1), len(pos2)))
+   for i, (lb, ub) in enumerate(lbub):
+      side1 = np.mean(ressc1[lbub1[i, 0]:lbub1[i, 1]])
+      side2 = np.mean(ressc2[lbub2[i, 0]:lbub2[i, 1]])
+      mscore = (side1 + side2) / 2
+      scores[i] = kw.wts.rpx * mscore + kw.wts.ncontact * (ub - lb)
+   return scores
+
+def loop_median(pos1, pos2, lbub, lbub1, lbub2, ressc1, ressc2, **kw):
+   kw = rp.Bunch(kw)
+   scores = np.zeros(max(len(pos1), len(pos2)))
+   for i, (lb, ub) in enumerate(lbub):
+      side1 = np.median(ressc1[lbub1[i, 0]:lbub1[i, 1]])
+      side2 = np.median(ressc2[lbub2[i, 0]:lbub2[i, 1]])
+      mscore = (side1 + side2) / 2
+      scores[i] = kw.wts.rpx * mscore + kw.wts.ncontact * (ub - lb)
+   return scores
+
+def loop_exp(pos1, pos2, lbub, lbub1, lbub2, ressc1, ressc2, **kw):
+   scores = np.zeros(max(len(pos1), len(pos2)))
+   for i, (lb, ub) in enumerate(lbub):
+      side1 = np.sum(ressc1[lbub1[i, 0]:lbub1[i, 1]])
+      side2 = np.sum(ressc2[lbub2[i, 0]:lbub2[i, 1]])
+      mscore = (side1 + side2)
+      scores[i] = mscore - (4.6679 * ((ub - lb)**0.588))
+   return scores
+
+def loop_lin(pos1, pos2, lbub, lbub1, lbub2, ressc1, ressc2, **kw):
+   scores = np.zeros(max(len(pos1), len(pos2)))
+   for i, (lb, ub) in enumerate(lbub):
+      side1 = np.sum(ressc1[lbub1[i, 0]:lbub1[i, 1]])
+      side2 = np.sum(ressc2[lbub2[i, 0]:lbub2[i, 1]])
+      mscore = (side1 + side2)
+      scores[i] = mscore - (0.7514 * (ub - lb))
+   return scores
+
+def loop_fun2(pos1, pos2, lbub, lbub1, lbub2, ressc1, ressc2, **kw):
+   kw = rp.Bunch(kw)
+   scores = np.zeros(max(len(pos1), len(pos2)))
+   a, mu, sigma = 300, 75, 50
+   b = np.log(mu**2 / np.sqrt(mu**2 + sigma**2))
+   c = np.log(1 + (sigma**2 / mu**2))
+   for i, (lb, ub) in enumerate(lbub):
+      if (ub - lb) > 0:
+         side1 = np.mean(ressc1[lbub1[i, 0]:lbub1[i, 1]])
+         side2 = np.mean(ressc2[lbub2[i, 0]:lbub2[i, 1]])
+         mscore = (side1 + side2) / 2
+         ncont_score = (a / (c * np.sqrt(2 * np.pi) * (ub - lb))) * np.exp(
+            -(np.log(ub - lb) - b)**2 / (2 * c**2))
+         scores[i] = kw.wts.rpx * mscore + ncont_score
+   return scores
+
+def loop_sasa_priority(pos1, pos2, lbub, lbub1, lbub2, ressc1, ressc2, **kw):
+   kw = rp.Bunch(kw)
+   scores = np.zeros(max(len(pos1), len(pos2)))
+   sasa, sigma, a = kw.wts.sasa, kw.wts.error, kw.wts.ncontact
+   m = np.exp((-sigma**2.22215285) / 28.59075188)
+   mu = (sasa) / m
+   mu = (mu - 14.2198) / 21.522
+   sigma = mu * sigma * 0.2433619617913417
+   mode = (sasa - 14.2198) / 21.522
+   b = np.log(mu**2 / np.sqrt(mu**2 + sigma**2))
+   c = np.log(1 + (sigma**2 / mu**2))
+   prob_max = (1 / (c * np.sqrt(2 * np.pi) *
+                    (mode))) * np.exp(-(np.log(mode) - b)**2 / (2 * c**2))
+   for i, (lb, ub) in enumerate(lbub):
+      if (ub - lb) > 0:
+         side1 = np.mean(ressc1[lbub1[i, 0]:lbub1[i, 1]])
+         side2 = np.mean(ressc2[lbub2[i, 0]:lbub2[i, 1]])
+         mscore = (side1 + side2) / 2
+         ncont_score = (a / prob_max) * (1 / (c * np.sqrt(2 * np.pi) * (ub - lb))) * np.exp(
+            -(np.log(ub - lb) - b)**2 / (2 * c**2))
+         scores[i] = kw.wts.rpx * mscore + ncont_score
+   return scores
+
+_score_functions = dict(
+   stnd=(sfx.stnd, loop_stnd),
+   mean=(sfx.mean, loop_mean),
+   median=(sfx.median, loop_median),
+   exp=(sfx.exp, loop_exp),
+   lin=(sfx.lin, loop_lin),
+   fun2=(sfx.score_fun2, loop_fun2),
+   sasa_priority=(sfx.sasa_priority, loop_sasa_priority),
+)
+
+def marginal_data(ndock, nres=200, maxpairs=300, seed=0):
+   rng = np.random.RandomState(seed)
+   npairs = rng.randint(0, maxpairs, ndock)
+   npairs[::7] = 0
+   ub = np.cumsum(npairs)
+   lbub = np.stack([ub - npairs, ub], axis=1).astype('i4')
+   pairs = rng.randint(0, nres, (ub[-1], 2)).astype('i4')
+   pscore = rng.randn(len(pairs)) * 3
+   pscore[rng.rand(len(pairs)) < 0.3] = 0
+   lbub1, lbub2, idx1, idx2, ressc1, ressc2 = rp.motif.marginal_max_score(lbub, pairs, pscore)
+   pos = np.tile(np.eye(4), (ndock, 1, 1))
+   return pos, pos, lbub, lbub1, lbub2, ressc1, ressc2
+
+def test_score_functions_match_loop():
+   data = marginal_data(2000)
+   wts = rp.Bunch(rpx=1.3, ncontact=0.1, sasa=1500, error=4)
+   for name, (vecfun, loopfun) in _score_functions.items():
+      with warnings.catch_warnings():
+         warnings.simplefilter('ignore')
+         ref = loopfun(*data, wts=wts, iresl=0)
+         with np.errstate(all='ignore'):
+            vec = vecfun(*data, wts=wts, iresl=0)
+      assert vec.shape == ref.shape
+      np.testing.assert_array_equal(vec, ref, err_msg=name)
+
+def test_score_functions_empty():
+   data = marginal_data(1)
+   data = data[0][:0], data[1][:0], data[2][:0], data[3][:0], data[4][:0], data[5], data[6]
+   wts = rp.Bunch(rpx=1.0, ncontact=0.1, sasa=1500, error=4)
+   for name, (vecfun, loopfun) in _score_functions.items():
+      assert len(vecfun(*data, wts=wts, iresl=0)) == 0
+
+# timing only, not collected by pytest. run this file to see it
+def bench_score_functions(ndock=20000):
+   data = marginal_data(ndock, maxpairs=100)
+   wts = rp.Bunch(rpx=1.0, ncontact=0.1, sasa=1500, error=4)
+   t = rp.Timer().start()
+   for name, (vecfun, loopfun) in _score_functions.items():
+      with warnings.catch_warnings():
+         warnings.simplefilter('ignore')
+         t.checkpoint('none')
+         loopfun(*data, wts=wts, iresl=0)
+         t.checkpoint(name + '_loop')
+         with np.errstate(all='ignore'):
+            vecfun(*data, wts=wts, iresl=0)
+         t.checkpoint(name)
+   for name in _score_functions:
+      tloop, tvec = sum(t.alltimes(name + '_loop')), sum(t.alltimes(name))
+      print(f'{name:>14} ndock {ndock:,} loop {ndock / tloop:12,.0f}/s',
+            f'vectorized {ndock / tvec:14,.0f}/s speedup {tloop / tvec:7.1f}x')
+
+if __name__ == '__main__':
+   test_score_functions_match_loop()
+   test_score_functions_empty()
+   bench_score_functions()
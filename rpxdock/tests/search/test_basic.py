@@ -0,0 +1,29 @@
+import numpy as np, pytest, rpxdock as rp
+
+def test_stream_grid_search(hscore, body):
+   kw = rp.app.defaults()
+   kw.wts = rp.Bunch(ncontact=0.1, rpx=1.0)
+   kw.max_trim = 0
+   kw.max_longaxis_dot_z = 0.5
+   xgrid = rp.search.make_cyclic_grid_sampler(body, cart_resl=3, ori_resl=20)
+   evaluator = rp.search.CyclicEvaluator(body, 'C3', hscore, **kw)
+   xforms, scores, extra, stats = rp.grid_search(xgrid, evaluator, **kw)
+
+   chunks = np.array_split(xgrid, 7)
+   sxforms, sscores, sextra, sstats = rp.grid_search(chunks, evaluator, **kw.sub(grid_topk=100))
+   assert sstats.ntot == stats.ntot == len(xgrid)
+   assert len(sstats.neval) == 7
+   assert len(sscores) == 100
+   # survivors are the top 100 of the full grid, in grid order
+   assert np.allclose(np.sort(sscores), np.sort(scores)[-100:])
+   idx = np.array([np.argmax(np.all(np.isclose(xforms, x), axis=(1, 2))) for x in sxforms])
+   assert np.all(np.diff(idx) > 0)
+   assert np.allclose(scores[idx], sscores)
+   assert np.all(extra.reslb[idx] == sextra.reslb)
+
+   min_score = np.sort(scores)[-300]
+   kw2 = kw.sub(grid_topk=10, grid_min_score=min_score)
+   _, sscores, *_ = rp.grid_search(chunks, evaluator, **kw2)
+   assert len(sscores) == np.sum(scores >= min_score)
+   with pytest.raises(ValueError):
+      rp.grid_search(chunks, evaluator, **kw)
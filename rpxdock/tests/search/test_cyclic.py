@@ -1,4 +1,4 @@
-import concurrent, os, argparse, sys, numpy as np, rpxdock as rp, pytest
+import concurrent, os, argparse, sys, json, numpy as np, rpxdock as rp, pytest
 from rpxdock.search import grid_search
 
 def get_arg():
@@ -51,6 +51,26 @@ def test_make_cyclic_hier_trim(hscore, body):
    ref = rp.data.get_test_data('test_make_cyclic_hier_trim')
    rp.search.assert_results_close(result, ref)
 
+def test_make_cyclic_profile(hscore, body, tmpdir):
+   kw = get_arg()
+   kw.max_trim = 0
+   kw.beam_size = 2000
+   kw.profile = True
+   kw.profile_trace = os.path.join(tmpdir, 'trace_')
+   result = rp.search.make_cyclic(body, "C3", hscore, **kw)
+   prof = result.attrs['profile']
+   for stage in 'expand_samples flatness clash_ok scorepos map_marginal_max score_function'.split():
+      assert prof[stage]['ncalls'] > 0
+   assert prof['expand_samples']['ncalls'] == hscore.actual_nresl
+   assert prof['scorepos']['time'] >= prof['map_marginal_max']['time']
+   with open(result.attrs['profile_trace']) as inp:
+      trace = json.load(inp)
+   assert len(trace['traceEvents']) == sum(p['ncalls'] for p in prof.values())
+
+   kw.profile = False
+   result = rp.search.make_cyclic(body, "C3", hscore, **kw)
+   assert 'profile' not in result.attrs
+
 # def test_make_cyclic_grid(hscore, body):
 #    kw = rp.app.defaults()
 #    kw.wts = rp.Bunch(ncontact=0.1, rpx=0.0)
@@ -1,3 +1,5 @@
+import os, numpy as np, pytest, rpxdock as rp
+
 # from time import perf_counter
 # from rpxdock.search.hierarchical import *
 # from rpxdock.search.dockspec import DockSpec2CompCage
@@ -132,3 +134,86 @@
 #  76 76
 #  76 76
 #  75 75
+
+def get_search_args(hscore, body, beam_size=2000):
+   kw = rp.app.defaults()
+   kw.wts = rp.Bunch(ncontact=0.1, rpx=1.0)
+   kw.beam_size = beam_size
+   kw.max_trim = 0
+   kw.max_longaxis_dot_z = 0.5
+   kw.nresl = hscore.actual_nresl
+   sampler = rp.search.make_cyclic_hier_sampler(body, hscore)
+   evaluator = rp.search.CyclicEvaluator(body, 'C3', hscore, **kw)
+   return kw, sampler, evaluator
+
+class Preempted(Exception):
+   pass
+
+class PreemptedEvaluator(rp.search.CyclicEvaluator):
+   def __call__(self, xforms, iresl=-1, **kw):
+      if iresl == 2: raise Preempted
+      return super().__call__(xforms, iresl, **kw)
+
+def test_hier_search_checkpoint(hscore, body, tmpdir):
+   kw, sampler, evaluator = get_search_args(hscore, body)
+   xforms, scores, extra, stats = rp.hier_search(sampler, evaluator, **kw)
+
+   fname = os.path.join(tmpdir, 'checkpoint.npz')
+   preempted = PreemptedEvaluator(body, 'C3', hscore, **kw)
+   with pytest.raises(Preempted):
+      rp.hier_search(sampler, preempted, checkpoint=fname, **kw)
+   assert rp.search.load_hier_checkpoint(fname).iresl == 1
+
+   # resumes at iresl 2 and gets the same answer
+   xforms2, scores2, extra2, stats2 = rp.hier_search(sampler, evaluator, checkpoint=fname, **kw)
+   assert np.allclose(xforms, xforms2)
+   assert np.allclose(scores, scores2)
+   assert np.all(extra.reslb == extra2.reslb) and np.all(extra.resub == extra2.resub)
+   assert len(stats2.neval) == kw.nresl
+   assert rp.search.load_hier_checkpoint(fname).iresl == kw.nresl - 1
+
+   # a finished search is only reloaded, a different one ignores the checkpoint
+   xforms3, scores3, extra3, stats3 = rp.hier_search(sampler, None, checkpoint=fname, **kw)
+   assert np.allclose(xforms, xforms3) and np.allclose(scores, scores3)
+   assert np.all(extra.reslb == extra3.reslb)
+   key = rp.search.hier_checkpoint_key(sampler, **kw)
+   inputs = rp.search.hier_checkpoint_inputs(evaluator, kw.nresl)
+   assert rp.search.load_hier_checkpoint(fname, key, inputs).iresl == kw.nresl - 1
+   key2 = rp.search.hier_checkpoint_key(sampler, **kw.sub(beam_size=1000))
+   assert rp.search.load_hier_checkpoint(fname, key2, inputs) is None
+   key2 = rp.search.hier_checkpoint_key(sampler, **kw.sub(wts=rp.Bunch(ncontact=0.2, rpx=1.0)))
+   assert rp.search.load_hier_checkpoint(fname, key2, inputs) is None
+
+   # as do other bodies
+   xform = np.eye(4)
+   xform[0, 3] = 1
+   other = rp.search.CyclicEvaluator(body.copy_xformed(xform), 'C3', hscore, **kw)
+   inputs2 = rp.search.hier_checkpoint_inputs(other, kw.nresl)
+   assert inputs2 != inputs
+   assert rp.search.load_hier_checkpoint(fname, key, inputs2) is None
+
+def test_hier_search_prune(hscore, body):
+   kw, sampler, evaluator = get_search_args(hscore, body, beam_size=5000)
+   xforms, scores, extra, stats = rp.hier_search(sampler, evaluator, **kw)
+   assert stats.nsaved == [0] * kw.nresl
+
+   # with the default slack, pruning keeps the same top scores
+   kw.hier_prune_topk = 10
+   xforms2, scores2, extra2, stats2 = rp.hier_search(sampler, evaluator, **kw)
+   assert sum(stats2.nsaved) > 0
+   assert stats2.ntot == sum(n for t, n in stats2.neval)
+   assert np.allclose(np.sort(scores)[-10:], np.sort(scores2)[-10:])
+   # the coarse scores are not strict bounds, no slack prunes more
+   kw.hier_prune_slack = 1.0
+   xforms3, scores3, extra3, stats3 = rp.hier_search(sampler, evaluator, **kw)
+   assert sum(stats3.nsaved) > sum(stats2.nsaved)
+
+def test_hier_search_base_samples(hscore, body):
+   kw, sampler, evaluator = get_search_args(hscore, body)
+   xforms, scores, extra, stats = rp.hier_search(sampler, evaluator, **kw)
+   with rp.sampling.SharedBaseSamples(sampler) as base_samples:
+      xforms2, scores2, extra2, stats2 = rp.hier_search(sampler, evaluator,
+                                                        base_samples=base_samples, **kw)
+   assert np.allclose(xforms, xforms2)
+   assert np.allclose(scores, scores2)
+   assert stats.neval[0][1] == stats2.neval[0][1]
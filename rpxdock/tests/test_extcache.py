@@ -0,0 +1,66 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from rpxdock import extcache
+
+_test_source = '''/*cppimport
+<%
+cfg['compiler_args'] = ['-std=c++17', '-w']
+cfg['dependencies'] = ['extcache_test.hpp']
+setup_pybind11(cfg)
+%>
+*/
+#include <pybind11/pybind11.h>
+#include "extcache_test.hpp"
+
+PYBIND11_MODULE(extcache_test, m) { m.def("answer", &answer); }
+'''
+
+def _write_test_source(tmpdir, answer=42):
+   src = os.path.join(str(tmpdir), 'extcache_test.cpp')
+   with open(src, 'w') as out:
+      out.write(_test_source)
+   with open(os.path.join(str(tmpdir), 'extcache_test.hpp'), 'w') as out:
+      out.write('int answer() { return %i; }\n' % answer)
+   return src
+
+def test_extension_key(tmpdir):
+   src = _write_test_source(tmpdir)
+   assert extcache.source_files(src) == [src, src.replace('.cpp', '.hpp')]
+   key = extcache.extension_key('extcache_test', src)
+   assert key == extcache.extension_key('extcache_test', src)
+   assert key != extcache.extension_key('other_name', src)
+   _write_test_source(tmpdir, answer=7)  # header changes invalidate
+   assert key != extcache.extension_key('extcache_test', src)
+
+def test_extension_sources():
+   sources = dict(extcache.extension_sources())
+   assert sources['rpxdock.bvh.bvh'] == os.path.join(extcache.rootdir, 'bvh', 'bvh.cpp')
+   assert 'rpxdock.xbin.xbin_util' in sources
+   assert 'rpxdock.sampling.xform_hierarchy' in sources
+   assert not any('.rendered' in n or 'extern' in n for n in sources)
+
+def _build(src, cachedir):
+   return extcache.build('extcache_test', src, cachedir)
+
+def test_concurrent_build(tmpdir):
+   src = _write_test_source(tmpdir.mkdir('src'))
+   cachedir = str(tmpdir.join('cache'))
+   with ProcessPoolExecutor(4) as pool:
+      results = list(pool.map(_build, [src] * 4, [cachedir] * 4))
+   # compiled exactly once, everyone else waited for it
+   path = extcache.cache_path('extcache_test', src, cachedir)
+   assert sorted(results) == [(path, False)] * 3 + [(path, True)]
+   assert [f for f in os.listdir(cachedir) if not f.endswith('.lock')] == [os.path.basename(path)]
+   # built in a temp dir, nothing is written next to the sources
+   assert sorted(os.listdir(os.path.dirname(src))) == ['extcache_test.cpp', 'extcache_test.hpp']
+   assert extcache.load('extcache_test', src, cachedir).answer() == 42
+
+def test_import_from_cache(tmp_path, monkeypatch):
+   monkeypatch.setenv('RPXDOCK_EXT_CACHE', str(tmp_path))
+   geomdir = os.path.join(extcache.rootdir, 'geom')
+   before = set(os.listdir(geomdir))
+   spec = extcache.ExtensionFinder().find_spec('rpxdock.geom.bcc', [geomdir])
+   src = os.path.join(geomdir, 'bcc.cpp')
+   assert spec.origin == extcache.cache_path('rpxdock.geom.bcc', src, str(tmp_path))
+   assert os.path.exists(spec.origin)
+   assert set(os.listdir(geomdir)) == before
@@ -0,0 +1,45 @@
+import sys, subprocess, json
+
+_startup_script = '''
+import sys, time, json
+t0 = time.perf_counter()
+import rpxdock as rp
+t1 = time.perf_counter()
+rp.Bunch, rp.Timer
+t2 = time.perf_counter()
+heavy = ('pyrosetta', 'matplotlib', 'xarray', 'rpxdock.bvh.bvh', 'rpxdock.phmap.phmap',
+         'rpxdock.xbin.xbin', 'rpxdock.motif._motif', 'rpxdock.sampling.xform_hierarchy')
+print(json.dumps(dict(import_rpxdock=t1 - t0, bunch_timer=t2 - t1,
+                      loaded=[m for m in heavy if m in sys.modules])))
+'''
+
+def startup_time():
+   out = subprocess.check_output([sys.executable, '-c', _startup_script])
+   return json.loads(out.decode().strip().splitlines()[-1])
+
+def test_startup():
+   # nothing heavy until it is used
+   assert startup_time()['loaded'] == []
+
+def bench_startup(ntrials=3):
+   for i in range(ntrials):
+      t = startup_time()
+      print(f'import rpxdock {t["import_rpxdock"]:7.3f}s  rp.Bunch, rp.Timer {t["bunch_timer"]:7.3f}s')
+
+def test_lazy_attrs():
+   import rpxdock as rp
+   assert rp.Body is rp.body.Body
+   assert rp.options is rp.app.options
+   assert rp.dockspec is rp.search.dockspec
+   assert rp.homog.hrot is not None
+   assert 'RpxHier' in dir(rp)
+   try:
+      rp.no_such_thing
+      assert 0
+   except AttributeError:
+      pass
+
+if __name__ == '__main__':
+   test_startup()
+   test_lazy_attrs()
+   bench_startup()
@@ -1,5 +1,5 @@
-import time, numpy, pytest
-from rpxdock import Timer
+import time, os, json, pickle, numpy, pytest
+from rpxdock import Timer, Profiler
 
 def test_timer():
    with Timer() as timer:
@@ -51,6 +51,37 @@ def test_summary():
    with pytest.raises(ValueError):
       timer.report(summary=1)
 
+def test_profiler(tmpdir):
+   prof = Profiler()
+   for i in range(3):
+      with prof.stage('outer', 10):
+         time.sleep(0.01)
+         with prof.stage('inner', 5):
+            time.sleep(0.01)
+   stats = prof.stage_stats()
+   assert list(stats) == ['outer', 'inner']
+   assert stats['outer']['ncalls'] == 3 and stats['outer']['nitems'] == 30
+   assert stats['inner']['ncalls'] == 3 and stats['inner']['nitems'] == 15
+   assert numpy.allclose(prof.sum.outer, 0.06, atol=0.04)
+   assert prof.sum.outer > prof.sum.inner
+
+   fname = os.path.join(tmpdir, 'trace.json')
+   prof.dump_chrome_trace(fname)
+   with open(fname) as inp:
+      events = json.load(inp)['traceEvents']
+   assert len(events) == 6
+   assert all(e['ph'] == 'X' and e['dur'] > 0 for e in events)
+
+   prof2 = pickle.loads(pickle.dumps(prof))
+   prof2.merge(prof)
+   assert prof2.stage_stats()['outer']['ncalls'] == 6
+
+   off = Profiler(enabled=False)
+   with off.stage('outer', 10):
+      pass
+   assert off.stage_stats() == {}
+   assert off.result_attrs() == {}
+
 if __name__ == '__main__':
    test_timer()
    test_summary()
@@ -225,6 +225,41 @@ def test_smear_multiple():
          # print(rad, npts, nisect / len(sets[0]))
          # assert np.all(allv == np.max(allv0, axis=0))
 
+def test_smear_nthread():
+   xb = Xbin(1.0, 15)
+   x = hm.hrot(np.random.randn(3000, 3), 30, degrees=1, dtype="f4")
+   x[:, :3, 3] = np.random.randn(3000, 3) * 5
+   phm = PHMap_u8f8()
+   phm[xb.key_of(x)] = np.random.rand(3000)
+   grid_r2 = xb.grid6.neighbor_sphere_radius_square_cut(2, 1)
+   kernel = np.random.rand(grid_r2 + 1)  # any kernel, maxes must not depend on update order
+   ref = smear(xb, phm, radius=2, extrahalf=1, oddlast3=1, sphere=1, kernel=kernel)
+   k0, v0 = ref.items_array()
+   order = np.argsort(k0)
+   for nthread in (2, 3, 16, 100, 0):
+      smr = smear(xb, phm, radius=2, extrahalf=1, oddlast3=1, sphere=1, kernel=kernel,
+                  nthread=nthread)
+      k, v = smr.items_array()
+      assert np.all(np.sort(k) == k0[order])
+      assert np.all(smr[k0] == v0)
+
+def bench_smear_nthread(nthreads=(1, 2, 4, 0), radius=2, exhalf=1):
+   """smear a real score table with --smear_nthread 1 vs N, output must be identical"""
+   import rpxdock as rp
+   xmap = rp.data.small_hscore().hier[0]
+   ref = None
+   for nthread in nthreads:
+      t = perf_counter()
+      smr = smear(xmap.xbin, xmap.phmap, radius=radius, extrahalf=exhalf, oddlast3=1, sphere=1,
+                  nthread=nthread)
+      t = perf_counter() - t
+      if ref is None:
+         ref, t1 = smr, t
+      k, v = ref.items_array()
+      assert len(smr) == len(ref) and np.all(smr[k] == v)
+      print(f'smear nthread {nthread:3} in {len(xmap.phmap):9,} out {len(smr):11,} ' +
+            f'{t:7.3f}s speedup {t1 / t:5.2f}x')
+
 def check_scores(s0, s1):
    not0 = np.sum(np.logical_or(s1 > 0, s0 > 0))
    frac_s1_gt_s0 = np.sum(s1 > s0) / not0
@@ -407,5 +442,7 @@ if __name__ == "__main__":
    # test_smear_one_exhalf_oddori_sphere()
    # test_smear_one_bounding()
    test_smear_two()
+   test_smear_nthread()
+   bench_smear_nthread()
    # test_smear_multiple()
    # test_smear_one_kernel()
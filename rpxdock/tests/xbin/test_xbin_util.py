@@ -6,6 +6,8 @@ import rpxdock.xbin.xbin_util as xu
 from rpxdock.homog import angle_of_3x3
 from rpxdock.geom import bcc
 from rpxdock import phmap
+from rpxdock.bvh import BVH, BVH_f4, bvh_collect_pairs_range_vec
+from rpxdock.motif import marginal_max_score
 
 import rpxdock.homog as hm
 
@@ -78,6 +80,26 @@ def test_ssmap_of_selected_pairs():
    vals = xu.ssmap_of_selected_pairs(xb, phm, idx, ss1, ss2, x1, x2)
    assert np.all(vals == phm[keys])
 
+def test_ssmap_pairs_multipos():
+   # each residue's own ss code goes in the key, for body1 as well as body2
+   rng = np.random.RandomState(0)
+   xb = Xbin_float()
+   N, N1, N2 = 1000, 100, 200
+   x1 = hm.rand_xform(N1).astype("f4")
+   x2 = hm.rand_xform(N2).astype("f4")
+   ss1, ss2 = np.full(N1, 2, dtype="u8"), np.zeros(N2, dtype="u8")
+   idx = np.stack([rng.randint(0, N1, N), rng.randint(0, N2, N)], axis=1)
+   pos1, pos2 = hm.rand_xform(2), hm.rand_xform(2)
+   lbub = np.array([[0, 400], [400, N]], dtype="i4")
+   phm = phmap.PHMap_u8f8()
+   keys = list()
+   for (lb, ub), p1, p2 in zip(lbub, pos1, pos2):
+      keys.append(xu.sskey_of_selected_pairs(xb, idx[lb:ub], ss1.astype("i4"), ss2.astype("i4"),
+                                             (p1 @ x1).astype("f4"), (p2 @ x2).astype("f4")))
+      phm[keys[-1]] = rng.rand(len(keys[-1]))
+   vals = xu.ssmap_pairs_multipos(xb, phm, idx.astype("i4"), ss1, ss2, x1, x2, lbub, pos1, pos2)
+   assert np.all(vals == phm[np.concatenate(keys)])
+
 def test_map_of_selected_pairs():
    phm = phmap.PHMap_u8f8()
    xb = Xbin_float()
@@ -118,9 +140,78 @@ def test_selected_pairs_pos():
    k2 = xu.key_of_selected_pairs(xb, i1, i2, x1, x2, p1, p2)
    assert np.all(k1 == k2)
 
+def test_map_marginal_max_range_vec():
+   N1, N2, N = 200, 300, 500
+   xyz1, xyz2 = np.random.randn(N1, 3) * 10, np.random.randn(N2, 3) * 10
+   bvh1, bvh2 = BVH(xyz1), BVH(xyz2)
+   stub1, stub2 = hm.rand_xform(N1), hm.rand_xform(N2)
+   stub1[:, :3, 3], stub2[:, :3, 3] = xyz1, xyz2
+   stub1, stub2 = stub1.astype("f4"), stub2.astype("f4")
+   ss1 = np.random.randint(0, 3, N1).astype("u8")
+   ss2 = np.random.randint(0, 3, N2).astype("u8")
+   pos1, pos2 = hm.rand_xform(N, cart_sd=15), hm.rand_xform(N, cart_sd=15)
+   lb1, ub1 = np.random.randint(0, 50, N), np.random.randint(150, N1, N)
+   xb = Xbin_float(1, 20)
+
+   pairs, lbub = bvh_collect_pairs_range_vec(bvh1, bvh2, pos1, pos2, 8.0, lb1, ub1)
+   assert len(pairs) > 0
+   keys = xu.key_of_selected_pairs(xb, pairs, stub1, stub2)
+   sskeys = xu.sskey_of_selected_pairs(xb, pairs, ss1.astype("i4"), ss2.astype("i4"), stub1, stub2)
+   phm, ssphm = phmap.PHMap_u8f8(), phmap.PHMap_u8f8()
+   phm[keys[::3].copy()] = np.random.rand(len(keys[::3]))
+   ssphm[sskeys[::3].copy()] = np.random.rand(len(sskeys[::3]))
+
+   pscore = xu.map_pairs_multipos(xb, phm, pairs, stub1, stub2, lbub, pos1, pos2)
+   ref = marginal_max_score(lbub, pairs, pscore)
+   sspscore = xu.ssmap_pairs_multipos(xb, ssphm, pairs, ss1, ss2, stub1, stub2, lbub, pos1, pos2)
+   ssref = marginal_max_score(lbub, pairs, sspscore)
+   frz, ssfrz = phmap.freeze(phm), phmap.freeze(ssphm)
+   assert np.all(pscore == xu.map_pairs_multipos(xb, frz, pairs, stub1, stub2, lbub, pos1, pos2))
+   assert np.all(sspscore == xu.ssmap_pairs_multipos(xb, ssfrz, pairs, ss1, ss2, stub1, stub2,
+                                                     lbub, pos1, pos2))
+   for nthread, m, ssm in ((1, phm, ssphm), (3, phm, ssphm), (2, frz, ssfrz)):
+      fused = xu.map_marginal_max_range_vec(bvh1, bvh2, pos1, pos2, 8.0, xb, m, stub1, stub2,
+                                            lb1=lb1, ub1=ub1, nthread=nthread)
+      ssfused = xu.ssmap_marginal_max_range_vec(bvh1, bvh2, pos1, pos2, 8.0, xb, ssm, ss1, ss2,
+                                                stub1, stub2, lb1=lb1, ub1=ub1, nthread=nthread)
+      for out, (lbub1, lbub2, idx1, idx2, ressc1, ressc2) in ((fused, ref), (ssfused, ssref)):
+         assert np.all(out[0] == lbub)
+         assert np.all(out[1] == lbub1)
+         assert np.all(out[2] == lbub2)
+         assert np.all(out[3] == ressc1)
+         assert np.all(out[4] == ressc2)
+
+   # quantized tables, same lookups with decoded values
+   q, ssq = phmap.quantize(phm, "u1"), phmap.quantize(ssphm, "u2")
+   qpscore = xu.map_pairs_multipos(xb, q, pairs, stub1, stub2, lbub, pos1, pos2)
+   ssqpscore = xu.ssmap_pairs_multipos(xb, ssq, pairs, ss1, ss2, stub1, stub2, lbub, pos1, pos2)
+   assert np.all(np.abs(qpscore - pscore) <= q.scale / 2 * 1.0001)
+   assert np.all(np.abs(ssqpscore - sspscore) <= ssq.scale / 2 * 1.0001)
+   assert np.all((qpscore == 0) == (pscore == 0))
+   fused = xu.map_marginal_max_range_vec(bvh1, bvh2, pos1, pos2, 8.0, xb, q, stub1, stub2,
+                                         lb1=lb1, ub1=ub1)
+   qref = marginal_max_score(lbub, pairs, qpscore)
+   assert np.all(fused[3] == qref[4])
+   assert np.all(fused[4] == qref[5])
+
+   # float32 bvhs and positions, same as the unfused f4 path
+   fvh1, fvh2 = BVH_f4(xyz1), BVH_f4(xyz2)
+   pos1, pos2 = pos1.astype("f4"), pos2.astype("f4")
+   pairs, lbub = bvh_collect_pairs_range_vec(fvh1, fvh2, pos1, pos2, 8.0, lb1, ub1)
+   pscore = xu.map_pairs_multipos(xb, phm, pairs, stub1, stub2, lbub, pos1, pos2)
+   lbub1, lbub2, idx1, idx2, ressc1, ressc2 = marginal_max_score(lbub, pairs, pscore)
+   fused = xu.map_marginal_max_range_vec(fvh1, fvh2, pos1, pos2, 8.0, xb, phm, stub1, stub2,
+                                         lb1=lb1, ub1=ub1, nthread=2)
+   assert np.all(fused[0] == lbub)
+   assert np.all(fused[1] == lbub1)
+   assert np.all(fused[3] == ressc1)
+   assert np.all(fused[4] == ressc2)
+
 if __name__ == "__main__":
    test_key_of_pairs()
    test_sskey_of_selected_pairs()
    test_ssmap_of_selected_pairs()
+   test_ssmap_pairs_multipos()
    test_map_of_selected_pairs()
    test_selected_pairs_pos()
+   test_map_marginal_max_range_vec()
@@ -1,8 +1,18 @@
-from . import plot, bunch, numeric, timer
-from .plot import *
+import importlib
+from . import bunch, numeric, timer
 from .util import *
 from .bunch import *
 from .numeric import *
 from .timer import *
 from .cache import *
 from . import gitcommit
+
+# plot pulls in matplotlib, so it and its names are imported on first use
+_plot_names = ('plot', 'can_plot', 'plt', 'mpl', 'figsize0', 'font', 'fig', 'axes', 'pos',
+               'rmjr', 'subplots', 'get_plotter', 'scatter', 'hist', 'show')
+
+def __getattr__(name):
+   if name not in _plot_names:
+      raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+   plot = importlib.import_module(f'{__name__}.plot')
+   return plot if name == 'plot' else getattr(plot, name)
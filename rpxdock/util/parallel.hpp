@@ -0,0 +1,58 @@
+#pragma once
+/** \file */
+
+#include <algorithm>
+#include <exception>
+#include <thread>
+#include <vector>
+
+namespace rpxdock {
+namespace util {
+
+/**
+ * @brief number of threads to use for n work items given requested nthread
+ *
+ * nthread <= 0 means one per hardware core, never more threads than items
+ */
+inline int resolve_nthread(int nthread, size_t n) {
+  if (nthread <= 0) nthread = std::max(1u, std::thread::hardware_concurrency());
+  return std::max<int>(1, std::min<size_t>(nthread, n));
+}
+
+/**
+ * @brief call fn(ithread, begin, end) on contiguous chunks of [0,n)
+ *
+ * chunk ithread always covers items before chunk ithread+1, so per-thread
+ * outputs concatenated in thread order are in item order. with one thread fn
+ * runs in the calling thread. the first exception thrown by any chunk is
+ * rethrown after all threads are joined. caller must not hold the GIL if fn
+ * touches python objects.
+ */
+template <typename Fn>
+int parallel_chunks(size_t n, int nthread, Fn fn) {
+  nthread = resolve_nthread(nthread, n);
+  if (nthread == 1) {
+    fn(0, size_t(0), n);
+    return 1;
+  }
+  std::vector<std::thread> threads;
+  std::vector<std::exception_ptr> errors(nthread);
+  for (int ithread = 0; ithread < nthread; ++ithread) {
+    size_t begin = n * ithread / nthread;
+    size_t end = n * (ithread + 1) / nthread;
+    threads.emplace_back([&, ithread, begin, end]() {
+      try {
+        fn(ithread, begin, end);
+      } catch (...) {
+        errors[ithread] = std::current_exception();
+      }
+    });
+  }
+  for (auto &t : threads) t.join();
+  for (auto &e : errors)
+    if (e) std::rethrow_exception(e);
+  return nthread;
+}
+
+}  // namespace util
+}  // namespace rpxdock
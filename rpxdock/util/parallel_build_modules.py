@@ -1,71 +1,29 @@
-import os, importlib, glob, time
-import cppimport
-from concurrent.futures import ProcessPoolExecutor
-from multiprocessing import cpu_count, current_process
+import os, argparse
+from multiprocessing import current_process
 import multiprocessing
+from rpxdock import extcache
 
-def fullname_from_path(f):
-   return f.replace("/util/..", "").replace("/", ".").replace(".cpp", "")
+def files_needing_rebuild(cachedir=None):
+   return [src for name, src in extcache.extension_sources()
+           if not os.path.exists(extcache.cache_path(name, src, cachedir))]
 
-def check_needs_update(filepath):
-   print('check_needs_update', filepath)
-   fullname = fullname_from_path(filepath)
-   module_data = cppimport.importer.setup_module_data(fullname, filepath)
-   return not cppimport.checksum.is_checksum_current(module_data)
-
-def maybe_build(f):
-   try:
-      fullname = fullname_from_path(f)
-      print('build', fullname)
-      cppimport.imp(fullname)
-
-   except None:
-      pass
-   # ImportError as e:
-   #  raise ValueError(f'cant import {fullname}')
-
-def files_needing_rebuild():
-   pattern = "%s/../**/*.cpp" % os.path.dirname(__file__)
-   # return [f.replace('/util/..', '') for f in glob.glob(pattern) if check_needs_update(f)]
-   return [f for f in glob.glob(pattern) if check_needs_update(f)]
-
-def parallel_build_modules(cppfiles=None):
+def parallel_build_modules(cppfiles=None, cachedir=None, ncpu=None):
+   '''build extension modules into the shared cache, see rpxdock.extcache'''
    if isinstance(current_process(), multiprocessing.context.ForkProcess):
       return
-
-   root = os.path.dirname(__file__)
-
-   cppfiles = files_needing_rebuild() if cppfiles is None else cppfiles
+   cppfiles = files_needing_rebuild(cachedir) if cppfiles is None else cppfiles
    if not cppfiles:
       return
+   extcache.build_all(cppfiles, cachedir, ncpu)
 
-   # print(f'{" checking ":=^80}\n', '\n'.join(cppfiles))
-
-   fguard = os.path.join(root, ".rpxdock_parallel_build_guard")
-   if os.path.exists(fguard):
-      print("rpxdock.util.parallel_build_modules: build already in progress")
-      nreturn
-
-   try:
-      with ProcessPoolExecutor(cpu_count()) as exe:
-         fut = [exe.submit(maybe_build, g) for g in cppfiles]
-         # open(fguard, "w").close()
-         # print("rpxdock.util.parallel_build_modules: building")
-         prev = 0
-         while not time.sleep(1):
-            done = [f.done() for f in fut]
-            ndone = sum(done)
-            if ndone != prev:
-               print(f'built {ndone} of {len(fut)}')
-               prev = ndone
-            if all(done): break
-         # for f in fut:
-         # f.result()
-   finally:
-      print("rpxdock.util.parallel_build_modules: cleaning up")
-      if os.path.exists(fguard):
-         os.remove(fguard)
-      print(f'{" done ":=^80}\n', '\n'.join(cppfiles))
+def main(argv=None):
+   parser = argparse.ArgumentParser(description='build rpxdock extension modules into the cache')
+   parser.add_argument('modules', nargs='*', help='module names or .cpp files, default all')
+   parser.add_argument('--cachedir', default=extcache.default_cachedir())
+   parser.add_argument('--ncpu', type=int, default=os.cpu_count())
+   args = parser.parse_args(argv)
+   extcache.build_all(args.modules, args.cachedir, args.ncpu)
+   print(f'extension cache: {args.cachedir}')
 
 if __name__ == "__main__":
-   parallel_build_modules()
+   main()
@@ -1,6 +1,6 @@
-import _pickle, os, multiprocessing, threading, copy, hashlib, logging, concurrent, time
+import _pickle, os, multiprocessing, threading, copy, hashlib, logging, concurrent.futures, time
 from collections import abc
-import numpy as np, xarray as xr
+import numpy as np
 
 log = logging.getLogger(__name__)
 
@@ -74,6 +74,7 @@ def hash_str_to_int(s):
    return int(abs(np.frombuffer(buf, dtype="i8")[0]))
 
 def sanitize_for_pickle(data):
+   import xarray as xr  # slow to import, only needed here
    data = copy.copy(data)
    if isinstance(data, (np.ndarray, xr.Dataset, xr.DataArray, int, float, str)):
       pass
@@ -102,10 +103,10 @@ def sanitize_for_pickle(data):
       data = m + '.' + n
    return data
 
-def load_threads(fnames, nthread=0):
+def load_threads(fnames, nthread=0, loadfunc=load):
    if nthread <= 0: nthread = cpu_count()
    with concurrent.futures.ThreadPoolExecutor(nthread) as exe:
-      return list(exe.map(load, fnames))
+      return list(exe.map(loadfunc, fnames))
 
 class InProcessExecutor:
    def __init__(self, *args, **kw):
@@ -1,4 +1,3 @@
-from cppimport import import_hook
 from .xbin import *
 from .xbin_util import *
 from .smear import *
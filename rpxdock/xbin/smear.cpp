@@ -5,7 +5,7 @@
 cfg['include_dirs'] = ['../..','../extern']
 cfg['compiler_args'] = ['-std=c++17', '-w', '-Ofast']
 cfg['dependencies'] = ['xbin.hpp', '../phmap/phmap.hpp', 'smear.hpp',
-'../geom/bcc.hpp']
+'../geom/bcc.hpp', '../util/parallel.hpp']
 
 cfg['parallel'] = False
 
@@ -31,7 +31,7 @@ void bind_smear(py::module &m, std::string name) {
   m.def("smear", &smear<F, K, V>, "smear out xmap into neighbor cells",
         "xbin"_a, "phmap"_a, "radius"_a = 1, "extrahalf"_a = false,
         "oddlast3"_a = true, "sphere"_a = true, "kernel"_a = Vx<V>(),
-        py::call_guard<py::gil_scoped_release>());
+        "nthread"_a = 1, py::call_guard<py::gil_scoped_release>());
 }
 
 PYBIND11_MODULE(smear, m) {
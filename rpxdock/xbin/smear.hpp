@@ -2,8 +2,10 @@
 /** \file */
 
 #include <set>
+#include <vector>
 
 #include "rpxdock/phmap/phmap.hpp"
+#include "rpxdock/util/parallel.hpp"
 #include "rpxdock/util/types.hpp"
 #include "rpxdock/xbin/xbin.hpp"
 
@@ -17,6 +19,15 @@ template <typename F, typename K>
 using Xbin = XformHash_bt24_BCC6<X3<F>, K>;
 using phmap::PHMap;
 
+template <typename F, typename Map, typename K, typename V>
+void update_max(Map& map, K key, V val_feather) noexcept {
+  auto [it, inserted] = map.emplace(key, val_feather);
+  if (!inserted) {
+    F val = std::max(it->second, val_feather);
+    it->second = val;
+  }
+}
+
 template <typename F, typename K, typename V>
 struct PHMapUpdateMax {
   typename PHMap<K, V>::Map& map;
@@ -30,23 +41,52 @@ struct PHMapUpdateMax {
   PHMapUpdateMax<F, K, V>& operator++(int) noexcept { return *this; }
   PHMapUpdateMax<F, K, V>& operator*() noexcept { return *this; }
   void operator=(std::pair<K, K> key_rad) noexcept {
-    K bcc_key = key_rad.first;
-    K radius = key_rad.second;
-    K key = xbin.combine_cell_grid_index(cell_index, bcc_key);
-    V val_feather = val0 * kernel[radius];
-    auto [it, inserted] = map.emplace(key, val_feather);
-    if (!inserted) {
-      F val = std::max(it->second, val_feather);
-      it->second = val;
-    }
+    K key = xbin.combine_cell_grid_index(cell_index, key_rad.first);
+    update_max<F>(map, key, val0 * kernel[key_rad.second]);
+  }
+};
+
+/// like PHMapUpdateMax, but appends (key, val) to the buffer of the submap
+/// key hashes to instead of updating the map
+template <typename F, typename K, typename V>
+struct PHMapBufferBySubmap {
+  typename PHMap<K, V>::Map& map;
+  Xbin<F, K> const& xbin;
+  K cell_index;
+  V val0;
+  Vx<V> const& kernel;
+  std::vector<std::vector<std::pair<K, V>>>& buf;
+  PHMapBufferBySubmap(PHMap<K, V>& m, Xbin<F, K>& b, K c, V v, Vx<V>& ker,
+                      std::vector<std::vector<std::pair<K, V>>>& bf)
+      : map(m.phmap_), xbin(b), cell_index(c), val0(v), kernel(ker), buf(bf) {}
+  PHMapBufferBySubmap<F, K, V>& operator++(int) noexcept { return *this; }
+  PHMapBufferBySubmap<F, K, V>& operator*() noexcept { return *this; }
+  void operator=(std::pair<K, K> key_rad) {
+    K key = xbin.combine_cell_grid_index(cell_index, key_rad.first);
+    buf[map.subidx(map.hash(key))].emplace_back(key, val0 * kernel[key_rad.second]);
   }
 };
 
+/// input keys per thread smeared into the buffers before they are merged,
+/// bounds buffer memory to about this many neighborhoods per thread
+static size_t const smear_block_size = 2048;
+
+/**
+ * @brief smear out phmap values into the neighboring xbin cells, keeping the
+ * max where neighborhoods overlap
+ *
+ * with nthread > 1 the input is smeared in blocks. each thread enumerates the
+ * neighbors of a contiguous chunk of the block's input keys into one buffer
+ * per output submap, then each thread merges a range of submaps, taking the
+ * buffers in thread order. every output key sees the same sequence of max
+ * updates as with one thread, so the output is identical. nthread <= 0 means
+ * one per core
+ */
 template <typename F, typename K, typename V>
 std::unique_ptr<PHMap<K, V>> smear(Xbin<F, K>& xbin, PHMap<K, V>& phmap,
                                    int radius = 1, bool exhalf = false,
                                    bool oddlast3 = true, bool sphere = true,
-                                   Vx<V> kernel = Vx<V>()) {
+                                   Vx<V> kernel = Vx<V>(), int nthread = 1) {
   int r = xbin.grid().neighbor_radius_square_cut(radius, exhalf);
   if (sphere) r = xbin.grid().neighbor_sphere_radius_square_cut(radius, exhalf);
   if (kernel.size() == 0) {
@@ -55,12 +95,42 @@ std::unique_ptr<PHMap<K, V>> smear(Xbin<F, K>& xbin, PHMap<K, V>& phmap,
   }
   auto out = std::make_unique<PHMap<K, V>>();
   // std::cout << "MAP LOC " << &out->phmap_ << std::endl;
-  for (auto [key, val] : phmap.phmap_) {
-    K bcc_key = xbin.grid_key(key);
-    K cell_key = xbin.cell_index(key);
-    auto updater = PHMapUpdateMax(*out, xbin, cell_key, val, key, kernel);
-    xbin.grid().neighbors_6_3(bcc_key, updater, radius, exhalf, oddlast3,
-                              sphere);
+  nthread = util::resolve_nthread(nthread, phmap.size());
+  if (nthread == 1) {
+    for (auto [key, val] : phmap.phmap_) {
+      K bcc_key = xbin.grid_key(key);
+      K cell_key = xbin.cell_index(key);
+      auto updater = PHMapUpdateMax(*out, xbin, cell_key, val, key, kernel);
+      xbin.grid().neighbors_6_3(bcc_key, updater, radius, exhalf, oddlast3,
+                                sphere);
+    }
+    return out;
+  }
+  using Buf = std::vector<std::vector<std::pair<K, V>>>;
+  std::vector<std::pair<K, V>> items(phmap.phmap_.begin(), phmap.phmap_.end());
+  size_t nsub = out->phmap_.subcnt();
+  std::vector<Buf> bufs(nthread, Buf(nsub));
+  size_t block = smear_block_size * nthread;
+  for (size_t b = 0; b < items.size(); b += block) {
+    size_t n = std::min(block, items.size() - b);
+    util::parallel_chunks(n, nthread, [&](int ithread, size_t beg, size_t end) {
+      for (size_t i = b + beg; i < b + end; ++i) {
+        auto [key, val] = items[i];
+        auto collect = PHMapBufferBySubmap(*out, xbin, xbin.cell_index(key),
+                                           val, kernel, bufs[ithread]);
+        xbin.grid().neighbors_6_3(xbin.grid_key(key), collect, radius, exhalf,
+                                  oddlast3, sphere);
+      }
+    });
+    // submaps are independent, each is only touched by the thread merging it
+    util::parallel_chunks(nsub, nthread, [&](int, size_t beg, size_t end) {
+      for (size_t sub = beg; sub < end; ++sub) {
+        for (auto& buf : bufs) {
+          for (auto [key, val] : buf[sub]) update_max<F>(out->phmap_, key, val);
+          buf[sub].clear();
+        }
+      }
+    });
   }
   // std::cout << "smear out size " << out->size() << std::endl;
   return out;
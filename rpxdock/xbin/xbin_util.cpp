@@ -6,7 +6,9 @@ cfg['include_dirs'] = ['../..','../extern']
 cfg['compiler_args'] = ['-std=c++17', '-w', '-Ofast']
 cfg['dependencies'] = ['../geom/bcc.hpp','../util/assertions.hpp',
 '../util/global_rng.hpp', 'xbin.hpp', '../util/numeric.hpp',
-'../util/pybind_types.hpp']
+'../util/pybind_types.hpp', '../util/parallel.hpp', '../bvh/bvh.hpp',
+'../bvh/bvh_algo.hpp', '../bvh/bvh_ptidx.hpp', '../phmap/phmap.hpp',
+'../phmap/frozen.hpp']
 cfg['parallel'] = False
 
 
@@ -18,11 +20,15 @@ setup_pybind11(cfg)
 #include <iostream>
 #include <string>
 
+#include "rpxdock/bvh/bvh.hpp"
+#include "rpxdock/bvh/bvh_ptidx.hpp"
+#include "rpxdock/phmap/frozen.hpp"
 #include "rpxdock/phmap/phmap.hpp"
 #include "rpxdock/util/Timer.hpp"
 #include "rpxdock/util/assertions.hpp"
 #include "rpxdock/util/global_rng.hpp"
 #include "rpxdock/util/numeric.hpp"
+#include "rpxdock/util/parallel.hpp"
 #include "rpxdock/util/pybind_types.hpp"
 #include "rpxdock/util/types.hpp"
 #include "rpxdock/xbin/xbin.hpp"
@@ -310,8 +316,9 @@ Vx<K> sskey_of_selected_pairs_onearray_same(Xbin<F, K> const &xb, py::array idx,
 
 ///////////////////////// with ss / maps //////////////////////////
 
-template <typename I, typename F, typename K, typename V>
-Vx<V> mapkop3ss_impl(Xbin<F, K> const &xb, PHMap<K, V> const &map,
+template <typename I, typename F, typename K, typename V,
+          template <typename, typename> class Map>
+Vx<V> mapkop3ss_impl(Xbin<F, K> const &xb, Map<K, V> const &map,
                      py::array_t<I> idx, py::array_t<I> ss1, py::array_t<I> ss2,
                      py::array_t<F> x1, py::array_t<F> x2, M4<F> p1,
                      M4<F> p2) noexcept {
@@ -322,21 +329,23 @@ Vx<V> mapkop3ss_impl(Xbin<F, K> const &xb, PHMap<K, V> const &map,
   X3<F> *x2p = (X3<F> *)x2.request().ptr;
   py::gil_scoped_release release;
   X3<F> x21 = X3<F>(p1).inverse() * X3<F>(p2);
-  Vx<V> vals(idx.shape()[0]);
-  for (int i = 0; i < vals.size(); ++i) {
+  Vx<K> keys(idx.shape()[0]);
+  for (int i = 0; i < keys.size(); ++i) {
     K k = xb.get_key(x1p[idxp[2 * i]].inverse() * (x21 * x2p[idxp[2 * i + 1]]));
-    k = k | ((K)ss1p[idxp[2 * i]] << 62) | ((K)ss2p[idxp[2 * i + 1]] << 60);
-    vals[i] = map.get_default(k);
+    keys[i] =
+        k | ((K)ss1p[idxp[2 * i]] << 62) | ((K)ss2p[idxp[2 * i + 1]] << 60);
   }
+  Vx<V> vals(keys.size());
+  get_batch(map, keys.data(), vals.data(), keys.size());
   return vals;
 }
 
-template <typename K, typename F, typename V>
-Vx<V> ssmap_of_selected_pairs_onearray(Xbin<F, K> const &xb,
-                                       PHMap<K, V> const &m, py::array idx,
-                                       py::array ss1, py::array ss2,
-                                       py::array x1, py::array x2, M4<F> p1,
-                                       M4<F> p2) {
+template <typename K, typename F, typename V,
+          template <typename, typename> class Map = PHMap>
+Vx<V> ssmap_of_selected_pairs_onearray(Xbin<F, K> const &xb, Map<K, V> const &m,
+                                       py::array idx, py::array ss1,
+                                       py::array ss2, py::array x1,
+                                       py::array x2, M4<F> p1, M4<F> p2) {
   check_xform_array(x1);
   check_xform_array(x2);
   pybind11::array::ensure(idx);
@@ -348,30 +357,37 @@ Vx<V> ssmap_of_selected_pairs_onearray(Xbin<F, K> const &xb,
   if (x1.dtype().kind() != x2.dtype().kind())
     throw std::runtime_error("xform arrays must have same dtype");
   if (py::isinstance<py::array_t<int64_t>>(idx)) {
-    return mapkop3ss_impl<int64_t, F, K>(xb, m, idx, ss1, ss2, x1, x2, p1, p2);
+    return mapkop3ss_impl<int64_t, F, K, V, Map>(xb, m, idx, ss1, ss2, x1, x2,
+                                                 p1, p2);
   } else if (py::isinstance<py::array_t<int32_t>>(idx)) {
-    return mapkop3ss_impl<int32_t, F, K>(xb, m, idx, ss1, ss2, x1, x2, p1, p2);
+    return mapkop3ss_impl<int32_t, F, K, V, Map>(xb, m, idx, ss1, ss2, x1, x2,
+                                                 p1, p2);
   } else if (py::isinstance<py::array_t<uint64_t>>(idx)) {
-    return mapkop3ss_impl<uint64_t, F, K>(xb, m, idx, ss1, ss2, x1, x2, p1, p2);
+    return mapkop3ss_impl<uint64_t, F, K, V, Map>(xb, m, idx, ss1, ss2, x1, x2,
+                                                  p1, p2);
   } else if (py::isinstance<py::array_t<uint32_t>>(idx)) {
-    return mapkop3ss_impl<uint32_t, F, K>(xb, m, idx, ss1, ss2, x1, x2, p1, p2);
+    return mapkop3ss_impl<uint32_t, F, K, V, Map>(xb, m, idx, ss1, ss2, x1, x2,
+                                                  p1, p2);
   } else {
     throw std::runtime_error("array dtype must be matching f4 or f8");
   }
 }
 
-template <typename K, typename F, typename V>
+template <typename K, typename F, typename V,
+          template <typename, typename> class Map = PHMap>
 Vx<V> ssmap_of_selected_pairs_onearray_same(Xbin<F, K> const &xb,
-                                            PHMap<K, V> const &m, py::array idx,
+                                            Map<K, V> const &m, py::array idx,
                                             py::array ss, py::array x, M4<F> p1,
                                             M4<F> p2) {
-  return ssmap_of_selected_pairs_onearray(xb, m, idx, ss, ss, x, x, p1, p2);
+  return ssmap_of_selected_pairs_onearray<K, F, V, Map>(xb, m, idx, ss, ss, x,
+                                                        x, p1, p2);
 }
 
 /////////////////////////// map no ss //////////////////////////////////
 
-template <typename I, typename F, typename K, typename V>
-Vx<V> mapkop3_impl(Xbin<F, K> const &xb, PHMap<K, V> const &map,
+template <typename I, typename F, typename K, typename V,
+          template <typename, typename> class Map>
+Vx<V> mapkop3_impl(Xbin<F, K> const &xb, Map<K, V> const &map,
                    py::array_t<I> idx, py::array_t<F> x1, py::array_t<F> x2,
                    M4<F> p1, M4<F> p2) noexcept {
   I *idxp = (I *)idx.request().ptr;
@@ -379,19 +395,20 @@ Vx<V> mapkop3_impl(Xbin<F, K> const &xb, PHMap<K, V> const &map,
   X3<F> *x2p = (X3<F> *)x2.request().ptr;
   py::gil_scoped_release release;
   X3<F> x21 = X3<F>(p1).inverse() * X3<F>(p2);
-  Vx<V> vals(idx.shape()[0]);
-  for (int i = 0; i < vals.size(); ++i) {
-    K k = xb.get_key(x1p[idxp[2 * i]].inverse() * (x21 * x2p[idxp[2 * i + 1]]));
-    vals[i] = map.get_default(k);
-  }
+  Vx<K> keys(idx.shape()[0]);
+  for (int i = 0; i < keys.size(); ++i)
+    keys[i] =
+        xb.get_key(x1p[idxp[2 * i]].inverse() * (x21 * x2p[idxp[2 * i + 1]]));
+  Vx<V> vals(keys.size());
+  get_batch(map, keys.data(), vals.data(), keys.size());
   return vals;
 }
 
-template <typename K, typename F, typename V>
-Vx<V> map_of_selected_pairs_onearray(Xbin<F, K> const &xb,
-                                     PHMap<K, V> const &map, py::array idx,
-                                     py::array x1, py::array x2, M4<F> p1,
-                                     M4<F> p2) {
+template <typename K, typename F, typename V,
+          template <typename, typename> class Map = PHMap>
+Vx<V> map_of_selected_pairs_onearray(Xbin<F, K> const &xb, Map<K, V> const &map,
+                                     py::array idx, py::array x1, py::array x2,
+                                     M4<F> p1, M4<F> p2) {
   check_xform_array(x1);
   check_xform_array(x2);
   pybind11::array::ensure(idx);
@@ -403,29 +420,32 @@ Vx<V> map_of_selected_pairs_onearray(Xbin<F, K> const &xb,
   if (x1.dtype().kind() != x2.dtype().kind())
     throw std::runtime_error("xform arrays must have same dtype");
   if (py::isinstance<py::array_t<int64_t>>(idx)) {
-    return mapkop3_impl<int64_t, F, K>(xb, map, idx, x1, x2, p1, p2);
+    return mapkop3_impl<int64_t, F, K, V, Map>(xb, map, idx, x1, x2, p1, p2);
   } else if (py::isinstance<py::array_t<int32_t>>(idx)) {
-    return mapkop3_impl<int32_t, F, K>(xb, map, idx, x1, x2, p1, p2);
+    return mapkop3_impl<int32_t, F, K, V, Map>(xb, map, idx, x1, x2, p1, p2);
   } else if (py::isinstance<py::array_t<uint64_t>>(idx)) {
-    return mapkop3_impl<uint64_t, F, K>(xb, map, idx, x1, x2, p1, p2);
+    return mapkop3_impl<uint64_t, F, K, V, Map>(xb, map, idx, x1, x2, p1, p2);
   } else if (py::isinstance<py::array_t<uint32_t>>(idx)) {
-    return mapkop3_impl<uint32_t, F, K>(xb, map, idx, x1, x2, p1, p2);
+    return mapkop3_impl<uint32_t, F, K, V, Map>(xb, map, idx, x1, x2, p1, p2);
   } else {
     throw std::runtime_error("array dtype must be matching f4 or f8");
   }
 }
 
-template <typename K, typename F, typename V>
+template <typename K, typename F, typename V,
+          template <typename, typename> class Map = PHMap>
 Vx<V> map_of_selected_pairs_onearray_same(Xbin<F, K> const &xb,
-                                          PHMap<K, V> const &map, py::array idx,
+                                          Map<K, V> const &map, py::array idx,
                                           py::array x, M4<F> p1, M4<F> p2) {
-  return map_of_selected_pairs_onearray(xb, map, idx, x, x, p1, p2);
+  return map_of_selected_pairs_onearray<K, F, V, Map>(xb, map, idx, x, x, p1,
+                                                      p2);
 }
 
 ///////////////////////// ssmap_pairs_multipos
 
-template <typename K, typename F, typename V>
-Vx<V> ssmap_pairs_multipos(Xbin<F, K> const &xb, PHMap<K, V> const &map,
+template <typename K, typename F, typename V,
+          template <typename, typename> class Map = PHMap>
+Vx<V> ssmap_pairs_multipos(Xbin<F, K> const &xb, Map<K, V> const &map,
                            Mx<int32_t> pairs, Vx<K> ss1, Vx<K> ss2,
                            py::array_t<F> x1, py::array_t<F> x2,
                            Mx<int32_t> lbub, py::array_t<F> p1,
@@ -445,6 +465,8 @@ Vx<V> ssmap_pairs_multipos(Xbin<F, K> const &xb, PHMap<K, V> const &map,
 
   py::gil_scoped_release release;
 
+  // keys first, then one batched lookup that can prefetch ahead
+  Vx<K> keys(pairs.rows());
   Vx<V> vals(pairs.rows());
   int ntot = 0;
   for (int ipos = 0; ipos < lbub.rows(); ++ipos) {
@@ -455,17 +477,18 @@ Vx<V> ssmap_pairs_multipos(Xbin<F, K> const &xb, PHMap<K, V> const &map,
     for (int32_t i = lb; i < ub; ++i) {
       X3<F> x = stub1[pairs(i, 0)].inverse() * x21 * stub2[pairs(i, 1)];
       K k = xb.get_key(x);
-      k |= (ss2[pairs(i, 0)] << 62) | (ss2[pairs(i, 1)] << 60);
-      vals[ntot++] = map.get_default(k);
+      keys[ntot++] = k | (ss1[pairs(i, 0)] << 62) | (ss2[pairs(i, 1)] << 60);
     }
   }
   if (ntot != pairs.rows())
     throw std::runtime_error("ssmap_pairs_multipos error");
+  get_batch(map, keys.data(), vals.data(), keys.size());
   return vals;
 }
 
-template <typename K, typename F, typename V>
-Vx<V> map_pairs_multipos(Xbin<F, K> const &xb, PHMap<K, V> const &map,
+template <typename K, typename F, typename V,
+          template <typename, typename> class Map = PHMap>
+Vx<V> map_pairs_multipos(Xbin<F, K> const &xb, Map<K, V> const &map,
                          Mx<int32_t> pairs, py::array_t<F> x1,
                          py::array_t<F> x2, Mx<int32_t> lbub, py::array_t<F> p1,
                          py::array_t<F> p2) {
@@ -482,6 +505,8 @@ Vx<V> map_pairs_multipos(Xbin<F, K> const &xb, PHMap<K, V> const &map,
 
   py::gil_scoped_release release;
 
+  // keys first, then one batched lookup that can prefetch ahead
+  Vx<K> keys(pairs.rows());
   Vx<V> vals(pairs.rows());
   int ntot = 0;
   for (int ipos = 0; ipos < lbub.rows(); ++ipos) {
@@ -491,17 +516,307 @@ Vx<V> map_pairs_multipos(Xbin<F, K> const &xb, PHMap<K, V> const &map,
     int32_t lb = lbub(ipos, 0), ub = lbub(ipos, 1);
     for (int32_t i = lb; i < ub; ++i) {
       X3<F> x = stub1[pairs(i, 0)].inverse() * x21 * stub2[pairs(i, 1)];
-      K k = xb.get_key(x);
-      vals[ntot++] = map.get_default(k);
+      keys[ntot++] = xb.get_key(x);
     }
   }
   if (ntot != pairs.rows())
     throw std::runtime_error("ssmap_pairs_multipos error");
+  get_batch(map, keys.data(), vals.data(), keys.size());
   return vals;
 }
 
+///////////////////////// fused bvh pairs / map / marginal max
+
+template <typename V>
+using MarginalMaxMap = ::phmap::flat_hash_map<int32_t, V>;
+
+template <typename XF, typename K, typename V, typename M>
+struct MapMarginalMaxData {
+  Xbin<XF, K> const &xbin;
+  M const &map;
+  X3<XF> const *stub1inv, *stub2;
+  K const *ss1, *ss2;  // null if not using ss keys
+  int nasym1, nasym2;
+};
+
+/**
+ * @brief BVIntersect query: look up every in-range pair closer than d and keep
+ * per-residue max scores for both sides, without storing the pairs
+ *
+ * same traversal, range checks and key math as BVHCollectPairsRangeVec
+ * followed by (ss)map_pairs_multipos and marginal_max_score
+ */
+template <typename F, typename XF, typename K, typename V, typename M>
+struct BVHMapMarginalMaxRange {
+  using Scalar = F;
+  using Xform = X3<F>;
+  MapMarginalMaxData<XF, K, V, M> const &data;
+  F d = 0.0, d2 = 0.0;
+  Xform bXa = Xform::Identity();
+  X3<XF> x21 = X3<XF>::Identity();
+  int lb1, ub1, lb2, ub2, nasym1, nasym2;
+  MarginalMaxMap<V> &max1, &max2;
+  int32_t npair = 0;
+  BVHMapMarginalMaxRange(MapMarginalMaxData<XF, K, V, M> const &dat, F r,
+                         Xform x, X3<XF> x21_, int l1, int u1, int l2, int u2,
+                         MarginalMaxMap<V> &m1, MarginalMaxMap<V> &m2)
+      : data(dat),
+        d(r),
+        d2(r * r),
+        bXa(x),
+        x21(x21_),
+        lb1(l1),
+        ub1(u1),
+        lb2(l2),
+        ub2(u2),
+        nasym1(dat.nasym1),
+        nasym2(dat.nasym2),
+        max1(m1),
+        max2(m2) {}
+  bool intersectVolumeVolume(Sphere<F> vol1, Sphere<F> vol2) {
+    return vol1.signdis(bXa * vol2) < d;
+  }
+  bool intersectVolumeObject(Sphere<F> vol1, PtIdx<F> obj2) {
+    if (vol1.ub % nasym1 < lb1 || vol1.lb % nasym1 > ub1 ||
+        obj2.idx % nasym2 < lb2 || obj2.idx % nasym2 > ub2)
+      return false;
+    return vol1.signdis(bXa * obj2.pos) < d;
+  }
+  bool intersectObjectVolume(PtIdx<F> obj1, Sphere<F> vol2) {
+    if (obj1.idx % nasym1 < lb1 || obj1.idx % nasym1 > ub1 ||
+        vol2.ub % nasym2 < lb2 || vol2.lb % nasym2 > ub2)
+      return false;
+    return (bXa * vol2).signdis(obj1.pos) < d;
+  }
+  bool intersectObjectObject(PtIdx<F> obj1, PtIdx<F> obj2) {
+    if (obj1.idx % nasym1 < lb1 || obj1.idx % nasym1 > ub1 ||
+        obj2.idx % nasym2 < lb2 || obj2.idx % nasym2 > ub2)
+      return false;
+    bool isect = (obj1.pos - bXa * obj2.pos).squaredNorm() < d2;
+    if (isect) {
+      int32_t i1 = obj1.idx, i2 = obj2.idx;
+      X3<XF> x = data.stub1inv[i1] * x21 * data.stub2[i2];
+      K k = data.xbin.get_key(x);
+      if (data.ss1) k |= (data.ss1[i1] << 62) | (data.ss2[i2] << 60);
+      V v = data.map.get_default(k);
+      update_max(max1, i1, v);
+      update_max(max2, i2, v);
+      ++npair;
+    }
+    return false;
+  }
+  static void update_max(MarginalMaxMap<V> &m, int32_t k, V v) {
+    auto [it, inserted] = m.emplace(k, v);
+    if (!inserted) it->second = std::max(it->second, v);
+  }
+};
+
+template <typename F>
+int bvh_max_obj_id(BVH<F> const &bvh) {
+  int x = 0;
+  for (auto o : bvh.objs) x = std::max(x, o.idx);
+  return x;
+}
+
+template <typename V>
+struct MarginalMaxChunk {
+  std::vector<int32_t> npair, n1, n2;
+  std::vector<V> max1, max2;
+};
+
+template <typename F, typename PF, typename XF, typename K, typename V,
+          template <typename, typename> class Map>
+py::tuple map_marginal_max_range_vec_impl(
+    BVH<F> const &bvh1, BVH<F> const &bvh2, py::array_t<PF> pos1,
+    py::array_t<PF> pos2, F maxdist, Xbin<XF, K> const &xb,
+    Map<K, V> const &map, py::array_t<XF> stub1, py::array_t<XF> stub2,
+    Vx<K> const *ss1, Vx<K> const *ss2, Vx<int> lb1, Vx<int> ub1, int nasym1,
+    Vx<int> lb2, Vx<int> ub2, int nasym2, int nthread) {
+  auto x1 = xform_py_to_eigen(pos1);
+  auto x2 = xform_py_to_eigen(pos2);
+  auto s1 = xform_py_to_eigen(stub1);
+  auto s2 = xform_py_to_eigen(stub2);
+  if (x1.size() != x2.size() && x1.size() != 1 && x2.size() != 1)
+    throw std::runtime_error("pos1/pos2 must be broadcastable");
+  if (x1.size() != lb1.size() && x1.size() != 1 && lb1.size() != 1)
+    throw std::runtime_error("pos1/lb1 must be broadcastable");
+  if (x2.size() != lb2.size() && x2.size() != 1 && lb2.size() != 1)
+    throw std::runtime_error("pos2/lb2 must be broadcastable");
+  if (lb1.size() != lb2.size() && lb1.size() != 1 && lb2.size() != 1)
+    throw std::runtime_error("lb1/lb2 must be broadcastable");
+  if (lb1.size() != ub1.size() && lb1.size() != 1 && ub1.size() != 1)
+    throw std::runtime_error("lb1/ub1 must be broadcastable");
+  if (lb2.size() != ub2.size() && lb2.size() != 1 && ub2.size() != 1)
+    throw std::runtime_error("lb2/ub2 must be broadcastable");
+  if (bvh_max_obj_id(bvh1) >= s1.size() || bvh_max_obj_id(bvh2) >= s2.size())
+    throw std::runtime_error("stub arrays must cover all bvh ids");
+  if (ss1 && (ss1->size() != s1.size() || ss2->size() != s2.size()))
+    throw std::runtime_error("ss/stub must be same len");
+
+  auto lbub = std::make_unique<Mx<int32_t>>();
+  auto lbub1 = std::make_unique<Mx<int32_t>>();
+  auto lbub2 = std::make_unique<Mx<int32_t>>();
+  auto ressc1 = std::make_unique<Vx<V>>();
+  auto ressc2 = std::make_unique<Vx<V>>();
+  {
+    py::gil_scoped_release release;
+    size_t n = std::max(std::max(std::max(x1.size(), x2.size()),
+                                 std::max(lb1.size(), ub1.size())),
+                        std::max(lb2.size(), ub2.size()));
+    size_t n0 = std::min(std::min(std::min(x1.size(), x2.size()),
+                                  std::min(lb1.size(), ub1.size())),
+                         std::min(lb2.size(), ub2.size()));
+    n = n0 ? n : 0;
+    if (nasym1 < 0) nasym1 = bvh_max_obj_id(bvh1) + 1;
+    if (nasym2 < 0) nasym2 = bvh_max_obj_id(bvh2) + 1;
+    // stub1 inverses computed once instead of once per pair
+    std::vector<X3<XF>, aligned_allocator<X3<XF>>> s1inv(s1.size());
+    for (size_t i = 0; i < s1.size(); ++i) s1inv[i] = s1[i].inverse();
+    MapMarginalMaxData<XF, K, V, Map<K, V>> data{xb,
+                                                 map,
+                                                 s1inv.data(),
+                                                 s2.data(),
+                                                 ss1 ? ss1->data() : nullptr,
+                                                 ss2 ? ss2->data() : nullptr,
+                                                 nasym1,
+                                                 nasym2};
+
+    std::vector<MarginalMaxChunk<V>> chunks(resolve_nthread(nthread, n));
+    parallel_chunks(n, chunks.size(), [&](int ithread, size_t b, size_t e) {
+      auto &chunk = chunks[ithread];
+      for (size_t i = b; i < e; ++i) {
+        size_t ix1 = x1.size() == 1 ? 0 : i;
+        size_t ix2 = x2.size() == 1 ? 0 : i;
+        int l1 = lb1.size() == 1 ? lb1[0] : lb1[i];
+        int l2 = lb2.size() == 1 ? lb2[0] : lb2[i];
+        int u1 = ub1.size() == 1 ? ub1[0] : ub1[i];
+        int u2 = ub2.size() == 1 ? ub2[0] : ub2[i];
+        X3<F> pos = (x1[ix1].inverse() * x2[ix2]).template cast<F>();
+        X3<XF> x21 = X3<XF>(x1[ix1].template cast<XF>()).inverse() *
+                     X3<XF>(x2[ix2].template cast<XF>());
+        // fresh maps per dock so iteration order matches marginal_max_score
+        MarginalMaxMap<V> max1, max2;
+        BVHMapMarginalMaxRange<F, XF, K, V, Map<K, V>> query(
+            data, maxdist, pos, x21, l1, u1, l2, u2, max1, max2);
+        rpxdock::bvh::BVIntersect(bvh1, bvh2, query);
+        chunk.npair.push_back(query.npair);
+        chunk.n1.push_back(max1.size());
+        chunk.n2.push_back(max2.size());
+        for (auto [k, v] : max1) chunk.max1.push_back(v);
+        for (auto [k, v] : max2) chunk.max2.push_back(v);
+      }
+    });
+
+    size_t ntot1 = 0, ntot2 = 0;
+    for (auto &c : chunks) ntot1 += c.max1.size(), ntot2 += c.max2.size();
+    lbub->resize(n, 2);
+    lbub1->resize(n, 2);
+    lbub2->resize(n, 2);
+    ressc1->resize(ntot1);
+    ressc2->resize(ntot2);
+    int32_t np = 0, n1 = 0, n2 = 0;
+    size_t i = 0;
+    for (auto &c : chunks) {
+      std::copy(c.max1.begin(), c.max1.end(), ressc1->data() + n1);
+      std::copy(c.max2.begin(), c.max2.end(), ressc2->data() + n2);
+      for (size_t j = 0; j < c.npair.size(); ++j, ++i) {
+        (*lbub)(i, 0) = np;
+        (*lbub1)(i, 0) = n1;
+        (*lbub2)(i, 0) = n2;
+        np += c.npair[j];
+        n1 += c.n1[j];
+        n2 += c.n2[j];
+        (*lbub)(i, 1) = np;
+        (*lbub1)(i, 1) = n1;
+        (*lbub2)(i, 1) = n2;
+      }
+    }
+    if (i != n) throw std::runtime_error("map_marginal_max_range_vec error");
+  }
+  return py::make_tuple(*lbub, *lbub1, *lbub2, *ressc1, *ressc2);
+}
+
+template <typename F, typename PF, typename XF, typename K, typename V,
+          template <typename, typename> class Map>
+py::tuple map_marginal_max_range_vec(BVH<F> const &bvh1, BVH<F> const &bvh2,
+                                     py::array_t<PF> pos1, py::array_t<PF> pos2,
+                                     F maxdist, Xbin<XF, K> const &xb,
+                                     Map<K, V> const &map,
+                                     py::array_t<XF> stub1,
+                                     py::array_t<XF> stub2, Vx<int> lb1,
+                                     Vx<int> ub1, int nasym1, Vx<int> lb2,
+                                     Vx<int> ub2, int nasym2, int nthread) {
+  return map_marginal_max_range_vec_impl<F, PF, XF, K, V, Map>(
+      bvh1, bvh2, pos1, pos2, maxdist, xb, map, stub1, stub2, nullptr, nullptr,
+      lb1, ub1, nasym1, lb2, ub2, nasym2, nthread);
+}
+
+template <typename F, typename PF, typename XF, typename K, typename V,
+          template <typename, typename> class Map>
+py::tuple ssmap_marginal_max_range_vec(
+    BVH<F> const &bvh1, BVH<F> const &bvh2, py::array_t<PF> pos1,
+    py::array_t<PF> pos2, F maxdist, Xbin<XF, K> const &xb,
+    Map<K, V> const &map, Vx<K> ss1, Vx<K> ss2, py::array_t<XF> stub1,
+    py::array_t<XF> stub2, Vx<int> lb1, Vx<int> ub1, int nasym1, Vx<int> lb2,
+    Vx<int> ub2, int nasym2, int nthread) {
+  return map_marginal_max_range_vec_impl<F, PF, XF, K, V, Map>(
+      bvh1, bvh2, pos1, pos2, maxdist, xb, map, stub1, stub2, &ss1, &ss2, lb1,
+      ub1, nasym1, lb2, ub2, nasym2, nthread);
+}
+
+template <typename B, typename F, typename PF, typename K,
+          template <typename, typename> class Map>
+void bind_map_marginal_max(py::module m) {
+  Vx<int> lb0(1), ub0(1);
+  lb0[0] = NL<int>::min();
+  ub0[0] = NL<int>::max();
+  m.def("map_marginal_max_range_vec",
+        &map_marginal_max_range_vec<B, PF, F, K, double, Map>, "bvh1"_a,
+        "bvh2"_a, "pos1"_a, "pos2"_a, "maxdist"_a, "xbin"_a, "phmap"_a,
+        "xform1"_c, "xform2"_c, "lb1"_a = lb0, "ub1"_a = ub0, "nasym1"_a = -1,
+        "lb2"_a = lb0, "ub2"_a = ub0, "nasym2"_a = -1, "nthread"_a = 1);
+  m.def("ssmap_marginal_max_range_vec",
+        &ssmap_marginal_max_range_vec<B, PF, F, K, double, Map>, "bvh1"_a,
+        "bvh2"_a, "pos1"_a, "pos2"_a, "maxdist"_a, "xbin"_a, "phmap"_a, "ss1"_c,
+        "ss2"_c, "xform1"_c, "xform2"_c, "lb1"_a = lb0, "ub1"_a = ub0,
+        "nasym1"_a = -1, "lb2"_a = lb0, "ub2"_a = ub0, "nasym2"_a = -1,
+        "nthread"_a = 1);
+}
+
 //////////////////////////////////////////////////////////////////////////////
 
+template <typename F, typename K, template <typename, typename> class Map>
+void bind_xbin_map_util(py::module m) {
+  auto eye4 = M4<F>::Identity();
+  m.def("map_of_selected_pairs",
+        &map_of_selected_pairs_onearray<K, F, double, Map>, "xbin"_a, "phmap"_a,
+        "idx"_c, "xform1"_c, "xform2"_c, "pos1"_a = eye4, "pos2"_a = eye4);
+  m.def("map_of_selected_pairs",
+        &map_of_selected_pairs_onearray_same<K, F, double, Map>, "xbin"_a,
+        "phmap"_a, "idx"_c, "xform"_c, "pos1"_a = eye4, "pos2"_a = eye4);
+
+  m.def("ssmap_of_selected_pairs",
+        &ssmap_of_selected_pairs_onearray<K, F, double, Map>, "xbin"_a,
+        "phmap"_a, "idx"_c, "ss1"_c, "ss2"_c, "xform1"_c, "xform2"_c,
+        "pos1"_a = eye4, "pos2"_a = eye4);
+  m.def("ssmap_of_selected_pairs",
+        &ssmap_of_selected_pairs_onearray_same<K, F, double, Map>, "xbin"_a,
+        "phmap"_a, "idx"_c, "ss"_c, "xform"_c, "pos1"_a = eye4,
+        "pos2"_a = eye4);
+
+  m.def("map_pairs_multipos", &map_pairs_multipos<K, F, double, Map>, "xbin"_a,
+        "phmap"_a, "idx"_c, "xform1"_c, "xform2"_c, "lbub"_c, "pos1"_a = eye4,
+        "pos2"_a = eye4);
+  m.def("ssmap_pairs_multipos", &ssmap_pairs_multipos<K, F, double, Map>,
+        "xbin"_a, "phmap"_a, "idx"_c, "ss1"_c, "ss2"_c, "xform1"_c, "xform2"_c,
+        "lbub"_c, "pos1"_a = eye4, "pos2"_a = eye4);
+
+  bind_map_marginal_max<double, F, float, K, Map>(m);
+  bind_map_marginal_max<double, F, double, K, Map>(m);
+  // float32 BVH (Body bvh_dtype='f4') with float32 positions
+  bind_map_marginal_max<float, F, float, K, Map>(m);
+}
+
 template <typename F, typename K>
 void bind_xbin_util(py::module m) {
   auto eye4 = M4<F>::Identity();
@@ -527,28 +842,10 @@ void bind_xbin_util(py::module m) {
   m.def("sskey_of_selected_pairs", &sskey_of_selected_pairs_onearray_same<K, F>,
         "xbin"_a, "idx"_c, "ss"_c, "xform"_c, "pos1"_a = eye4, "pos2"_a = eye4);
 
-  m.def("map_of_selected_pairs", &map_of_selected_pairs_onearray<K, F, double>,
-        "xbin"_a, "phmap"_a, "idx"_c, "xform1"_c, "xform2"_c, "pos1"_a = eye4,
-        "pos2"_a = eye4);
-  m.def("map_of_selected_pairs",
-        &map_of_selected_pairs_onearray_same<K, F, double>, "xbin"_a, "phmap"_a,
-        "idx"_c, "xform"_c, "pos1"_a = eye4, "pos2"_a = eye4);
-
-  m.def("ssmap_of_selected_pairs",
-        &ssmap_of_selected_pairs_onearray<K, F, double>, "xbin"_a, "phmap"_a,
-        "idx"_c, "ss1"_c, "ss2"_c, "xform1"_c, "xform2"_c, "pos1"_a = eye4,
-        "pos2"_a = eye4);
-  m.def("ssmap_of_selected_pairs",
-        &ssmap_of_selected_pairs_onearray_same<K, F, double>, "xbin"_a,
-        "phmap"_a, "idx"_c, "ss"_c, "xform"_c, "pos1"_a = eye4,
-        "pos2"_a = eye4);
-
-  m.def("map_pairs_multipos", &map_pairs_multipos<K, F, double>, "xbin"_a,
-        "phmap"_a, "idx"_c, "xform1"_c, "xform2"_c, "lbub"_c, "pos1"_a = eye4,
-        "pos2"_a = eye4);
-  m.def("ssmap_pairs_multipos", &ssmap_pairs_multipos<K, F, double>, "xbin"_a,
-        "phmap"_a, "idx"_c, "ss1"_c, "ss2"_c, "xform1"_c, "xform2"_c, "lbub"_c,
-        "pos1"_a = eye4, "pos2"_a = eye4);
+  bind_xbin_map_util<F, K, PHMap>(m);
+  bind_xbin_map_util<F, K, FrozenMap>(m);
+  bind_xbin_map_util<F, K, QuantizedMap1>(m);
+  bind_xbin_map_util<F, K, QuantizedMap2>(m);
 }
 
 PYBIND11_MODULE(xbin_util, m) {